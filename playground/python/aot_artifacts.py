@@ -0,0 +1,263 @@
+"""
+预编译模型产物：构建、加载与冷启动 / 稳态基准
+每个脚本都通过 AutoModel / from_pretrained 加载模型：检查更新、构建 Python 模块、
+加载 fp32 权重，每次都一样，而且什么都没有编译。
+
+构建（一次性，产物记录在 artifacts/manifest.json）:
+  - torchscript: funasr 的 AutoModel.export 导出（算子已融合、常量折叠），运行时由 funasr-torch（torch.jit）
+    加载，不再构建 funasr 的 Python 模块；funasr-torch 只有离线运行时，只对 sensevoice 构建
+  - compile: torch.compile 编码器（forward 与流式用的 forward_chunk），
+    Inductor 的 FX 图缓存与 autograd 缓存持久化到 artifacts/inductor_cache，构建时用示例音频跑一遍把缓存填好，之后的进程直接命中缓存
+不提供 onnx 后端：funasr-onnx 的流式接口（cache 结构、返回格式）与 AutoModel 不同，需要单独适配并验证。
+
+加载: load_model(name, backend) 按后端返回统一的 generate(input=..., cache=..., is_final=...) 接口。
+所有后端都以 disable_update=True 加载，跳过联网检查更新。
+realtime_asr_vad.py / realtime_asr_paraformer.py 设置环境变量 AOT_BACKEND=compile 后通过 load_model_from_env 加载。
+
+用法:
+    python aot_artifacts.py build --models fsmn-vad paraformer-zh-streaming sensevoice
+    python aot_artifacts.py bench --wav asr_example_zh.wav
+      （每个 模型 × 后端 在全新子进程中运行，冷启动包含 import 与加载）
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ARTIFACT_DIR = os.environ.get("AOT_ARTIFACT_DIR", "artifacts")
+MANIFEST = os.path.join(ARTIFACT_DIR, "manifest.json")
+INDUCTOR_CACHE_DIR = os.path.join(ARTIFACT_DIR, "inductor_cache")
+
+# 模型名 → AutoModel 的 model 参数与流式调用参数
+MODELS = {
+    "fsmn-vad": {"model": "fsmn-vad", "streaming": True, "chunk_ms": 200,
+                 "generate_kwargs": {"chunk_size": 200}},
+    "paraformer-zh-streaming": {"model": "paraformer-zh-streaming", "streaming": True, "chunk_ms": 600,
+                                "generate_kwargs": {"chunk_size": [0, 10, 5], "encoder_chunk_look_back": 4,
+                                                    "decoder_chunk_look_back": 1}},
+    "sensevoice": {"model": "iic/SenseVoiceSmall", "streaming": False, "chunk_ms": None,
+                   "generate_kwargs": {"language": "auto", "use_itn": False}},
+}
+BACKENDS = ("eager", "compile", "torchscript")
+# 没有运行时的组合：build 不导出，bench 跳过，load_model 报错
+UNSUPPORTED = {("fsmn-vad", "torchscript"), ("paraformer-zh-streaming", "torchscript")}
+
+
+def enable_compile_cache(cache_dir=INDUCTOR_CACHE_DIR):
+    """持久化 Inductor 缓存；必须在第一次 torch.compile 之前调用"""
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.abspath(cache_dir))
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    os.environ.setdefault("TORCHINDUCTOR_AUTOGRAD_CACHE", "1")
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST):
+        return {}
+    with open(MANIFEST, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest):
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    tmp = MANIFEST + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, MANIFEST)
+
+
+def _auto_model(name, device):
+    from funasr import AutoModel
+
+    return AutoModel(model=MODELS[name]["model"], device=device, disable_update=True)
+
+
+def _compile_encoder(auto_model):
+    import torch
+
+    encoder = auto_model.model.encoder
+    # 流式 chunk 的帧数会变化（首尾 chunk），使用动态形状避免反复重新编译。
+    # 逐个方法编译而不是包成 OptimizedModule：后者只编译 forward，
+    # 而流式 paraformer 的推理走 encoder.forward_chunk
+    encoder.forward = torch.compile(encoder.forward, dynamic=True)
+    if hasattr(encoder, "forward_chunk"):
+        encoder.forward_chunk = torch.compile(encoder.forward_chunk, dynamic=True)
+    return auto_model
+
+
+def _warmup_audio(seconds=3.0):
+    """构建 compile 缓存用的示例音频：调幅噪声即可覆盖各种 chunk 形状"""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    n = int(16000 * seconds)
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * np.arange(n) / 16000)
+    return (rng.standard_normal(n) * 0.1 * envelope).astype(np.float32)
+
+
+def build(names, kinds, device="cpu"):
+    """导出各模型的预编译产物并写入 manifest"""
+    import funasr
+    import torch
+
+    manifest = load_manifest()
+    for name in names:
+        auto_model = _auto_model(name, device)
+        entry = manifest.setdefault(name, {})
+        entry.update({"device": device,
+                      "funasr": funasr.__version__, "torch": torch.__version__})
+        # compile 会原地替换编码器的方法，放在导出之后，复用同一个已加载的模型
+        for kind in sorted(kinds, key=lambda k: k == "compile"):
+            if (name, kind) in UNSUPPORTED:
+                print(f"[{name}] 跳过 {kind}：没有可加载该产物的运行时")
+                continue
+            start = time.perf_counter()
+            if kind == "compile":
+                enable_compile_cache()
+                compiled = _compile_encoder(auto_model)
+                _run_steady(name, compiled, _warmup_audio(), repeat=1)
+                entry["compile"] = {"cache_dir": os.path.abspath(INDUCTOR_CACHE_DIR)}
+            else:
+                # funasr 把导出的 model.torchscript 等写到模型目录，返回该目录
+                export_dir = auto_model.export(type=kind)
+                entry[kind] = {"export_dir": export_dir}
+            print(f"[{name}] {kind} 构建完成，耗时 {time.perf_counter() - start:.1f} 秒")
+        _save_manifest(manifest)
+    return manifest
+
+
+class _TorchScriptSenseVoice:
+    def __init__(self, model_dir, device):
+        from funasr_torch import SenseVoiceSmall
+
+        self.model = SenseVoiceSmall(model_dir, batch_size=1, device=device)
+
+    def generate(self, input, cache=None, is_final=True, language="auto", use_itn=False, **kwargs):
+        texts = self.model(input, language=language, textnorm="withitn" if use_itn else "woitn")
+        return [{"text": texts[0] if texts else ""}]
+
+
+def load_model(name, backend="eager", device="cpu"):
+    """
+    按后端加载模型，返回带 generate(input=..., cache=..., is_final=..., **kwargs) 的对象
+
+    torchscript 需要 pip install funasr-torch，并先运行 build
+    """
+    if (name, backend) in UNSUPPORTED:
+        # funasr-torch 只有离线模型的运行时，流式 cache 逻辑仍需 funasr 的 Python 模块
+        raise RuntimeError(f"{name} 不支持 {backend} 后端，请使用 eager 或 compile")
+    if backend == "eager":
+        return _auto_model(name, device)
+    if backend == "compile":
+        enable_compile_cache()
+        return _compile_encoder(_auto_model(name, device))
+
+    entry = load_manifest().get(name, {})
+    if backend not in entry:
+        raise RuntimeError(f"{name} 没有 {backend} 产物，请先运行: python aot_artifacts.py build --kinds {backend}")
+    return _TorchScriptSenseVoice(entry[backend]["export_dir"], device)
+
+
+def load_model_from_env(name, device="cpu"):
+    """设置了 AOT_BACKEND 时按该后端加载并返回模型，否则返回 None（调用方照常构建 AutoModel）"""
+    backend = os.environ.get("AOT_BACKEND")
+    if not backend:
+        return None
+    if backend not in BACKENDS:
+        raise ValueError(f"AOT_BACKEND={backend} 无效，可选: {', '.join(BACKENDS)}")
+    print(f"模型后端: {backend}（aot_artifacts.py）")
+    return load_model(name, backend, device)
+
+
+def _run_steady(name, model, speech, repeat=3):
+    """流式模型按 chunk 逐块推理，返回每 chunk 耗时（ms）；离线模型整段推理"""
+    config = MODELS[name]
+    times = []
+    for _ in range(repeat):
+        if not config["streaming"]:
+            start = time.perf_counter()
+            model.generate(input=speech, **config["generate_kwargs"])
+            times.append((time.perf_counter() - start) * 1000)
+            continue
+        stride = int(config["chunk_ms"] * 16)
+        total = int((len(speech) - 1) / stride + 1)
+        cache = {}
+        for i in range(total):
+            start = time.perf_counter()
+            model.generate(input=speech[i * stride:(i + 1) * stride], cache=cache, is_final=i == total - 1,
+                           **config["generate_kwargs"])
+            if i < total - 1:  # 最后一个 chunk 不完整
+                times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def _measure(name, backend, wav, device):
+    """在当前（全新）进程中测量冷启动与稳态，结果以 JSON 打印到标准输出最后一行"""
+    process_start = time.perf_counter()
+    import soundfile
+    from audio_format import normalize_audio
+    from perf_stats import summarize
+
+    model = load_model(name, backend, device)
+    load_s = time.perf_counter() - process_start
+    speech, sample_rate = normalize_audio(*soundfile.read(wav))
+
+    first_start = time.perf_counter()
+    _run_steady(name, model, speech[:16000 * 2], repeat=1)
+    first_s = time.perf_counter() - first_start
+    stats = summarize(_run_steady(name, model, speech))
+    print(json.dumps({"load_s": load_s, "first_s": first_s, "p50": stats["p50"], "p95": stats["p95"]}))
+
+
+def bench(names, backends, wav, device):
+    print("=" * 84)
+    print(f"{'模型':<24} {'后端':<12} {'加载(秒)':>9} {'首次推理(秒)':>12} {'稳态P50(ms)':>12} {'稳态P95(ms)':>12}")
+    for name in names:
+        for backend in backends:
+            if (name, backend) in UNSUPPORTED:
+                continue
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "_measure", name, backend, wav, device],
+                capture_output=True, text=True)
+            lines = proc.stdout.strip().splitlines()
+            if proc.returncode != 0 or not lines:
+                reason = (proc.stderr.strip().splitlines() or ["未知错误"])[-1]
+                print(f"{name:<24} {backend:<12} 失败: {reason[:60]}")
+                continue
+            r = json.loads(lines[-1])
+            print(f"{name:<24} {backend:<12} {r['load_s']:>9.2f} {r['first_s']:>12.2f} "
+                  f"{r['p50']:>12.2f} {r['p95']:>12.2f}")
+    print("=" * 84)
+    print("加载时间从子进程启动开始计（含 import）；流式模型的稳态为每 chunk 耗时，离线模型为整段耗时")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "_measure":
+        _measure(*sys.argv[2:6])
+        return
+
+    parser = argparse.ArgumentParser(description="预编译模型产物的构建与基准")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build")
+    build_parser.add_argument("--models", nargs="+", default=list(MODELS), choices=list(MODELS))
+    build_parser.add_argument("--kinds", nargs="+", default=["torchscript", "compile"],
+                              choices=["torchscript", "compile"])
+    build_parser.add_argument("--device", default="cpu")
+    bench_parser = sub.add_parser("bench")
+    bench_parser.add_argument("--wav", required=True)
+    bench_parser.add_argument("--models", nargs="+", default=list(MODELS), choices=list(MODELS))
+    bench_parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    bench_parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(args.models, args.kinds, args.device)
+    else:
+        bench(args.models, args.backends, args.wav, args.device)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+音频格式归一化
+把任意采样率 / 声道数 / 位深的音频块转换成 ASR 模型需要的 16 kHz 单声道 float32
+
+- test.py 的 TTS 输出是 22050 Hz PCM16
+- Electron AudioWorklet 采集的是 48 kHz float32（可能是双声道）
+- fsmn-vad / paraformer-zh-streaming / SenseVoiceSmall 都要求 16 kHz 单声道
+
+重采样使用 NumPy 向量化的多相（polyphase）FIR 滤波器，滤波器历史保存在对象里，
+因此可以逐块（streaming）处理，块与块之间没有边界失真。
+
+运行本文件会执行每个 chunk 的耗时基准测试：
+    python audio_format.py
+"""
+
+import math
+import time
+
+import numpy as np
+
+from perf_stats import summarize
+
+ASR_SAMPLE_RATE = 16000
+
+_INT16_SCALE = 1.0 / 32768.0
+
+
+def pcm16_to_float32(data):
+    """PCM16（bytes 或 int16 数组）转换为 [-1, 1) 的 float32"""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = np.frombuffer(data, dtype="<i2")
+    return data.astype(np.float32) * np.float32(_INT16_SCALE)
+
+
+def float32_to_pcm16(samples):
+    """float32 转换为 int16（先裁剪到 [-1, 1]，四舍五入）"""
+    scaled = np.clip(samples, -1.0, 1.0) * 32767.0
+    return np.rint(scaled).astype(np.int16)
+
+
+def downmix(samples, channels):
+    """
+    多声道下混为单声道
+
+    参数:
+        samples: 交错排列的一维数组（L R L R ...）或形状为 (帧数, 声道数) 的二维数组
+        channels: 声道数
+    """
+    if channels == 1:
+        return samples.reshape(-1)
+    if samples.ndim == 1:
+        usable = len(samples) - len(samples) % channels
+        samples = samples[:usable].reshape(-1, channels)
+    return samples.mean(axis=1, dtype=np.float32)
+
+
+class StreamingResampler:
+    """
+    流式多相重采样器（有理数比例 L/M）
+
+    y[n] = sum_k h[p + k*L] * x[i0 - k]，其中 t = n*M，p = t % L，i0 = t // L
+
+    输入块之间保存 K-1 个历史样本以及全局输入/输出计数，因此任意切分输入块，
+    得到的输出与一次性处理整段音频完全一致。
+    """
+
+    def __init__(self, in_rate, out_rate, zero_crossings=8, rolloff=0.9, kaiser_beta=8.0):
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        g = math.gcd(self.in_rate, self.out_rate)
+        self.up = self.out_rate // g     # L
+        self.down = self.in_rate // g    # M
+        self.passthrough = self.up == self.down
+
+        # 每个相位的抽头数（以输入采样点计），降采样时按比例加长以保证过渡带宽度
+        ratio = max(1, math.ceil(self.down / self.up))
+        self.taps = 2 * zero_crossings * ratio
+        self._phase_filters = self._design(rolloff, kaiser_beta)
+
+        # 历史样本（对应全局输入下标 -K+1 .. -1，初始为 0）
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._in_total = 0
+        self._out_total = 0
+
+    def _design(self, rolloff, kaiser_beta):
+        """设计上采样域的窗函数 sinc 低通，并拆成 L 个相位"""
+        L = self.up
+        length = self.taps * L
+        cutoff_hz = rolloff * min(self.in_rate, self.out_rate) / 2.0
+        fc = cutoff_hz / (self.in_rate * L)  # 相对上采样后采样率的归一化截止频率
+        n = np.arange(length, dtype=np.float64) - (length - 1) / 2.0
+        h = 2.0 * fc * np.sinc(2.0 * fc * n) * np.kaiser(length, kaiser_beta)
+        h *= L / h.sum()  # 上采样补偿增益，保证每个相位的直流增益为 1
+        # phase_filters[p, q] = h[p + (K-1-q)*L]，与输入窗口正序相乘
+        k_idx = np.arange(self.taps)[::-1]
+        phase_filters = h[np.arange(L)[:, None] + k_idx[None, :] * L]
+        return phase_filters.astype(np.float32)
+
+    @property
+    def delay_seconds(self):
+        """滤波器引入的群延迟（秒）"""
+        return (self.taps * self.up - 1) / 2.0 / (self.in_rate * self.up)
+
+    def process(self, block):
+        """处理一个 float32 单声道输入块，返回本块能够产生的全部输出样本"""
+        block = np.asarray(block, dtype=np.float32)
+        if self.passthrough:
+            return block
+        if len(block) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        L, M, K = self.up, self.down, self.taps
+        buf = np.concatenate((self._history, block))
+        buf_start = self._in_total - (K - 1)  # buf[0] 对应的全局输入下标
+        self._in_total += len(block)
+
+        # 所有满足 n*M // L <= in_total-1 的输出点
+        out_end = -(-self._in_total * L // M)
+        n = np.arange(self._out_total, out_end, dtype=np.int64)
+        self._out_total = out_end
+        self._history = buf[len(buf) - (K - 1):].copy()
+        if len(n) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        t = n * M
+        phase = t % L
+        start = t // L - (K - 1) - buf_start
+        windows = np.lib.stride_tricks.sliding_window_view(buf, K)[start]
+        return np.einsum("nk,nk->n", windows, self._phase_filters[phase]).astype(np.float32)
+
+    def reset(self):
+        """清空滤波器状态（新会话开始时调用）"""
+        self._history[:] = 0.0
+        self._in_total = 0
+        self._out_total = 0
+
+
+class AudioFormatStage:
+    """
+    格式归一化阶段：位深转换 → 下混 → 重采样
+
+    参数:
+        in_rate: 输入采样率
+        in_channels: 输入声道数
+        in_format: "pcm16"（bytes/int16）或 "float32"
+        out_rate: 输出采样率，默认 16 kHz
+    """
+
+    def __init__(self, in_rate, in_channels=1, in_format="float32", out_rate=ASR_SAMPLE_RATE):
+        if in_format not in ("pcm16", "float32"):
+            raise ValueError(f"不支持的输入格式: {in_format}")
+        self.in_rate = in_rate
+        self.in_channels = in_channels
+        self.in_format = in_format
+        self.out_rate = out_rate
+        self.resampler = StreamingResampler(in_rate, out_rate)
+
+    def process(self, block):
+        """处理一个输入块，返回 float32 单声道 out_rate 样本"""
+        if self.in_format == "pcm16":
+            samples = pcm16_to_float32(block)
+        elif isinstance(block, (bytes, bytearray, memoryview)):
+            samples = np.frombuffer(block, dtype="<f4")
+        else:
+            samples = np.asarray(block, dtype=np.float32)
+        mono = downmix(samples, self.in_channels)
+        return self.resampler.process(mono)
+
+    def reset(self):
+        self.resampler.reset()
+
+
+def normalize_audio(speech, sample_rate, out_rate=ASR_SAMPLE_RATE):
+    """
+    一次性归一化整段音频（soundfile.read 的返回值）
+
+    返回: (float32 单声道数组, out_rate)
+    """
+    speech = np.asarray(speech)
+    channels = speech.shape[1] if speech.ndim == 2 else 1
+    if sample_rate == out_rate and channels == 1 and speech.dtype == np.float32:
+        return speech, sample_rate
+    in_format = "pcm16" if speech.dtype == np.int16 else "float32"
+    stage = AudioFormatStage(sample_rate, channels, in_format, out_rate)
+    return stage.process(speech), out_rate
+
+
+def _benchmark_case(name, in_rate, in_channels, in_format, chunk_ms, num_chunks=200):
+    """对一种输入格式做逐块耗时统计"""
+    stage = AudioFormatStage(in_rate, in_channels, in_format)
+    frames = int(in_rate * chunk_ms / 1000)
+    rng = np.random.default_rng(0)
+    if in_format == "pcm16":
+        chunk = rng.integers(-8000, 8000, frames * in_channels, dtype=np.int16).tobytes()
+    else:
+        chunk = (rng.standard_normal(frames * in_channels) * 0.1).astype(np.float32)
+
+    stage.process(chunk)  # 预热
+    times = []
+    for _ in range(num_chunks):
+        start = time.perf_counter()
+        stage.process(chunk)
+        times.append((time.perf_counter() - start) * 1000)
+
+    stats = summarize(times)
+    budget_ratio = stats["p99"] / chunk_ms * 100
+    print(f"{name:<28} chunk {chunk_ms:>3} ms | 平均 {stats['avg']:.3f} ms | "
+          f"P99 {stats['p99']:.3f} ms | 最大 {stats['max']:.3f} ms | P99 占预算 {budget_ratio:.3f}%")
+    return stats
+
+
+def _check_accuracy():
+    """用正弦波验证：分块处理与整段处理结果一致，且重采样误差足够小"""
+    in_rate, freq = 48000, 440.0
+    t = np.arange(in_rate) / in_rate
+    tone = np.sin(2 * np.pi * freq * t).astype(np.float32)
+
+    whole = StreamingResampler(in_rate, ASR_SAMPLE_RATE).process(tone)
+    streaming = StreamingResampler(in_rate, ASR_SAMPLE_RATE)
+    pieces = [streaming.process(tone[i:i + 1234]) for i in range(0, len(tone), 1234)]
+    chunked = np.concatenate(pieces)
+    max_diff = float(np.max(np.abs(whole - chunked)))
+
+    delay = streaming.delay_seconds
+    t_out = np.arange(len(whole)) / ASR_SAMPLE_RATE - delay
+    ideal = np.sin(2 * np.pi * freq * t_out)
+    steady = slice(ASR_SAMPLE_RATE // 10, len(whole) - ASR_SAMPLE_RATE // 10)
+    err = whole[steady] - ideal[steady]
+    snr = 10 * np.log10(np.sum(ideal[steady] ** 2) / np.sum(err ** 2))
+    print(f"分块 vs 整段最大差值: {max_diff:.2e}")
+    print(f"48 kHz → 16 kHz 正弦 SNR: {snr:.1f} dB，群延迟 {delay*1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("音频格式归一化正确性检查")
+    print("=" * 60)
+    _check_accuracy()
+
+    print("\n" + "=" * 60)
+    print("逐块耗时基准（目标：远小于 chunk 时长）")
+    print("=" * 60)
+    for chunk_ms in (200, 600):
+        _benchmark_case("48k float32 双声道 (AudioWorklet)", 48000, 2, "float32", chunk_ms)
+        _benchmark_case("48k float32 单声道", 48000, 1, "float32", chunk_ms)
+        _benchmark_case("22050 PCM16 单声道 (TTS)", 22050, 1, "pcm16", chunk_ms)
+        _benchmark_case("16k PCM16 单声道 (直通)", 16000, 1, "pcm16", chunk_ms)
+    print("=" * 60)
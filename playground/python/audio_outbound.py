@@ -0,0 +1,380 @@
+"""
+TTS 音频下行：20ms 定长分包、可选 Opus 编码、按实时节奏发送
+test.py 在本机用 PyAudio 播放 22050Hz PCM16；服务端部署时音频要经 WebSocket 发回 Electron 客户端。
+TTS 的 on_data 大小不固定（几十到几百毫秒），而且合成比实时快，直接转发会让客户端一次收到几秒音频，
+既浪费客户端缓冲，也让打断（barge-in）后已经发出的音频收不回来。
+
+OutboundAudioStream:
+  - 分包: 任意大小的 PCM16 重新切成 20ms 帧（Opus 需要 8/12/16/24/48kHz，22050Hz 先流式重采样到 24kHz）
+  - 编码: pcm（原样）或 opus（pip install opuslib，需要系统 libopus），逐帧编码并统计 CPU 耗时
+  - 发送: 独立线程按实时节奏发送，第 n 包在 起点 + n×20ms - lead 时发出，客户端最多提前收到 lead 的音频；
+    TTS 供数不足（欠载）时以当前时刻重新定起点
+每包是一个 WebSocket 二进制消息: 13 字节包头（序号 uint32、标志 uint8、发出时刻 float64）+ 载荷。
+延迟分两段统计: 服务端 收到 TTS 音频 → 发出（分包 + 编码 + 定速等待），发出 → 客户端收到（传输）。
+
+用法（send 为发送一条二进制消息的函数，例如 asyncio 服务端里
+      lambda data: asyncio.run_coroutine_threadsafe(ws.send_bytes(data), loop)）:
+    stream = OutboundAudioStream(send, in_rate=22050, codec="opus", lead_ms=60)
+    callback.on_data = stream.feed      # TTS 回调线程里调用
+    stream.end()                        # 本轮 TTS 结束
+    stream.close()
+
+基准（fake TTS → 分包 / 编码 / 定速 → 本机 TCP 上的 WebSocket 帧 → fake 客户端）:
+    python audio_outbound.py --codecs pcm opus --lead-ms 60
+"""
+
+import argparse
+import math
+import queue
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from audio_format import StreamingResampler, float32_to_pcm16, pcm16_to_float32
+from perf_stats import print_latency_summary, summarize
+from tts_backends import TTSCallback, create_tts_backend
+
+try:
+    import opuslib
+    OPUS_AVAILABLE = True
+except (ImportError, OSError):  # opuslib 在找不到 libopus 时抛 OSError
+    OPUS_AVAILABLE = False
+
+FRAME_MS = 20
+OPUS_RATE = 24000
+HEADER = struct.Struct("<IBd")   # 序号、标志、发出时刻（time.monotonic，同机可比）
+FLAG_END = 1
+# 估算线上字节时每个消息额外的 IPv4 + TCP 头（含 Linux 默认的时间戳选项）
+TCP_IP_OVERHEAD = 52
+
+
+def ws_binary_frame(payload):
+    """服务端 → 客户端的 WebSocket 二进制帧（FIN=1，无掩码）"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x82, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x82, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x82, 127, length)
+    return header + payload
+
+
+class Packetizer:
+    """把任意大小的 PCM16 块重新切成 frame_ms 的 int16 帧（必要时先重采样）"""
+
+    def __init__(self, in_rate, out_rate=None, frame_ms=FRAME_MS):
+        self.out_rate = out_rate or in_rate
+        self.frame_samples = self.out_rate * frame_ms // 1000
+        self.resampler = StreamingResampler(in_rate, self.out_rate) if self.out_rate != in_rate else None
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    def push(self, data):
+        samples = np.frombuffer(data, dtype="<i2")
+        if self.resampler is not None:
+            samples = float32_to_pcm16(self.resampler.process(pcm16_to_float32(samples)))
+        samples = np.concatenate((self._pending, samples)) if len(self._pending) else samples
+        count = len(samples) // self.frame_samples
+        self._pending = samples[count * self.frame_samples:]
+        return [samples[k * self.frame_samples:(k + 1) * self.frame_samples] for k in range(count)]
+
+    def flush(self):
+        """末尾不足一帧的部分补零"""
+        if not len(self._pending):
+            return []
+        frame = np.zeros(self.frame_samples, dtype=np.int16)
+        frame[:len(self._pending)] = self._pending
+        self._pending = np.zeros(0, dtype=np.int16)
+        return [frame]
+
+
+class PcmCodec:
+    name = "pcm"
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+
+    def encode(self, frame):
+        return frame.astype("<i2").tobytes()
+
+    def decode(self, payload, frame_samples):
+        return np.frombuffer(payload, dtype="<i2")
+
+
+class OpusCodec:
+    """opuslib 的 VOIP 模式单声道编码器；bitrate 单位 bit/s"""
+
+    name = "opus"
+
+    def __init__(self, sample_rate=OPUS_RATE, bitrate=24000, complexity=5):
+        if not OPUS_AVAILABLE:
+            raise RuntimeError("Opus 编码需要 opuslib 与 libopus: pip install opuslib")
+        self.sample_rate = sample_rate
+        self._encoder = opuslib.Encoder(sample_rate, 1, opuslib.APPLICATION_VOIP)
+        self._encoder.bitrate = bitrate
+        self._encoder.complexity = complexity
+        self._decoder = opuslib.Decoder(sample_rate, 1)
+
+    def encode(self, frame):
+        return self._encoder.encode(frame.astype("<i2").tobytes(), len(frame))
+
+    def decode(self, payload, frame_samples):
+        return np.frombuffer(self._decoder.decode(payload, frame_samples), dtype="<i2")
+
+
+def create_codec(name, in_rate, bitrate=24000):
+    if name == "pcm":
+        return PcmCodec(in_rate)
+    if name == "opus":
+        return OpusCodec(OPUS_RATE, bitrate)
+    raise ValueError(f"未知编码: {name}")
+
+
+class OutboundAudioStream:
+    """
+    参数:
+        send: send(bytes) 发送一条 WebSocket 二进制消息
+        in_rate: TTS 输出采样率
+        codec: "pcm" 或 "opus"
+        lead_ms: 最多比实时提前发送多少音频；None 表示不定速（收到就发）
+        bitrate: Opus 码率
+    """
+
+    def __init__(self, send, in_rate=22050, codec="pcm", frame_ms=FRAME_MS, lead_ms=60.0, bitrate=24000):
+        self.send = send
+        self.codec = create_codec(codec, in_rate, bitrate)
+        self.packetizer = Packetizer(in_rate, self.codec.sample_rate, frame_ms)
+        self.frame_s = frame_ms / 1000
+        self.lead_s = None if lead_ms is None else lead_ms / 1000
+
+        self._queue = queue.Queue()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.encode_us = []
+        self.payload_bytes = 0
+        self.message_bytes = 0    # 包头 + 载荷
+        self.wire_bytes = 0       # 再加 WebSocket 帧头与 TCP/IP 头的估算
+        self.packets = 0
+        self.underruns = 0
+        self.hold_ms = []         # 收到 TTS 音频 → 发出
+        self.first_hold_ms = []   # 每轮第一包的 收到 → 发出（决定客户端何时开始出声）
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, data):
+        """送入一段 TTS PCM16（任意长度，可在 TTS 回调线程中调用）"""
+        now = time.monotonic()
+        with self._lock:
+            for frame in self.packetizer.push(data):
+                self._enqueue(frame, now)
+
+    def end(self):
+        """本轮音频结束：补齐最后一帧并发送结束标记"""
+        now = time.monotonic()
+        with self._lock:
+            for frame in self.packetizer.flush():
+                self._enqueue(frame, now)
+            self._queue.put((self._seq, b"", now, FLAG_END))
+            self._seq += 1
+
+    def _enqueue(self, frame, ingest):
+        start = time.perf_counter()
+        payload = self.codec.encode(frame)
+        self.encode_us.append((time.perf_counter() - start) * 1e6)
+        self._queue.put((self._seq, payload, ingest, 0))
+        self._seq += 1
+
+    def _run(self):
+        base = None   # 推算的客户端播放起点：第 seq 包在 base + seq×20ms 播放，提前 lead 发出
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            seq, payload, ingest, flags = item
+            now = time.monotonic()
+            first = base is None
+            if not flags & FLAG_END:
+                if first:
+                    base = now - seq * self.frame_s
+                elif base + seq * self.frame_s < now:
+                    # 欠载：客户端已经播完了之前的音频，以当前时刻重新定起点
+                    self.underruns += 1
+                    base = now - seq * self.frame_s
+                due = base + seq * self.frame_s - (self.lead_s or 0.0)
+                if self.lead_s is not None and due > now:
+                    time.sleep(due - now)
+            sent = time.monotonic()
+            if not flags & FLAG_END:
+                self.hold_ms.append((sent - ingest) * 1000)
+                if first:
+                    self.first_hold_ms.append((sent - ingest) * 1000)
+            message = HEADER.pack(seq, flags, sent) + payload
+            frame = ws_binary_frame(message)
+            self.send(frame)
+            self.packets += 1
+            self.payload_bytes += len(payload)
+            self.message_bytes += len(message)
+            self.wire_bytes += len(frame) + TCP_IP_OVERHEAD
+            if flags & FLAG_END:
+                base = None
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def report(self, audio_seconds):
+        print(f"  编码: {self.codec.name} @ {self.codec.sample_rate} Hz | 包数: {self.packets}")
+        stats = summarize(self.encode_us)
+        print(f"  每包编码耗时: 平均 {stats['avg']:.1f} 微秒 | P99 {stats['p99']:.1f} 微秒")
+        if audio_seconds:
+            print(f"  载荷 {self.payload_bytes * 8 / audio_seconds / 1000:.1f} kbit/s | "
+                  f"含包头与 WS 帧 {self.message_bytes * 8 / audio_seconds / 1000:.1f} kbit/s | "
+                  f"估算线上 {self.wire_bytes * 8 / audio_seconds / 1000:.1f} kbit/s")
+        print(f"  每轮首包 收到 → 发出: {', '.join(f'{ms:.2f}' for ms in self.first_hold_ms)} 毫秒")
+        stats = summarize(self.hold_ms)
+        print(f"  收到 → 发出（含定速等待）: P50 {stats['p50']:.1f} 毫秒 | 最大 {stats['max']:.1f} 毫秒")
+        print(f"  服务端欠载次数: {self.underruns}")
+
+
+class FakeClient:
+    """
+    本机 TCP 上读取 WebSocket 二进制帧的替身客户端：解码每包音频并模拟播放
+    （收到第一包立即开始播放，之后每包 20ms；某包晚于它的播放时刻到达即为欠载，从到达时刻重新开始）
+    """
+
+    def __init__(self, sock, codec, frame_samples, frame_s):
+        self.sock = sock
+        self.codec = codec
+        self.frame_samples = frame_samples
+        self.frame_s = frame_s
+        self.latency_ms = []     # 服务端发出 → 客户端收到
+        self.margin_ms = []      # 播放时刻 - 到达时刻（客户端缓冲的余量）
+        self.underruns = 0
+        self.max_buffer_ms = 0.0
+        self.samples = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _read_exact(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("连接已关闭")
+            data += chunk
+        return data
+
+    def _read_message(self):
+        _, length = self._read_exact(2)
+        if length == 126:
+            length = struct.unpack("!H", self._read_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._read_exact(8))[0]
+        return self._read_exact(length)
+
+    def _run(self):
+        base = None
+        while True:
+            try:
+                message = self._read_message()
+            except ConnectionError:
+                return
+            arrival = time.monotonic()
+            seq, flags, sent = HEADER.unpack_from(message)
+            if flags & FLAG_END:
+                base = None
+                continue
+            self.samples += len(self.codec.decode(message[HEADER.size:], self.frame_samples))
+            self.latency_ms.append((arrival - sent) * 1000)
+            if base is None:
+                base = arrival - seq * self.frame_s
+            play_at = base + seq * self.frame_s
+            if play_at < arrival:
+                self.underruns += 1
+                base = arrival - seq * self.frame_s
+                play_at = arrival
+            self.margin_ms.append((play_at - arrival) * 1000)
+            self.max_buffer_ms = max(self.max_buffer_ms, (play_at - arrival) * 1000 + self.frame_s * 1000)
+
+    def join(self):
+        self._thread.join()
+
+    def report(self):
+        print_latency_summary("  传输延迟（发出 → 客户端收到）", self.latency_ms, indent="    ")
+        stats = summarize(self.margin_ms)
+        print(f"  客户端缓冲余量: 最小 {stats['min']:.1f} 毫秒 | P50 {stats['p50']:.1f} 毫秒 | "
+              f"最大缓冲 {self.max_buffer_ms:.0f} 毫秒")
+        print(f"  客户端欠载次数: {self.underruns}")
+
+
+class _StreamCallback(TTSCallback):
+    def __init__(self, stream):
+        self.stream = stream
+        self.audio_bytes = 0
+
+    def on_data(self, data: bytes) -> None:
+        self.audio_bytes += len(data)
+        self.stream.feed(data)
+
+
+def run(codec, lead_ms, texts, sample_rate, bitrate, tts_rtf):
+    """fake TTS → OutboundAudioStream → 本机 TCP → FakeClient，返回 (stream, client, 音频秒数)"""
+    listener = socket.create_server(("127.0.0.1", 0))
+    client_sock = socket.create_connection(listener.getsockname())
+    server_sock, _ = listener.accept()
+    listener.close()
+    server_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    stream = OutboundAudioStream(server_sock.sendall, sample_rate, codec, lead_ms=lead_ms, bitrate=bitrate)
+    client = FakeClient(client_sock, create_codec(codec, sample_rate, bitrate),
+                        stream.packetizer.frame_samples, stream.frame_s)
+    callback = _StreamCallback(stream)
+    for text in texts:
+        tts = create_tts_backend("fake", callback, sample_rate=sample_rate, rtf=tts_rtf)
+        tts.streaming_call(text)
+        tts.streaming_complete()
+        stream.end()
+        # 等这一轮发送完（定速时约等于音频时长）再开始下一轮
+        while not stream._queue.empty():
+            time.sleep(0.01)
+        time.sleep(0.1)
+    stream.close()
+    server_sock.shutdown(socket.SHUT_WR)
+    client.join()
+    server_sock.close()
+    client_sock.close()
+    return stream, client, callback.audio_bytes / 2 / sample_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTS 音频下行分包 / 编码 / 定速基准")
+    parser.add_argument("--codecs", nargs="+", default=["pcm", "opus"], choices=["pcm", "opus"])
+    parser.add_argument("--lead-ms", type=float, default=60.0, help="定速发送的提前量")
+    parser.add_argument("--bitrate", type=int, default=24000, help="Opus 码率 bit/s")
+    parser.add_argument("--sample-rate", type=int, default=22050, help="TTS 输出采样率")
+    parser.add_argument("--tts-rtf", type=float, default=0.1, help="fake TTS 的合成速度（越小越快于实时）")
+    args = parser.parse_args()
+
+    texts = ["你好，我是你的桌面虚拟助手。", "今天想聊点什么呢？我可以陪你聊天、回答问题。"]
+    print("=" * 64)
+    for codec in args.codecs:
+        if codec == "opus" and not OPUS_AVAILABLE:
+            print(f"[{codec}] 跳过: 未安装 opuslib / libopus")
+            continue
+        for lead_ms in (None, args.lead_ms):
+            stream, client, audio_seconds = run(codec, lead_ms, texts, args.sample_rate, args.bitrate, args.tts_rtf)
+            pacing = "不定速（收到即发）" if lead_ms is None else f"定速，提前 {lead_ms:.0f} ms"
+            print(f"[{codec} | {pacing}] 音频 {audio_seconds:.2f} 秒")
+            stream.report(audio_seconds)
+            client.report()
+            expected = math.ceil(audio_seconds / stream.frame_s)
+            print(f"  客户端解码 {client.samples / stream.codec.sample_rate:.2f} 秒音频（约 {expected} 包）")
+            print()
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+长时间运行（soak）内存基准
+把一段语音 + 静音循环拼成数小时的音频流，按最快速度（不按实时节奏）送入流式模型，
+定期采样进程 RSS 与会话 cache 大小，对比开启/关闭 SessionCacheGuard 时内存是否趋于平稳。
+
+用法:
+    python benchmark_cache_soak.py --wav asr_example_zh.wav --hours 8 --model vad
+    python benchmark_cache_soak.py --wav asr_example_zh.wav --hours 1 --model paraformer --no-guard
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import soundfile
+import torch
+from funasr import AutoModel
+
+from audio_format import normalize_audio
+from cache_guard import SessionCacheGuard, inspect_cache
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+
+def rss_mb():
+    if PSUTIL_AVAILABLE:
+        return psutil.Process(os.getpid()).memory_info().rss / 1024**2
+    return 0.0
+
+
+def slope_mb_per_hour(samples):
+    """后半段（排除启动阶段）内存增长斜率"""
+    tail = samples[len(samples) // 2:]
+    if len(tail) < 2:
+        return 0.0
+    hours = np.array([s[0] for s in tail]) / 3600.0
+    values = np.array([s[1] for s in tail])
+    return float(np.polyfit(hours, values, 1)[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式 ASR 会话内存 soak 基准")
+    parser.add_argument("--wav", required=True, help="循环使用的语音片段")
+    parser.add_argument("--hours", type=float, default=8.0, help="模拟的音频流时长（小时）")
+    parser.add_argument("--model", choices=["vad", "paraformer"], default="vad")
+    parser.add_argument("--gap", type=float, default=1.5, help="每段语音之后的静音秒数")
+    parser.add_argument("--sample-minutes", type=float, default=10.0, help="采样间隔（音频时间，分钟）")
+    parser.add_argument("--no-guard", action="store_true", help="关闭 cache 回收，观察原始增长")
+    args = parser.parse_args()
+
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    speech, sample_rate = soundfile.read(args.wav)
+    speech, sample_rate = normalize_audio(speech, sample_rate)
+    loop = np.concatenate((speech, np.zeros(int(args.gap * sample_rate), dtype=np.float32)))
+
+    if args.model == "vad":
+        model = AutoModel(model="fsmn-vad", device=device)
+        chunk_ms = 200
+        generate_kwargs = {"chunk_size": chunk_ms}
+    else:
+        model = AutoModel(model="paraformer-zh-streaming", device=device)
+        chunk_ms = 600
+        generate_kwargs = {"chunk_size": [0, 10, 5], "encoder_chunk_look_back": 4,
+                           "decoder_chunk_look_back": 1}
+    chunk_stride = int(chunk_ms * sample_rate / 1000)
+    total_chunks = int(args.hours * 3600 * 1000 / chunk_ms)
+    sample_every = max(1, int(args.sample_minutes * 60 * 1000 / chunk_ms))
+
+    guard = None if args.no_guard else SessionCacheGuard()
+    cache = {}
+    # 以固定 chunk 边界切分循环音频，使每个 chunk 在循环内的位置固定
+    loop_chunks = [loop[i:i + chunk_stride] for i in range(0, len(loop) - chunk_stride + 1, chunk_stride)]
+    speech_chunks = int(len(speech) / chunk_stride) + 1  # 每轮前面这些 chunk 含语音
+
+    print(f"模型: {args.model} | 设备: {device} | cache 回收: {'关闭' if guard is None else '开启'}")
+    print(f"模拟时长: {args.hours} 小时，共 {total_chunks} 个 chunk")
+    print("=" * 60)
+    print(f"{'音频时间':>10} {'墙钟(s)':>9} {'RSS(MB)':>9} {'cache(KB)':>10} {'张量数':>6}")
+
+    rss_samples = []
+    cache_samples = []
+    wall_start = time.perf_counter()
+    for i in range(total_chunks):
+        position = i % len(loop_chunks)
+        res = model.generate(input=loop_chunks[position], cache=cache, is_final=False, **generate_kwargs)
+
+        if guard is not None:
+            if args.model == "vad":
+                segments = res[0]["value"]
+                at_boundary = bool(segments) and segments[-1][1] != -1
+            else:
+                # paraformer 没有 VAD，用循环里语音之后的静音段作为断句边界
+                at_boundary = position == speech_chunks
+            guard.after_chunk(cache, (i + 1) * chunk_ms, at_boundary=at_boundary)
+
+        if (i + 1) % sample_every == 0:
+            audio_seconds = (i + 1) * chunk_ms / 1000
+            stats = inspect_cache(cache)
+            rss = rss_mb()
+            rss_samples.append((audio_seconds, rss))
+            cache_samples.append((audio_seconds, stats["total_bytes"] / 1024**2))
+            print(f"{audio_seconds/3600:>9.2f}h {time.perf_counter()-wall_start:>9.1f} {rss:>9.1f} "
+                  f"{stats['total_bytes']/1024:>10.1f} {stats['tensors']:>6}")
+
+    print("=" * 60)
+    print(f"RSS 增长斜率（后半段）: {slope_mb_per_hour(rss_samples):.2f} MB/小时")
+    print(f"cache 增长斜率（后半段）: {slope_mb_per_hour(cache_samples):.3f} MB/小时")
+    if guard is not None:
+        guard.report()
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
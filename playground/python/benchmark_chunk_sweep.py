@@ -0,0 +1,101 @@
+"""
+流式 Paraformer chunk 配置扫描基准
+对 chunk_controller.CHUNK_CONFIGS 中的每个配置跑一遍同一段音频，输出：
+  - 每 chunk 推理耗时（平均 / P95）
+  - 出字延迟估计 = chunk 时长 + 前瞻时长 + P95 推理耗时
+  - RTF（总推理耗时 / 音频时长）
+  - CER（需要提供参考文本）
+
+用法:
+    python benchmark_chunk_sweep.py --wav asr_example_zh.wav --ref "欢迎大家来体验达摩院推出的语音识别模型"
+"""
+
+import argparse
+import time
+
+import soundfile
+import torch
+from funasr import AutoModel
+
+from audio_format import normalize_audio
+from chunk_controller import CHUNK_CONFIGS, FRAME_MS, chunk_duration, chunk_stride
+from perf_stats import char_error_rate, summarize
+
+
+def run_config(model, speech, sample_rate, config):
+    """用一个配置流式识别整段音频，返回 (识别文本, 每 chunk 耗时列表, 总耗时)"""
+    stride = chunk_stride(config)
+    total_chunk_num = int((len(speech) - 1) / stride + 1)
+    cache = {}
+    texts = []
+    times = []
+    total_start = time.perf_counter()
+    for i in range(total_chunk_num):
+        speech_chunk = speech[i * stride:(i + 1) * stride]
+        chunk_start = time.perf_counter()
+        res = model.generate(
+            input=speech_chunk,
+            cache=cache,
+            is_final=i == total_chunk_num - 1,
+            chunk_size=config["chunk_size"],
+            encoder_chunk_look_back=config["encoder_chunk_look_back"],
+            decoder_chunk_look_back=config["decoder_chunk_look_back"],
+        )
+        times.append(time.perf_counter() - chunk_start)
+        if res and res[0].get("text"):
+            texts.append(res[0]["text"])
+    return "".join(texts), times, time.perf_counter() - total_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式 Paraformer chunk 配置扫描")
+    parser.add_argument("--wav", required=True, help="测试音频")
+    parser.add_argument("--ref", default="", help="参考文本（用于计算 CER）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个配置重复次数")
+    args = parser.parse_args()
+
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    print(f"推理设备: {device}")
+    model = AutoModel(model="paraformer-zh-streaming", device=device)
+
+    speech, sample_rate = soundfile.read(args.wav)
+    speech, sample_rate = normalize_audio(speech, sample_rate)
+    audio_duration = len(speech) / sample_rate
+    print(f"音频总长度: {audio_duration:.2f} 秒")
+
+    # 预热，避免第一个配置承担初始化开销
+    run_config(model, speech, sample_rate, CHUNK_CONFIGS[0])
+
+    rows = []
+    for config in CHUNK_CONFIGS:
+        chunk_times = []
+        total_times = []
+        text = ""
+        for _ in range(args.repeat):
+            text, times, total = run_config(model, speech, sample_rate, config)
+            chunk_times.extend(t * 1000 for t in times[:-1] or times)  # 最后一个 chunk 不完整
+            total_times.append(total)
+        stats = summarize(chunk_times)
+        lookahead_ms = config["chunk_size"][2] * FRAME_MS
+        latency_ms = chunk_duration(config) * 1000 + lookahead_ms + stats["p95"]
+        rtf = sum(total_times) / len(total_times) / audio_duration
+        cer = char_error_rate(text, args.ref) if args.ref else None
+        rows.append((config, stats, latency_ms, rtf, cer, text))
+
+    print("\n" + "=" * 60)
+    print("chunk 配置扫描结果:")
+    print("=" * 60)
+    print(f"{'配置':>6} {'look_back':>9} {'平均(ms)':>9} {'P95(ms)':>8} {'出字延迟(ms)':>12} {'RTF':>7} {'CER':>7}")
+    for config, stats, latency_ms, rtf, cer, _ in rows:
+        look_back = f"{config['encoder_chunk_look_back']}/{config['decoder_chunk_look_back']}"
+        cer_text = f"{cer*100:.2f}%" if cer is not None else "-"
+        print(f"{config['name']:>6} {look_back:>9} {stats['avg']:>9.2f} {stats['p95']:>8.2f} "
+              f"{latency_ms:>12.0f} {rtf:>7.3f} {cer_text:>7}")
+    print("\n识别结果:")
+    for config, _, _, _, _, text in rows:
+        print(f"  {config['name']:>6}: {text}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
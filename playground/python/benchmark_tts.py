@@ -0,0 +1,101 @@
+"""
+TTS 首包延迟（TTFA）与实时因子（RTF）基准
+模拟 LLM 流式输出：把每句文本按固定间隔拆成小片段送入 streaming_call，统计
+  - TTFA: 第一次 streaming_call → 第一次 on_data
+  - RTF:  合成总耗时 / 生成的音频时长
+
+用法:
+    python benchmark_tts.py --backend fake
+    python benchmark_tts.py --backend local --model-dir vits-zh-aishell3
+    python benchmark_tts.py --backend dashscope
+"""
+
+import argparse
+import time
+
+from perf_stats import print_latency_summary, summarize
+from tts_backends import TTSCallback, create_tts_backend
+
+SENTENCES = [
+    "你好，我是你的桌面助手，有什么可以帮你的吗？",
+    "让我想一想。",
+    "今天天气不错，适合出去走走，记得带上水。",
+    "抱歉，我没有听清楚，可以再说一遍吗？",
+]
+
+
+class MetricsCallback(TTSCallback):
+    """记录首包时间与音频字节数"""
+
+    def __init__(self):
+        self.first_data_time = None
+        self.audio_bytes = 0
+        self.errors = []
+
+    def on_data(self, data: bytes) -> None:
+        if self.first_data_time is None:
+            self.first_data_time = time.perf_counter()
+        self.audio_bytes += len(data)
+
+    def on_error(self, message: str):
+        self.errors.append(message)
+
+
+def run_once(backend_name, text, fragment_chars, fragment_interval_ms, backend_kwargs):
+    callback = MetricsCallback()
+    backend = create_tts_backend(backend_name, callback=callback, **backend_kwargs)
+    start = time.perf_counter()
+    for i in range(0, len(text), fragment_chars):
+        backend.streaming_call(text[i:i + fragment_chars])
+        time.sleep(fragment_interval_ms / 1000)  # 模拟 LLM 的 token 间隔
+    backend.streaming_complete()
+    end = time.perf_counter()
+
+    audio_seconds = callback.audio_bytes / 2 / backend.sample_rate
+    ttfa = (callback.first_data_time - start) * 1000 if callback.first_data_time else None
+    rtf = (end - start) / audio_seconds if audio_seconds > 0 else None
+    return ttfa, rtf, audio_seconds, callback.errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTS TTFA / RTF 基准")
+    parser.add_argument("--backend", default="fake", choices=["fake", "local", "dashscope"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fragment-chars", type=int, default=3, help="每次 streaming_call 的字数")
+    parser.add_argument("--fragment-interval-ms", type=float, default=30.0, help="片段间隔")
+    parser.add_argument("--sample-rate", type=int, default=22050)
+    parser.add_argument("--model-dir", default=None, help="local 后端的模型目录")
+    parser.add_argument("--fake-first-byte-ms", type=float, default=150.0)
+    parser.add_argument("--fake-rtf", type=float, default=0.1)
+    args = parser.parse_args()
+
+    backend_kwargs = {"sample_rate": args.sample_rate}
+    if args.backend == "local" and args.model_dir:
+        backend_kwargs["model_dir"] = args.model_dir
+    if args.backend == "fake":
+        backend_kwargs.update(first_byte_ms=args.fake_first_byte_ms, rtf=args.fake_rtf)
+
+    print(f"TTS 后端: {args.backend} | 采样率: {args.sample_rate} Hz")
+    print("=" * 60)
+    ttfas, rtfs = [], []
+    for _ in range(args.repeat):
+        for text in SENTENCES:
+            ttfa, rtf, audio_seconds, errors = run_once(
+                args.backend, text, args.fragment_chars, args.fragment_interval_ms, backend_kwargs)
+            if errors:
+                print(f"合成失败: {errors[0]}")
+                continue
+            ttfas.append(ttfa)
+            rtfs.append(rtf)
+            print(f"{text[:12]:<14} TTFA {ttfa:8.2f} ms | 音频 {audio_seconds:5.2f} 秒 | RTF {rtf:.3f}")
+
+    print("=" * 60)
+    print_latency_summary("首包延迟 TTFA", ttfas)
+    rtf_stats = summarize(rtfs)
+    print(f"实时因子 RTF: 平均 {rtf_stats['avg']:.3f} | P95 {rtf_stats['p95']:.3f} | 最大 {rtf_stats['max']:.3f}")
+    print("注意: 流式输入时 RTF 包含等待上游文本的时间，是端到端的合成速度")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
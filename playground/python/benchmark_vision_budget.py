@@ -0,0 +1,146 @@
+"""
+视觉 token 预算基准
+对同一张图片、同一个问题，按不同的视觉 token 上限预缩放后运行 Qwen3-VL，输出：
+  - 预缩放耗时、实际视觉 token 数
+  - 预处理耗时（apply_chat_template）
+  - TTFT（model.generate 调用 → 首个生成 token）
+  - 回答质量：与原始分辨率回答（或 --ref 参考答案）的字符级相似度 1 - CER
+
+用法:
+    python benchmark_vision_budget.py --image screenshot.png --question "这张图片中你看到了什么"
+    python benchmark_vision_budget.py --image 123.jpeg --budgets 64 128 256 512 1024 --ref "一只猫趴在键盘上"
+只检查 fit_to_budget 在各种宽高比下是否超出预算（不加载模型）:
+    python benchmark_vision_budget.py --check-only
+"""
+
+import argparse
+import time
+
+from perf_stats import char_error_rate, summarize
+from vision_budget import fit_to_budget, load_image, open_image, visual_tokens
+
+MODEL_NAME = "Qwen/Qwen3-VL-2B-Instruct"
+# 常见分辨率 + 极端宽高比（长条截图、竖幅长图），短边会被夹到 32
+CHECK_SIZES = [(3840, 2160), (1920, 1080), (1080, 1920), (640, 480), (10000, 32), (32, 10000),
+               (20000, 200), (200, 20000), (5000, 50)]
+
+
+def check_fit_to_budget(budgets):
+    """fit_to_budget 的结果必须不超过预算；返回超出的 (尺寸, 预算, 结果, token 数) 列表"""
+    failures = []
+    for budget in budgets:
+        for width, height in CHECK_SIZES:
+            w, h = fit_to_budget(width, height, budget)
+            if visual_tokens(w, h) > budget:
+                failures.append(((width, height), budget, (w, h), visual_tokens(w, h)))
+    print(f"fit_to_budget 检查: {len(CHECK_SIZES)} 种尺寸 × {len(budgets)} 个预算，超出预算 {len(failures)} 例")
+    for (width, height), budget, (w, h), tokens in failures:
+        print(f"  {width}x{height} 预算 {budget} → {w}x{h}，{tokens} 个视觉 token")
+    return failures
+
+
+class FirstTokenStreamer:
+    """只记录首个生成 token 的时间（generate 开始时对 prompt 的那次 put 不算）"""
+
+    def __init__(self):
+        self.puts = 0
+        self.first_token_time = None
+
+    def put(self, value):
+        self.puts += 1
+        if self.puts == 2 and self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+
+    def end(self):
+        pass
+
+
+def run_once(model, processor, image, question, max_new_tokens):
+    messages = [{"role": "user", "content": [
+        {"type": "image", "image": image},
+        {"type": "text", "text": question},
+    ]}]
+    prep_start = time.perf_counter()
+    inputs = processor.apply_chat_template(
+        messages, tokenize=True, add_generation_prompt=True, return_dict=True, return_tensors="pt")
+    inputs = inputs.to(model.device)
+    prep_ms = (time.perf_counter() - prep_start) * 1000
+
+    streamer = FirstTokenStreamer()
+    start = time.perf_counter()
+    generated = model.generate(**inputs, max_new_tokens=max_new_tokens, streamer=streamer,
+                               do_sample=False, use_cache=True)
+    ttft_ms = ((streamer.first_token_time or time.perf_counter()) - start) * 1000
+    trimmed = generated[0][len(inputs.input_ids[0]):]
+    text = processor.decode(trimmed, skip_special_tokens=True)
+    return text, prep_ms, ttft_ms, int(inputs.input_ids.shape[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="视觉 token 预算 → TTFT / 回答质量")
+    parser.add_argument("--image", help="图片路径或 http 地址")
+    parser.add_argument("--question", default="这张图片中你看到了什么")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[64, 128, 256, 512, 1024, 2048])
+    parser.add_argument("--ref", default="", help="参考答案；为空时与原始分辨率的回答比较")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--check-only", action="store_true", help="只检查 fit_to_budget，不加载模型")
+    args = parser.parse_args()
+
+    if check_fit_to_budget(args.budgets) or args.check_only:
+        return
+    if not args.image:
+        parser.error("需要 --image")
+
+    import torch
+    from modelscope import AutoProcessor, Qwen3VLForConditionalGeneration
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = Qwen3VLForConditionalGeneration.from_pretrained(
+        MODEL_NAME, torch_dtype=torch.bfloat16 if device == "cuda" else torch.float32, device_map="auto")
+    processor = AutoProcessor.from_pretrained(MODEL_NAME)
+
+    with open_image(args.image) as original:
+        original.load()
+        native = original.convert("RGB")
+    print(f"原图尺寸: {native.size[0]}x{native.size[1]} | 设备: {device}")
+
+    # 预热
+    run_once(model, processor, load_image(native, args.budgets[0]), args.question, 1)
+
+    rows = []
+    for budget in list(args.budgets) + [None]:
+        resize_ms = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            image = load_image(args.image, budget)
+            resize_ms.append((time.perf_counter() - start) * 1000)
+        prep, ttft = [], []
+        text = ""
+        for _ in range(args.repeat):
+            text, prep_ms, ttft_ms, prompt_tokens = run_once(
+                model, processor, image, args.question, args.max_new_tokens)
+            prep.append(prep_ms)
+            ttft.append(ttft_ms)
+        rows.append({"budget": budget, "tokens": visual_tokens(*image.size), "size": image.size,
+                     "prompt_tokens": prompt_tokens, "resize": summarize(resize_ms)["p50"],
+                     "prep": summarize(prep)["p50"], "ttft": summarize(ttft)["p50"], "text": text})
+
+    reference = args.ref or rows[-1]["text"]
+    print("=" * 96)
+    print(f"{'预算':>6} {'尺寸':>11} {'视觉token':>9} {'prompt':>7} {'加载缩放(ms)':>12} "
+          f"{'预处理(ms)':>10} {'TTFT(ms)':>9} {'相似度':>7}")
+    for row in rows:
+        similarity = max(0.0, 1.0 - char_error_rate(row["text"], reference))
+        budget = "原图" if row["budget"] is None else str(row["budget"])
+        size = f"{row['size'][0]}x{row['size'][1]}"
+        print(f"{budget:>6} {size:>11} {row['tokens']:>9} {row['prompt_tokens']:>7} {row['resize']:>12.1f} "
+              f"{row['prep']:>10.1f} {row['ttft']:>9.1f} {similarity:>7.2f}")
+    print("=" * 96)
+    for row in rows:
+        budget = "原图" if row["budget"] is None else row["budget"]
+        print(f"[{budget}] {row['text']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+流式会话 cache 的检查与回收
+
+realtime_asr_vad.py / realtime_asr_paraformer.py 里传给 model.generate 的 cache = {}
+在整个音频流期间一直存在。fsmn-vad 的流式 cache 会不断累积历史数据
+（例如 stats 里的音频缓冲、分数、输出段列表），跑几个小时后内存一直上涨。
+
+本模块提供：
+  - inspect_cache(): 递归统计 cache 中的张量/数组数量与字节数
+  - SessionCacheGuard: 在 VAD 断句边界（静音期间）重置 cache，
+    超过硬上限时强制重置（或只告警，留到下一个边界）；并维护时间偏移，使重置后的 VAD 时间戳仍是整条流上的时间
+"""
+
+import sys
+
+import numpy as np
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+
+def _walk(obj, stats, path, seen):
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if TORCH_AVAILABLE and isinstance(obj, torch.Tensor):
+        size = obj.numel() * obj.element_size()
+        stats["tensors"] += 1
+        stats["tensor_bytes"] += size
+        return size
+    if isinstance(obj, np.ndarray):
+        stats["arrays"] += 1
+        stats["array_bytes"] += obj.nbytes
+        return obj.nbytes
+
+    size = 0
+    if isinstance(obj, dict):
+        items = obj.items()
+    elif isinstance(obj, (list, tuple, set)):
+        items = enumerate(obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        # funasr 的 stats 等状态对象
+        items = vars(obj).items()
+    else:
+        size = sys.getsizeof(obj)
+        stats["other_bytes"] += size
+        return size
+
+    for key, value in items:
+        size += _walk(value, stats, path + (key,), seen)
+    return size
+
+
+def inspect_cache(cache):
+    """
+    统计 cache 的内存占用
+
+    返回字典:
+        total_bytes: 总字节数（张量 + 数组 + 其他 Python 对象）
+        tensors / tensor_bytes: torch 张量数量与字节数
+        arrays / array_bytes: numpy 数组数量与字节数
+        other_bytes: 其他 Python 对象（列表里的数值等）
+        by_key: 顶层每个 key 的字节数
+    """
+    stats = {"tensors": 0, "tensor_bytes": 0, "arrays": 0, "array_bytes": 0,
+             "other_bytes": 0, "by_key": {}}
+    seen = set()
+    for key, value in cache.items():
+        stats["by_key"][key] = _walk(value, stats, (key,), seen)
+    stats["total_bytes"] = stats["tensor_bytes"] + stats["array_bytes"] + stats["other_bytes"]
+    return stats
+
+
+def format_cache_stats(stats):
+    """单行展示 inspect_cache() 的结果"""
+    parts = ", ".join(f"{key}={size/1024:.1f}KB" for key, size in stats["by_key"].items())
+    return (f"{stats['total_bytes']/1024:.1f} KB（张量 {stats['tensors']} 个，数组 {stats['arrays']} 个）"
+            + (f" [{parts}]" if parts else ""))
+
+
+class SessionCacheGuard:
+    """
+    参数:
+        soft_limit_bytes: 超过后在下一个 VAD 边界重置（无论距离上次重置多久）
+        hard_limit_bytes: 超过后立即重置（防止一直不停顿的长语音把内存撑爆）
+        reset_every_boundary: 是否在每个 VAD 断句边界都重置
+        check_every: 每隔多少个 chunk 做一次 inspect（inspect 本身需要遍历对象）
+        hard_reset: 超过硬上限时是否在句中立即重置；False 时只告警，等到下一个边界再重置
+            （paraformer 等 ASR 的 cache 保存着当前句的编码 / 解码上下文，句中清空会丢字）
+    """
+
+    def __init__(self, soft_limit_bytes=2 * 1024**2, hard_limit_bytes=32 * 1024**2,
+                 reset_every_boundary=True, check_every=10, hard_reset=True):
+        self.soft_limit_bytes = soft_limit_bytes
+        self.hard_limit_bytes = hard_limit_bytes
+        self.reset_every_boundary = reset_every_boundary
+        self.check_every = check_every
+        self.hard_reset = hard_reset
+
+        self.offset_ms = 0          # 最近一次重置时在整条流上的位置
+        self.chunks = 0
+        self.last_stats = None
+        self.peak_bytes = 0
+        self.resets = {"boundary": 0, "soft": 0, "hard": 0}
+        self.hard_warnings = 0      # hard_reset=False 时超过硬上限、推迟到边界重置的次数
+        self._over_hard = False
+
+    def _reset(self, cache, stream_ms, kind):
+        cache.clear()
+        self._over_hard = False
+        self.offset_ms = stream_ms
+        self.resets[kind] += 1
+
+    def after_chunk(self, cache, stream_ms, at_boundary=False):
+        """
+        每个 chunk 推理后调用
+
+        参数:
+            cache: 会话 cache（原地清空，调用方无需替换引用）
+            stream_ms: 本 chunk 结束时在整条流上的时间（毫秒）
+            at_boundary: 当前是否处于 VAD 断句边界（刚结束一段语音、尚未开始下一段）
+
+        返回: 是否重置了 cache
+        """
+        self.chunks += 1
+        if self.chunks % self.check_every == 0 or at_boundary:
+            self.last_stats = inspect_cache(cache)
+            self.peak_bytes = max(self.peak_bytes, self.last_stats["total_bytes"])
+            if self.last_stats["total_bytes"] > self.hard_limit_bytes:
+                if self.hard_reset or at_boundary:
+                    self._reset(cache, stream_ms, "hard")
+                    return True
+                if not self._over_hard:
+                    self._over_hard = True
+                    self.hard_warnings += 1
+                    print(f"警告: 会话 cache {self.last_stats['total_bytes']/1024:.1f} KB 超过硬上限"
+                          f" {self.hard_limit_bytes/1024:.1f} KB，等到断句边界再重置")
+        if at_boundary:
+            if self.reset_every_boundary:
+                self._reset(cache, stream_ms, "boundary")
+                return True
+            if self.last_stats and self.last_stats["total_bytes"] > self.soft_limit_bytes:
+                self._reset(cache, stream_ms, "soft")
+                return True
+        return False
+
+    def to_stream_time(self, segments):
+        """把重置后从 0 开始的 VAD 时间戳换算为整条流上的时间（-1 保持不变）"""
+        return [[beg if beg == -1 else beg + self.offset_ms,
+                 end if end == -1 else end + self.offset_ms] for beg, end in segments]
+
+    def report(self):
+        print("会话 cache 回收:")
+        if self.last_stats:
+            print(f"  最近一次检查: {format_cache_stats(self.last_stats)}")
+        print(f"  峰值: {self.peak_bytes/1024:.1f} KB")
+        print(f"  重置次数: 断句边界 {self.resets['boundary']} | 软上限 {self.resets['soft']} | "
+              f"硬上限 {self.resets['hard']}")
+        if self.hard_warnings:
+            print(f"  超过硬上限、推迟到边界重置: {self.hard_warnings} 次")
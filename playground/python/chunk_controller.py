@@ -0,0 +1,164 @@
+"""
+流式 Paraformer 的自适应 chunk 大小控制器
+
+realtime_asr_paraformer.py 固定使用 chunk_size = [0, 10, 5]（600ms）以及
+encoder_chunk_look_back=4 / decoder_chunk_look_back=1。
+不同机器、不同负载下最合适的配置并不一样：
+  - 有余量时用更小的 chunk，降低出字延迟
+  - 过载时用更大的 chunk（并减少 look-back），降低每秒推理次数，避免积压
+
+注意：streaming 模型的 cache 与 chunk_size 绑定，配置只能在会话开始或 cache 重置
+（例如 VAD 断句后）的时候切换，控制器通过 select() 在这些时刻给出新的配置。
+"""
+
+import json
+import os
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+    # cpu_percent(interval=None) 返回的是距上次调用的占用率，第一次调用固定返回 0.0，导入时先调用一次
+    psutil.cpu_percent(interval=None)
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# 一帧 60ms（16 kHz 下 960 个采样点），chunk_size[1] 是每个 chunk 的帧数
+FRAME_MS = 60
+FRAME_SAMPLES = 960
+
+# 配置梯度：从低延迟到高吞吐
+CHUNK_CONFIGS = [
+    {"name": "360ms", "chunk_size": [0, 6, 3], "encoder_chunk_look_back": 4, "decoder_chunk_look_back": 1},
+    {"name": "480ms", "chunk_size": [0, 8, 4], "encoder_chunk_look_back": 4, "decoder_chunk_look_back": 1},
+    {"name": "600ms", "chunk_size": [0, 10, 5], "encoder_chunk_look_back": 4, "decoder_chunk_look_back": 1},
+    {"name": "720ms", "chunk_size": [0, 12, 6], "encoder_chunk_look_back": 2, "decoder_chunk_look_back": 1},
+    {"name": "960ms", "chunk_size": [0, 16, 8], "encoder_chunk_look_back": 2, "decoder_chunk_look_back": 0},
+]
+DEFAULT_LEVEL = 2  # 与原脚本相同的 [0, 10, 5]
+
+
+def chunk_stride(config):
+    """配置对应的每个 chunk 的采样点数（16 kHz）"""
+    return config["chunk_size"][1] * FRAME_SAMPLES
+
+
+def chunk_duration(config):
+    """配置对应的 chunk 时长（秒）"""
+    return config["chunk_size"][1] * FRAME_MS / 1000.0
+
+
+def system_load():
+    """当前系统负载，0~1（优先用 psutil 的 CPU 占用率，否则用 1 分钟 loadavg）"""
+    if PSUTIL_AVAILABLE:
+        return psutil.cpu_percent(interval=None) / 100.0
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return 0.0
+
+
+class AdaptiveChunkController:
+    """
+    根据实测的每 chunk 推理耗时（chunk RTF = 推理耗时 / chunk 时长）和系统负载选择配置
+
+    参数:
+        grow_rtf: chunk RTF 的 EWMA 超过该值视为过载，切换到更大的 chunk
+        shrink_rtf: 预计的 chunk RTF 低于该值且负载不高时，切换到更小的 chunk
+        max_load: 系统负载超过该值时不再缩小 chunk，超过 (1+max_load)/2 时直接放大
+        min_chunks: 两次切换之间至少观测的 chunk 数（防抖）
+        alpha: EWMA 平滑系数
+    """
+
+    def __init__(self, configs=CHUNK_CONFIGS, level=DEFAULT_LEVEL, grow_rtf=0.7,
+                 shrink_rtf=0.35, max_load=0.8, min_chunks=10, alpha=0.2):
+        self.configs = configs
+        self.level = level
+        self.grow_rtf = grow_rtf
+        self.shrink_rtf = shrink_rtf
+        self.max_load = max_load
+        self.min_chunks = min_chunks
+        self.alpha = alpha
+        # 每个配置各自的 chunk RTF EWMA，用于预估切换后的表现
+        self.level_rtf = [None] * len(configs)
+        self.chunks_since_switch = 0
+        self.switches = []
+
+    @property
+    def config(self):
+        return self.configs[self.level]
+
+    def observe(self, inference_seconds, audio_seconds=None):
+        """记录一个 chunk 的推理耗时"""
+        if audio_seconds is None:
+            audio_seconds = chunk_duration(self.config)
+        rtf = inference_seconds / audio_seconds if audio_seconds > 0 else 0.0
+        previous = self.level_rtf[self.level]
+        self.level_rtf[self.level] = rtf if previous is None else (
+            self.alpha * rtf + (1 - self.alpha) * previous)
+        self.chunks_since_switch += 1
+
+    def _estimated_rtf(self, level):
+        """预估某个配置的 chunk RTF；没测过时按固定开销模型从当前配置外推"""
+        if self.level_rtf[level] is not None:
+            return self.level_rtf[level]
+        current = self.level_rtf[self.level]
+        if current is None:
+            return None
+        # 推理耗时近似与 chunk 帧数成正比（look-back 帧数不变），RTF 近似不变；
+        # 小 chunk 的固定开销占比更高，保守地按时长反比放大
+        return current * chunk_duration(self.config) / chunk_duration(self.configs[level])
+
+    def select(self, load=None):
+        """
+        在可以切换配置的时刻（会话开始 / cache 重置）调用，返回应使用的配置
+        """
+        if load is None:
+            load = system_load()
+        if self.chunks_since_switch < self.min_chunks:
+            return self.config
+
+        rtf = self.level_rtf[self.level]
+        target = self.level
+        overloaded = (rtf is not None and rtf > self.grow_rtf) or load > (1 + self.max_load) / 2
+        if overloaded and self.level < len(self.configs) - 1:
+            target = self.level + 1
+        elif self.level > 0 and load < self.max_load:
+            estimate = self._estimated_rtf(self.level - 1)
+            if estimate is not None and estimate < self.shrink_rtf:
+                target = self.level - 1
+
+        if target != self.level:
+            self.switches.append((self.configs[self.level]["name"], self.configs[target]["name"], rtf, load))
+            self.level = target
+            self.chunks_since_switch = 0
+        return self.config
+
+    def save_state(self, path):
+        """保存各配置的实测 RTF，下次会话启动时直接复用"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"level": self.level, "level_rtf": self.level_rtf,
+                       "chunks_since_switch": self.chunks_since_switch}, f)
+
+    def load_state(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if len(state.get("level_rtf", [])) == len(self.configs):
+            self.level = state["level"]
+            self.level_rtf = state["level_rtf"]
+            # 沿用上次会话的防抖计数，避免刚启动就基于旧数据立即切换、来回振荡
+            self.chunks_since_switch = state.get("chunks_since_switch", 0)
+
+    def report(self):
+        """打印各配置的实测 RTF 与切换记录"""
+        print("自适应 chunk 控制器:")
+        for config, rtf in zip(self.configs, self.level_rtf):
+            marker = " <- 当前" if config is self.config else ""
+            rtf_text = f"{rtf:.3f}" if rtf is not None else "未测"
+            print(f"  {config['name']:>6} chunk_size={config['chunk_size']} "
+                  f"look_back={config['encoder_chunk_look_back']}/{config['decoder_chunk_look_back']} "
+                  f"chunk RTF={rtf_text}{marker}")
+        for before, after, rtf, load in self.switches:
+            rtf_text = f"{rtf:.3f}" if rtf is not None else "-"
+            print(f"  切换: {before} -> {after}（chunk RTF {rtf_text}，负载 {load*100:.0f}%）")
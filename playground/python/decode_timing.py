@@ -0,0 +1,194 @@
+"""
+逐步解码耗时分解
+qwen3-vl-2b.py 的 StreamingTextStreamer 只记录 token 间隔的平均/最小/最大值，
+GC、显存分配器扩容、CPU 抢占造成的解码卡顿看不出来。
+
+DecodeStepTimer 把每个解码步的间隔拆成:
+  - forward: 模型前向（model.forward 上的 forward pre-hook / hook 计时）
+  - sampling: 前向结束 → streamer.put 开始（logits 处理、argmax/采样、停止条件判断）
+  - streamer: streamer.put 本身（detokenize、打印、下游回调）
+  - other: streamer.put 结束 → 下一次前向开始（KV cache 更新、准备下一步输入）
+每一步同时记录期间是否发生 GC 以及 CUDA 缓存分配器预留显存的增长，方便解释离群点。
+
+用法:
+    timer = DecodeStepTimer(model)
+    # 在 streamer.put 的开头和结尾分别调用 timer.put_begin() / timer.put_end()
+    model.generate(..., streamer=streamer)
+    timer.report()
+    timer.export("decode_steps.json")
+    timer.close()
+"""
+
+import json
+import time
+
+from gc_instrumentation import GcPauseRecorder
+from perf_stats import percentile, summarize
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+PHASES = ("forward", "sampling", "streamer", "other")
+
+# 导出直方图的分桶上界（毫秒）
+HISTOGRAM_BOUNDS_MS = (5, 10, 20, 30, 40, 50, 75, 100, 150, 200, 300, 500, 1000)
+
+
+class DecodeStepTimer:
+    """
+    参数:
+        model: generate 会逐步调用其 forward 的模块
+        sync_cuda: 前向前后调用 torch.cuda.synchronize()，让 GPU 上的前向耗时计入 forward
+                   而不是被推迟到 sampling（.item()/tolist() 时才同步）；会损失少量 CPU/GPU 重叠
+        outlier_factor: 步长超过 P50 的多少倍视为离群点
+    """
+
+    def __init__(self, model, sync_cuda=None, outlier_factor=2.0):
+        self.model = model
+        cuda = TORCH_AVAILABLE and torch.cuda.is_available()
+        self.sync_cuda = cuda if sync_cuda is None else (sync_cuda and cuda)
+        self._track_reserved = cuda
+        self.outlier_factor = outlier_factor
+        self.steps = []            # 每步一个字典: 各阶段毫秒数 + interval + gc + reserved_delta
+        self.prefill_ms = None
+
+        self._forward_start = None
+        self._forward_end = None
+        self._put_start = None
+        self._last_put_end = None
+        self._pending = None
+        self._gc = GcPauseRecorder.acquire()
+        self._gc_cursor = self._gc.cursor()
+        self._reserved = self._reserved_bytes()
+
+        self._handles = [
+            model.register_forward_pre_hook(self._before_forward),
+            model.register_forward_hook(self._after_forward),
+        ]
+
+    def _sync(self):
+        if self.sync_cuda:
+            torch.cuda.synchronize()
+
+    def _reserved_bytes(self):
+        return torch.cuda.memory_reserved() if self._track_reserved else 0
+
+    def _before_forward(self, module, args):
+        self._sync()
+        self._forward_start = time.perf_counter()
+
+    def _after_forward(self, module, args, output):
+        self._sync()
+        self._forward_end = time.perf_counter()
+
+    def put_begin(self):
+        """在 streamer.put 开头调用"""
+        self._put_start = time.perf_counter()
+
+    def put_end(self):
+        """在 streamer.put 结尾调用；generate 开始时对 prompt 的那次 put 没有对应前向，不计入"""
+        now = time.perf_counter()
+        if self._forward_end is None or self._forward_start is None:
+            self._last_put_end = now
+            return
+        if self.prefill_ms is None:
+            # 第一次前向是 prefill（含视觉编码），单独记录，不计入解码步
+            self.prefill_ms = (self._forward_end - self._forward_start) * 1000
+        else:
+            reserved = self._reserved_bytes()
+            pauses = self._gc.since(self._gc_cursor)
+            step = {
+                "forward": (self._forward_end - self._forward_start) * 1000,
+                "sampling": (self._put_start - self._forward_end) * 1000,
+                "streamer": (now - self._put_start) * 1000,
+                "other": (self._forward_start - self._last_put_end) * 1000,
+                "interval": (now - self._last_put_end) * 1000,
+                "gc_runs": len(pauses),
+                "gc_ms": sum(pause[1] for pause in pauses),
+                "reserved_delta_mb": (reserved - self._reserved) / 1024**2,
+            }
+            self._reserved = reserved
+            self.steps.append(step)
+        self._gc_cursor = self._gc.advance(self._gc_cursor)
+        self._forward_start = None
+        self._forward_end = None
+        self._last_put_end = now
+
+    def close(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        if self._gc is not None:
+            self._gc.release()
+            self._gc = None
+
+    def outliers(self):
+        """步长超过 P50 × outlier_factor 的解码步 [(序号, step)]"""
+        if not self.steps:
+            return []
+        threshold = percentile([s["interval"] for s in self.steps], 50) * self.outlier_factor
+        return [(i, s) for i, s in enumerate(self.steps) if s["interval"] > threshold]
+
+    def histogram(self, bounds_ms=HISTOGRAM_BOUNDS_MS):
+        """解码步间隔的分桶计数 [(上界, 计数)]，最后一个上界为 inf"""
+        counts = [0] * (len(bounds_ms) + 1)
+        for step in self.steps:
+            index = next((i for i, bound in enumerate(bounds_ms) if step["interval"] <= bound), len(bounds_ms))
+            counts[index] += 1
+        return list(zip(list(bounds_ms) + [float("inf")], counts))
+
+    def report(self, max_outliers=10):
+        print("解码步耗时分解:")
+        if self.prefill_ms is not None:
+            print(f"  prefill 前向: {self.prefill_ms:.2f} 毫秒")
+        if not self.steps:
+            print("  无解码步数据")
+            return
+        print(f"  {'阶段':<10} {'平均':>8} {'P50':>8} {'P90':>8} {'P99':>8} {'最大':>8}  (毫秒, {len(self.steps)} 步)")
+        for phase in PHASES + ("interval",):
+            stats = summarize([s[phase] for s in self.steps])
+            print(f"  {phase:<10} {stats['avg']:>8.2f} {stats['p50']:>8.2f} {stats['p90']:>8.2f} "
+                  f"{stats['p99']:>8.2f} {stats['max']:>8.2f}")
+
+        intervals = [s["interval"] for s in self.steps]
+        stats = summarize(intervals)
+        # 抖动：相邻步间隔差的平均绝对值，反映送给 TTS 的 token 节奏是否平稳
+        jitter = (sum(abs(b - a) for a, b in zip(intervals, intervals[1:])) / (len(intervals) - 1)
+                  if len(intervals) > 1 else 0.0)
+        print(f"  token 节奏: P99/P50 = {stats['p99'] / stats['p50']:.2f} | 平均抖动 {jitter:.2f} 毫秒"
+              if stats["p50"] > 0 else f"  平均抖动 {jitter:.2f} 毫秒")
+
+        outliers = self.outliers()
+        print(f"  离群步（> P50 × {self.outlier_factor:g}）: {len(outliers)} 个")
+        for index, step in sorted(outliers, key=lambda item: -item[1]["interval"])[:max_outliers]:
+            dominant = max(PHASES, key=lambda phase: step[phase])
+            notes = []
+            if step["gc_runs"]:
+                notes.append(f"GC {step['gc_runs']} 次 {step['gc_ms']:.1f}ms")
+            if step["reserved_delta_mb"] > 0:
+                notes.append(f"预留显存 +{step['reserved_delta_mb']:.0f}MB")
+            print(f"    第 {index + 1} 步: {step['interval']:.2f} 毫秒，主要在 {dominant} "
+                  f"({step[dominant]:.2f} 毫秒){' | ' + ', '.join(notes) if notes else ''}")
+
+        print("  间隔直方图:")
+        peak = max(count for _, count in self.histogram()) or 1
+        lower = 0
+        for bound, count in self.histogram():
+            label = f"{lower}-{bound:g}" if bound != float("inf") else f">{lower}"
+            print(f"    {label:>10} ms | {'#' * round(count / peak * 40)} {count}")
+            lower = bound
+
+    def export(self, path):
+        """导出每步明细与直方图（JSON）"""
+        document = {
+            "prefill_ms": self.prefill_ms,
+            "steps": self.steps,
+            "summary": {phase: summarize([s[phase] for s in self.steps]) for phase in PHASES + ("interval",)},
+            "histogram": [{"le_ms": None if bound == float("inf") else bound, "count": count}
+                          for bound, count in self.histogram()],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=1)
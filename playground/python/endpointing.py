@@ -0,0 +1,136 @@
+"""
+提前断句（Early Endpointing）
+
+realtime_asr_paraformer.py 只在文件最后一个 chunk 设置 is_final=True。
+真实麦克风没有"最后一个 chunk"，只能等 VAD 的尾部静音超时（fsmn-vad 默认 800ms）
+才知道一句话结束，最终文本因此总要多等一段时间。
+
+Endpointer 综合两路信号决定什么时候对 paraformer 做 is_final 冲刷并重置 cache：
+  1. 硬断句：fsmn-vad 流式输出的结束事件（[[-1, end]] 或 [[beg, end]]）
+  2. 提前断句：ASR 部分结果连续若干 chunk 没有新增文字（结果稳定），
+     并且尾部能量静音已经超过 min_silence_ms（远小于 VAD 超时）
+
+同时统计"语音结束 → 最终文本产出"的延迟分布。语音结束时刻以 VAD 的 end 时间戳为准，
+提前断句时 VAD 结束事件会晚一些才到，到达后再补记延迟。
+"""
+
+import numpy as np
+
+from perf_stats import print_latency_summary, summarize
+
+REASON_VAD = "vad"
+REASON_EARLY = "early"
+
+
+def trailing_silence_ms(chunk, sample_rate, silence_rms, frame_ms=10):
+    """
+    计算 chunk 末尾连续静音时长（毫秒），按 10ms 帧计算 RMS，向量化实现
+
+    返回: (末尾静音时长, 整个 chunk 是否全为静音)
+    """
+    frame = int(sample_rate * frame_ms / 1000)
+    usable = len(chunk) - len(chunk) % frame
+    if usable == 0:
+        return 0.0, True
+    frames = np.asarray(chunk[:usable], dtype=np.float32).reshape(-1, frame)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    voiced = np.flatnonzero(rms >= silence_rms)
+    if len(voiced) == 0:
+        return len(rms) * frame_ms, True
+    return (len(rms) - 1 - voiced[-1]) * frame_ms, False
+
+
+class Endpointer:
+    """
+    参数:
+        stable_chunks: 部分结果连续多少个 chunk 无新增文字视为稳定
+        min_silence_ms: 提前断句要求的最短尾部静音
+        silence_rms: 能量静音阈值（float32 样本 RMS）
+    """
+
+    def __init__(self, stable_chunks=1, min_silence_ms=300, silence_rms=0.01):
+        self.stable_chunks = stable_chunks
+        self.min_silence_ms = min_silence_ms
+        self.silence_rms = silence_rms
+
+        self.text = ""               # 当前句子已识别的文字
+        self.stable_count = 0
+        self.silence_ms = 0.0
+        self.vad_in_speech = False
+        self._vad_end_ms = None
+
+        self._pending_early = []     # 提前断句后还在等待 VAD 结束时间戳的记录（产出时刻 ms）
+        self.latencies_ms = {REASON_VAD: [], REASON_EARLY: []}
+        self.false_early = 0         # 提前断句后用户其实还在说（VAD 未结束就出现新文字）
+
+    def update(self, chunk, sample_rate, partial_text, vad_segments):
+        """
+        每个 chunk 识别完之后调用
+
+        参数:
+            chunk: 本 chunk 的 float32 音频
+            partial_text: paraformer 本 chunk 新增的文字
+            vad_segments: fsmn-vad 本 chunk 的输出 res[0]["value"]
+
+        返回: 需要冲刷时返回断句原因（"vad" / "early"），否则返回 None
+        """
+        vad_end_ms = None
+        for beg, end in vad_segments:
+            if beg != -1:
+                self.vad_in_speech = True
+            if end != -1:
+                self.vad_in_speech = False
+                vad_end_ms = end
+
+        if partial_text:
+            if self._pending_early and self.vad_in_speech:
+                # 提前断句之后 VAD 仍在语音段内又出了新文字：这次提前断句是误判
+                self.false_early += len(self._pending_early)
+                self._pending_early.clear()
+            self.text += partial_text
+            self.stable_count = 0
+        elif self.text:
+            self.stable_count += 1
+
+        silence, all_silent = trailing_silence_ms(chunk, sample_rate, self.silence_rms)
+        self.silence_ms = self.silence_ms + silence if all_silent else silence
+
+        if vad_end_ms is not None:
+            self._vad_end_ms = vad_end_ms
+            # 之前已经提前断句的，用 VAD 的结束时间戳补记延迟
+            for emit_ms in self._pending_early:
+                self.latencies_ms[REASON_EARLY].append(emit_ms - vad_end_ms)
+            self._pending_early.clear()
+            if self.text:
+                return REASON_VAD
+            return None
+
+        if (self.text and self.stable_count >= self.stable_chunks
+                and self.silence_ms >= self.min_silence_ms):
+            return REASON_EARLY
+        return None
+
+    def finalized(self, reason, emit_ms):
+        """
+        冲刷完成后调用
+
+        参数:
+            reason: update() 返回的断句原因
+            emit_ms: 最终文本产出时刻（音频时间轴，毫秒；= chunk 结束时刻 + 推理与冲刷耗时）
+        """
+        if reason == REASON_VAD:
+            self.latencies_ms[REASON_VAD].append(emit_ms - self._vad_end_ms)
+        else:
+            self._pending_early.append(emit_ms)
+        self.text = ""
+        self.stable_count = 0
+
+    def report(self):
+        """打印语音结束到最终文本的延迟分布"""
+        print("语音结束 → 最终文本 延迟分布:")
+        all_latencies = self.latencies_ms[REASON_VAD] + self.latencies_ms[REASON_EARLY]
+        print_latency_summary("  全部断句", all_latencies, indent="    ")
+        print_latency_summary("  VAD 硬断句", self.latencies_ms[REASON_VAD], indent="    ")
+        print_latency_summary("  提前断句", self.latencies_ms[REASON_EARLY], indent="    ")
+        print(f"  提前断句误判次数（断句后继续说话）: {self.false_early}")
+        return summarize(all_latencies)
@@ -0,0 +1,295 @@
+"""
+摄像头帧接入：按固定帧率采样、感知哈希去重、视觉编码结果缓存
+qwen3-vl-2b.py 只处理一张静态图片；让虚拟角色"看"用户的摄像头时，如果每一帧都送进
+视觉编码器，显存和延迟都会爆炸，而摄像头画面大部分时间几乎不变。
+
+FrameIngest 的处理流程:
+  1. 按 fps 采样（丢掉两次采样之间的帧）
+  2. 对采样帧计算 64 位差值哈希（dHash，NumPy 向量化的块平均缩小 + 水平梯度符号），
+     与上一张保留帧的汉明距离不超过 threshold 时视为重复，继续使用上一张保留帧
+  3. 只有保留下来的帧才会成为新的"当前画面"交给 VLM
+
+memoize_visual_encoder 包装 Qwen3-VL 的 get_image_features，按像素内容缓存视觉编码输出：
+重复帧复用的是同一张保留帧，像素完全相同，直接命中缓存，不再运行视觉编码器。
+因此每分钟视频的视觉计算量与画面的变化程度成正比。
+
+用法:
+    ingest = FrameIngest(fps=2, threshold=6)
+    for timestamp, frame in camera_frames(0):
+        ingest.push(frame, timestamp)
+    image = ingest.current_image()            # PIL.Image，交给 processor.apply_chat_template
+
+qwen3-vl-2b.py 中设置 VL_CAMERA=<摄像头编号|视频文件|synthetic> 时（create_camera_from_env），
+图像改为取自摄像头当前画面，并启用 memoize_visual_encoder；结束前再追问 VL_CAMERA_TURNS 轮，
+对比画面不变时视觉编码缓存的效果。
+
+模拟基准（静止画面 + 偶尔的场景变化 + 传感器噪声）:
+    python frame_ingest.py --synthetic --seconds 60
+摄像头 / 视频文件（需要 opencv-python）:
+    python frame_ingest.py --source 0 --seconds 30
+"""
+
+import argparse
+import collections
+import hashlib
+import os
+import time
+
+import numpy as np
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+HASH_SIZE = 8
+
+
+def to_gray(frame):
+    """(H, W, 3) uint8 RGB → (H, W) float32 灰度；已是灰度时直接转换类型"""
+    if frame.ndim == 2:
+        return frame.astype(np.float32)
+    return frame[..., :3].astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def block_mean(gray, rows, cols):
+    """把灰度图按块平均缩小到 (rows, cols)，裁掉除不尽的边缘"""
+    height, width = gray.shape
+    bh, bw = height // rows, width // cols
+    cropped = gray[:bh * rows, :bw * cols]
+    return cropped.reshape(rows, bh, cols, bw).mean(axis=(1, 3))
+
+
+def dhash(frame, hash_size=HASH_SIZE):
+    """差值哈希：缩小到 hash_size × (hash_size + 1)，比较相邻像素亮度，返回整数"""
+    small = block_mean(to_gray(frame), hash_size, hash_size + 1)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class FrameIngest:
+    """
+    参数:
+        fps: 采样帧率
+        threshold: 与上一张保留帧的汉明距离不超过该值视为重复（64 位哈希，0-64）
+        refresh_s: 画面一直不变时，每隔多少秒强制保留一帧（防止缓慢变化被一直忽略）
+    """
+
+    def __init__(self, fps=2.0, threshold=6, refresh_s=30.0):
+        self.interval = 1.0 / fps
+        self.threshold = threshold
+        self.refresh_s = refresh_s
+        self._next_sample = None
+        self._current = None          # (timestamp, frame, hash)
+        self.frames_in = 0
+        self.sampled = 0
+        self.kept = 0
+        self.hash_seconds = 0.0
+
+    def push(self, frame, timestamp):
+        """送入一帧，返回 True 表示这一帧成为新的当前画面"""
+        self.frames_in += 1
+        if self._next_sample is not None and timestamp < self._next_sample:
+            return False
+        self._next_sample = timestamp + self.interval
+        self.sampled += 1
+
+        start = time.perf_counter()
+        frame_hash = dhash(frame)
+        self.hash_seconds += time.perf_counter() - start
+
+        if self._current is not None:
+            last_time, _, last_hash = self._current
+            if hamming(frame_hash, last_hash) <= self.threshold and timestamp - last_time < self.refresh_s:
+                return False
+        self._current = (timestamp, frame, frame_hash)
+        self.kept += 1
+        return True
+
+    def current_frame(self):
+        return None if self._current is None else self._current[1]
+
+    def current_image(self):
+        """当前画面的 PIL.Image（同一张保留帧多次调用返回像素相同的图像，视觉编码缓存可以命中）"""
+        from PIL import Image
+
+        frame = self.current_frame()
+        return None if frame is None else Image.fromarray(frame)
+
+    def report(self):
+        print("帧接入:")
+        print(f"  输入帧: {self.frames_in} | 采样: {self.sampled} | 保留（送入视觉编码器）: {self.kept}")
+        if self.sampled:
+            print(f"  重复帧比例: {(1 - self.kept / self.sampled) * 100:.1f}%")
+            print(f"  每帧哈希耗时: {self.hash_seconds / self.sampled * 1000:.3f} 毫秒")
+
+
+class _EncoderCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+
+    def report(self):
+        lookups = self.hits + self.misses
+        print("视觉编码缓存:")
+        print(f"  命中: {self.hits} | 未命中（运行编码器）: {self.misses} | "
+              f"命中率: {self.hits / lookups * 100 if lookups else 0:.1f}%")
+        print(f"  编码器累计耗时: {self.encode_seconds:.2f} 秒")
+
+
+def memoize_visual_encoder(model, max_entries=16):
+    """
+    按像素内容缓存 Qwen3-VL 的视觉编码输出（包装 model.model.get_image_features）
+
+    返回缓存对象（可调用 report()）；缓存键为 pixel_values 与 image_grid_thw 的 blake2b 摘要，
+    计算摘要只需要读一遍预处理后的像素，远小于一次视觉编码器前向。
+    """
+    import torch
+
+    inner = model.model if hasattr(model.model, "get_image_features") else model
+    original = inner.get_image_features
+    cache = _EncoderCache(max_entries)
+
+    def get_image_features(pixel_values, image_grid_thw=None, **kwargs):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(pixel_values.detach().cpu().contiguous().view(-1).view(torch.uint8).numpy())
+        if image_grid_thw is not None:
+            digest.update(image_grid_thw.detach().cpu().numpy().tobytes())
+        key = digest.hexdigest()
+        if key in cache.entries:
+            cache.hits += 1
+            cache.entries.move_to_end(key)
+            return cache.entries[key]
+        cache.misses += 1
+        start = time.perf_counter()
+        result = original(pixel_values, image_grid_thw, **kwargs)
+        cache.encode_seconds += time.perf_counter() - start
+        cache.entries[key] = result
+        if len(cache.entries) > cache.max_entries:
+            cache.entries.popitem(last=False)
+        return result
+
+    inner.get_image_features = get_image_features
+    return cache
+
+
+class CameraFeed:
+    """
+    摄像头 / 视频 / 模拟画面 + FrameIngest；advance(seconds) 继续读取一段时间的帧
+
+    参数:
+        source: 摄像头编号、视频文件路径或 "synthetic"
+    """
+
+    def __init__(self, source, fps=2.0, threshold=6):
+        self.source = source
+        self.ingest = FrameIngest(fps=fps, threshold=threshold)
+        if source == "synthetic":
+            self._frames = synthetic_frames(seconds=3600.0)
+        else:
+            self._frames = camera_frames(int(source) if source.isdigit() else source)
+        self.position = 0.0   # 已读取到的画面时间（秒）
+
+    def advance(self, seconds):
+        """读取 seconds 秒的帧，返回其中成为新画面的帧数"""
+        until = self.position + seconds
+        changed = 0
+        for timestamp, frame in self._frames:
+            changed += self.ingest.push(frame, timestamp)
+            self.position = timestamp
+            if timestamp >= until:
+                break
+        return changed
+
+    def current_image(self):
+        return self.ingest.current_image()
+
+
+def create_camera_from_env():
+    """
+    VL_CAMERA 设置时返回 CameraFeed，否则返回 None
+    VL_CAMERA_FPS（默认 2）/ VL_CAMERA_THRESHOLD（默认 6）对应 FrameIngest 的参数
+    """
+    source = os.environ.get("VL_CAMERA")
+    if not source:
+        return None
+    return CameraFeed(source, fps=float(os.environ.get("VL_CAMERA_FPS", "2")),
+                      threshold=int(os.environ.get("VL_CAMERA_THRESHOLD", "6")))
+
+
+def camera_frames(source=0):
+    """从摄像头编号或视频文件读取 RGB 帧，产出 (时间戳秒, 帧)"""
+    if not CV2_AVAILABLE:
+        raise RuntimeError("读取摄像头需要 opencv-python: pip install opencv-python")
+    capture = cv2.VideoCapture(source)
+    start = time.perf_counter()
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield time.perf_counter() - start, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        capture.release()
+
+
+def synthetic_frames(seconds=60.0, fps=30, changes_per_minute=4, size=(480, 640), seed=0):
+    """静止画面 + 每分钟若干次场景切换 + 传感器噪声 + 偶尔的小幅运动"""
+    rng = np.random.default_rng(seed)
+    height, width = size
+    change_times = set(rng.choice(int(seconds * fps), int(changes_per_minute * seconds / 60), replace=False))
+
+    def scene():
+        y, x = np.mgrid[0:height, 0:width]
+        base = (np.sin(x / rng.uniform(20, 80) + rng.uniform(0, 6)) +
+                np.cos(y / rng.uniform(20, 80) + rng.uniform(0, 6)))
+        gray = ((base + 2) * 63).astype(np.uint8)
+        return np.stack([gray, np.roll(gray, 7, axis=1), np.roll(gray, 13, axis=0)], axis=-1)
+
+    current = scene()
+    for index in range(int(seconds * fps)):
+        if index in change_times:
+            current = scene()
+        noise = rng.integers(-3, 4, size=current.shape, dtype=np.int16)
+        frame = np.clip(current.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        if rng.random() < 0.02:
+            frame = np.roll(frame, int(rng.integers(-2, 3)), axis=1)
+        yield index / fps, frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="摄像头帧采样与去重")
+    parser.add_argument("--source", default="0", help="摄像头编号或视频文件")
+    parser.add_argument("--synthetic", action="store_true", help="使用模拟画面（不需要摄像头）")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--fps", type=float, default=2.0, help="采样帧率")
+    parser.add_argument("--threshold", type=int, default=6, help="去重的汉明距离阈值")
+    args = parser.parse_args()
+
+    ingest = FrameIngest(fps=args.fps, threshold=args.threshold)
+    if args.synthetic:
+        frames = synthetic_frames(args.seconds)
+    else:
+        frames = camera_frames(int(args.source) if args.source.isdigit() else args.source)
+    for timestamp, frame in frames:
+        if timestamp > args.seconds:
+            break
+        ingest.push(frame, timestamp)
+
+    print("=" * 60)
+    ingest.report()
+    minutes = args.seconds / 60
+    print(f"  每分钟送入视觉编码器: {ingest.kept / minutes:.1f} 帧（不去重时 {ingest.sampled / minutes:.1f} 帧）")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
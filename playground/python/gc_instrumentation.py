@@ -0,0 +1,317 @@
+"""
+GC 停顿记录与加载后堆冻结
+realtime_asr_vad.py / realtime_asr_paraformer.py 的 chunk 耗时偶尔出现原因不明的最大值。
+torch / funasr / modelscope 加载模型时创建了数百万个 Python 对象（模块、函数、配置字典、
+nn.Module 树等），Python 的分代 GC 每次做第 2 代（完整）回收都要遍历它们，
+这段停顿恰好落在某个 chunk 里就成了尾延迟。
+
+GcPauseRecorder: 进程内唯一的 gc.callbacks 回调，记录每一次 GC 停顿（开始时刻、时长、代数、
+回收对象数）。GcMonitor、profiling_hooks.SlowChunkProfiler、decode_timing.DecodeStepTimer
+都从它读取停顿，同时启用多个工具时也只注册一个回调。
+
+GcMonitor: 按时间窗口把停顿归到 chunk 上（停顿与 chunk 窗口重叠的部分），
+报告 含 GC 的 chunk 与不含 GC 的 chunk 的延迟分布。
+
+tune_gc: 模型加载完成后
+  - gc.freeze(): 先 gc.collect() 清理加载过程中的垃圾，再把现存对象全部移入永久代，之后的回收不再遍历它们
+  - gc.set_threshold(): 提高第 0 代阈值（默认 700），减少推理循环中小回收的次数
+
+脚本中通过环境变量启用（在模型加载完成之后调用 create_gc_monitor_from_env）:
+    GC_MONITOR=1            记录 GC 停顿并在结束时报告
+    GC_FREEZE=1             冻结加载后的堆
+    GC_THRESHOLD=50000,20,20
+
+基准（模拟加载后的大堆 + 推理循环，每种配置在独立子进程中运行）:
+    python gc_instrumentation.py --heap-objects 3000000 --chunks 400
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from perf_stats import print_latency_summary, summarize
+
+
+class GcPauseRecorder:
+    """
+    进程内共享的 GC 停顿记录（gc.callbacks 只注册一次）
+
+    用法:
+        recorder = GcPauseRecorder.acquire()
+        cursor = recorder.cursor()
+        ...
+        pauses = recorder.since(cursor)          # cursor 之后结束的停顿
+        cursor = recorder.advance(cursor)        # 或用完后 recorder.release_cursor(cursor)
+        recorder.release()
+
+    cursor 是停顿的绝对序号；比所有未释放的 cursor 都旧的停顿会被丢弃，长时间运行时记录不会无限增长。
+    丢弃只在 cursor / since 等读取方法里做（持有锁），gc 回调只追加：
+    回调可能在读取方分配内存时同线程触发，回调里缩短列表会破坏正在进行的切片。
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.pauses = []     # (开始 perf_counter, 时长 ms, 代数, 回收对象数)，按时间有序
+        self._base = 0       # pauses[0] 的绝对序号
+        self._live = {}      # 未释放的 cursor → 持有数
+        self._pauses_lock = threading.Lock()
+        self._start = None
+        self._users = 0
+
+    @classmethod
+    def acquire(cls):
+        """取得共享实例；第一个使用者注册 gc 回调"""
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            recorder = cls._instance
+            if recorder._users == 0:
+                gc.callbacks.append(recorder._on_gc)
+            recorder._users += 1
+            return recorder
+
+    def release(self):
+        """最后一个使用者释放时移除回调并清空记录"""
+        with self._lock:
+            self._users -= 1
+            if self._users == 0:
+                if self._on_gc in gc.callbacks:
+                    gc.callbacks.remove(self._on_gc)
+                with self._pauses_lock:
+                    self._base += len(self.pauses)
+                    self.pauses = []
+                    self._live.clear()
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            end = time.perf_counter()
+            self.pauses.append((self._start, (end - self._start) * 1000, info["generation"], info["collected"]))
+            self._start = None
+
+    def _trim(self):
+        """丢弃比最旧的未释放 cursor 还早的停顿（调用方持有 _pauses_lock）"""
+        oldest = min(self._live) if self._live else self._base + len(self.pauses)
+        if oldest > self._base:
+            del self.pauses[:oldest - self._base]
+            self._base = oldest
+
+    def cursor(self):
+        """登记并返回当前位置；用完后调用 release_cursor（或用 advance 换成新的）"""
+        with self._pauses_lock:
+            self._trim()
+            cursor = self._base + len(self.pauses)
+            self._live[cursor] = self._live.get(cursor, 0) + 1
+            return cursor
+
+    def since(self, cursor):
+        with self._pauses_lock:
+            return self.pauses[max(0, cursor - self._base):]
+
+    def release_cursor(self, cursor):
+        with self._pauses_lock:
+            count = self._live.get(cursor, 0)
+            if count > 1:
+                self._live[cursor] = count - 1
+            elif count:
+                del self._live[cursor]
+            self._trim()
+
+    def advance(self, cursor):
+        """释放旧 cursor，返回当前位置的新 cursor"""
+        self.release_cursor(cursor)
+        return self.cursor()
+
+
+def overlap_ms(pause, start, end):
+    """一次停顿与 [start, end) 窗口重叠的毫秒数"""
+    pause_start, pause_ms = pause[0], pause[1]
+    return max(0.0, min(end, pause_start + pause_ms / 1000) - max(start, pause_start)) * 1000
+
+
+class GcMonitor:
+    """记录每次 GC 停顿，并与 chunk 的时间窗口对齐"""
+
+    def __init__(self):
+        self.chunks = []     # (序号, 开始 perf_counter, 结束 perf_counter)
+        self._recorder = GcPauseRecorder.acquire()
+        self._cursor = self._recorder.cursor()
+        self._closed_pauses = None
+
+    @property
+    def pauses(self):
+        """本监视器创建以来的停顿 (开始 perf_counter, 时长 ms, 代数, 回收对象数)"""
+        if self._closed_pauses is not None:
+            return self._closed_pauses
+        return self._recorder.since(self._cursor)
+
+    def record_chunk(self, index, start, end):
+        """登记一个 chunk 的执行窗口（perf_counter 时间，与脚本里的 chunk_start / chunk_end 相同）"""
+        self.chunks.append((index, start, end))
+
+    def chunk_gc_ms(self):
+        """
+        每个 chunk 窗口内的 GC 停顿时长：按重叠部分计，chunk 开始前就已开始、延续到 chunk 里的停顿也算在内
+        （pauses 与 chunks 都按时间有序，双指针归并）
+        """
+        pauses = self.pauses
+        result = []
+        k = 0
+        for _, start, end in self.chunks:
+            # 跳过在 chunk 开始前就已结束的停顿
+            while k < len(pauses) and pauses[k][0] + pauses[k][1] / 1000 <= start:
+                k += 1
+            total = 0.0
+            j = k
+            while j < len(pauses) and pauses[j][0] < end:
+                total += overlap_ms(pauses[j], start, end)
+                j += 1
+            result.append(total)
+        return result
+
+    def close(self):
+        if self._closed_pauses is None:
+            self._closed_pauses = self.pauses
+            self._recorder.release_cursor(self._cursor)
+            self._recorder.release()
+
+    def summary(self):
+        chunk_ms = [(end - start) * 1000 for _, start, end in self.chunks]
+        gc_ms = self.chunk_gc_ms()
+        return {
+            "pauses": len(self.pauses),
+            "full_pauses": sum(1 for p in self.pauses if p[2] == 2),
+            "pause_max_ms": max((p[1] for p in self.pauses), default=0.0),
+            "pause_total_ms": sum(p[1] for p in self.pauses),
+            "chunk": summarize(chunk_ms),
+            "chunk_gc_free": summarize([ms for ms, g in zip(chunk_ms, gc_ms) if g == 0.0]),
+            "chunks_with_gc": sum(1 for g in gc_ms if g > 0.0),
+        }
+
+    def report(self, top=5):
+        print("GC 停顿:")
+        print(f"  阈值: {gc.get_threshold()} | 冻结对象数: {gc.get_freeze_count()}")
+        for generation in range(3):
+            pauses = [p[1] for p in self.pauses if p[2] == generation]
+            if pauses:
+                print(f"  第 {generation} 代: {len(pauses)} 次 | 合计 {sum(pauses):.2f} 毫秒 | 最长 {max(pauses):.2f} 毫秒")
+        if not self.chunks:
+            return
+        chunk_ms = [(end - start) * 1000 for _, start, end in self.chunks]
+        gc_ms = self.chunk_gc_ms()
+        print_latency_summary("  全部 chunk", chunk_ms, indent="    ")
+        print_latency_summary("  不含 GC 的 chunk", [ms for ms, g in zip(chunk_ms, gc_ms) if g == 0.0], indent="    ")
+        slowest = sorted(zip(chunk_ms, gc_ms, (c[0] for c in self.chunks)), reverse=True)[:top]
+        print(f"  最慢的 {len(slowest)} 个 chunk:")
+        for ms, g, index in slowest:
+            print(f"    chunk {index}: {ms:.2f} 毫秒（其中 GC {g:.2f} 毫秒）")
+
+
+def tune_gc(freeze=True, threshold=None):
+    """模型加载完成后调用；返回调整前的阈值"""
+    previous = gc.get_threshold()
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    if threshold:
+        gc.set_threshold(*threshold)
+    return previous
+
+
+def create_gc_monitor_from_env():
+    """
+    按 GC_FREEZE / GC_THRESHOLD 调整 GC；GC_MONITOR 或任一调整开启时返回 GcMonitor，否则返回 None
+    """
+    freeze = os.environ.get("GC_FREEZE") == "1"
+    threshold = os.environ.get("GC_THRESHOLD")
+    threshold = tuple(int(v) for v in threshold.split(",")) if threshold else None
+    if freeze or threshold:
+        tune_gc(freeze, threshold)
+        print(f"GC: 冻结 {gc.get_freeze_count()} 个对象 | 阈值 {gc.get_threshold()}")
+    if os.environ.get("GC_MONITOR") == "1" or freeze or threshold:
+        return GcMonitor()
+    return None
+
+
+class _Node:
+    """模拟加载后的对象图：带引用环的小对象（类似 nn.Module 树与配置字典）"""
+
+    __slots__ = ("children", "parent", "attrs")
+
+    def __init__(self, parent=None):
+        self.children = []
+        self.parent = parent
+        self.attrs = {}
+
+
+def _build_heap(objects):
+    root = _Node()
+    nodes = [root]
+    for n in range(objects // 3):
+        node = _Node(nodes[n // 8])
+        node.attrs["name"] = [n]
+        nodes[n // 8].children.append(node)
+        nodes.append(node)
+    return nodes
+
+
+def _measure(config, heap_objects, chunks, chunk_work_ms):
+    """在当前（全新）进程中运行一种配置，结果以 JSON 打印到标准输出最后一行"""
+    heap = _build_heap(heap_objects)
+    if config != "baseline":
+        tune_gc(freeze=True, threshold=(50000, 20, 20) if config == "freeze+threshold" else None)
+    monitor = GcMonitor()
+    history = []
+    for i in range(chunks):
+        start = time.perf_counter()
+        # 推理循环的 Python 开销：每个 chunk 产生上千个临时容器，少量结果一直保留（类似结果列表 / cache）
+        scratch = [{"frame": k, "feats": [k, k + 1]} for k in range(2000)]
+        history.append([scratch[k] for k in range(0, 2000, 20)])
+        end_work = start + chunk_work_ms / 1000
+        while time.perf_counter() < end_work:
+            pass
+        monitor.record_chunk(i, start, time.perf_counter())
+    monitor.close()
+    del heap
+    print(json.dumps(monitor.summary()))
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "_measure":
+        _measure(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), float(sys.argv[5]))
+        return
+
+    parser = argparse.ArgumentParser(description="GC 停顿对 chunk 尾延迟的影响")
+    parser.add_argument("--heap-objects", type=int, default=3_000_000, help="模拟加载后堆上的对象数")
+    parser.add_argument("--chunks", type=int, default=400)
+    parser.add_argument("--chunk-work-ms", type=float, default=5.0, help="每个 chunk 的模拟计算耗时")
+    args = parser.parse_args()
+
+    print("=" * 78)
+    print(f"模拟堆: {args.heap_objects} 个对象 | chunk: {args.chunks} 个，每个 {args.chunk_work_ms:.0f} ms 计算")
+    print("=" * 78)
+    print(f"{'配置':<20} {'GC次数':>7} {'完整回收':>8} {'最长停顿':>10} {'P50':>8} {'P99':>8} {'最大':>8}")
+    for config in ("baseline", "freeze", "freeze+threshold"):
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "_measure", config,
+                               str(args.heap_objects), str(args.chunks), str(args.chunk_work_ms)],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{config:<20} 失败: {proc.stderr.strip().splitlines()[-1]}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{config:<20} {r['pauses']:>7} {r['full_pauses']:>8} {r['pause_max_ms']:>8.2f}ms "
+              f"{r['chunk']['p50']:>6.2f}ms {r['chunk']['p99']:>6.2f}ms {r['chunk']['max']:>6.2f}ms")
+    print("=" * 78)
+    print("延迟为每个 chunk 的耗时（毫秒）；freeze+threshold 的阈值为 (50000, 20, 20)")
+
+
+if __name__ == "__main__":
+    main()
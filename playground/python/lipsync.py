@@ -0,0 +1,340 @@
+"""
+TTS 音频驱动的流式口型分析（Live2D 嘴部参数）
+test.py 的 Callback.on_data 只把 PCM 写进 PyAudio，虚拟角色的嘴不会动。
+
+LipSyncAnalyzer 把收到的 PCM16 切成固定帧（默认 60 fps），每次 on_data 到来的所有完整帧
+一次性用 NumPy 向量化处理（一个 (帧数, 帧长) 矩阵上的 RMS + rfft + 频带能量矩阵乘），
+输出每帧的 Live2D 参数:
+  - ParamMouthOpenY: 0-1，由帧能量（dBFS）映射并做 attack / release 平滑
+  - ParamMouthForm:  -1（圆唇 o/u）到 1（展唇 i/e），由第二共振峰频带占比与第一共振峰位置决定
+  - viseme: sil / a / i / u / e / o，按张口度、F1 估计（低频段重心）与 F2 频带占比粗分类
+
+时间对齐: PlaybackClock 记录每个音频块实际开始播放的时刻
+（写入时刻与上一块播放结束时刻取较晚者，加上输出设备延迟），每帧的时间戳 = 所在块的播放时刻
++ 帧在块内的偏移。LipSyncEmitter 在独立线程里按时间戳发出口型帧，
+因此口型与声音的偏差只取决于定时器精度，而不是 TTS 分包的大小和到达节奏。
+
+用法（test.py 设置环境变量 LIPSYNC_UDP=127.0.0.1:9300 后，把口型帧以 JSON 经 UDP 发给 Electron 前端）:
+    lipsync = create_lipsync_from_env(22050, output_latency_s=stream.get_output_latency())
+    def on_data(self, data):
+        lipsync.feed(data)          # 在写入播放设备之前调用
+        self._stream.write(data)
+    lipsync.close()
+
+基准（合成元音音频，随机大小分包，测量每帧分析耗时与口型发出时刻偏差）:
+    python lipsync.py --seconds 10 --fps 60
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import threading
+import time
+
+import numpy as np
+
+from audio_format import float32_to_pcm16, pcm16_to_float32
+from perf_stats import print_latency_summary
+
+VISEMES = ("sil", "a", "i", "u", "e", "o")
+
+# 频带（Hz）：低频段（F1 以及 o/u 的 F2，重心随张口增大而升高）、i/e 的高 F2 频带
+_LOW_BAND = (150, 1100)
+_FRONT_BAND = (1700, 2800)
+_SPEECH_BAND = (150, 2800)
+# 低频段重心的分界（Hz）：高于 _OPEN_F1 为 a，_MID_F1 到 _OPEN_F1 之间为 o，更低为 u；i/e 以 _CLOSE_F1 区分
+_OPEN_F1 = 770.0
+_MID_F1 = 630.0
+_CLOSE_F1 = 400.0
+_FRONT_RATIO = 0.2
+
+
+class LipSyncAnalyzer:
+    """
+    参数:
+        sample_rate: PCM 采样率（test.py 为 22050）
+        fps: 口型帧率（Live2D 渲染帧率）
+        floor_db / ceil_db: 映射到张口度 0 / 1 的帧能量（dBFS）
+        attack / release: 张口 / 闭口方向的平滑系数（1 表示不平滑）
+    """
+
+    def __init__(self, sample_rate=22050, fps=60, floor_db=-50.0, ceil_db=-12.0, attack=0.7, release=0.35):
+        self.sample_rate = sample_rate
+        self.fps = fps
+        self.frame_len = int(round(sample_rate / fps))
+        self.floor_db = floor_db
+        self.ceil_db = ceil_db
+        self.attack = attack
+        self.release = release
+
+        self._window = np.hanning(self.frame_len).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.frame_len, 1.0 / sample_rate)
+        low = (freqs >= _LOW_BAND[0]) & (freqs < _LOW_BAND[1])
+        # (频点数, 4) 的矩阵：功率谱乘它一次得到 低频段能量、低频段频率加权和、F2 频带能量、语音频带能量
+        self._band_matrix = np.stack([
+            low, low * freqs,
+            (freqs >= _FRONT_BAND[0]) & (freqs < _FRONT_BAND[1]),
+            (freqs >= _SPEECH_BAND[0]) & (freqs < _SPEECH_BAND[1]),
+        ], axis=1).astype(np.float32)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._open = 0.0
+        self.frames = 0
+        self.analysis_seconds = 0.0
+
+    def push(self, data, play_at):
+        """
+        送入一段 PCM16（bytes），返回完整帧的口型列表
+
+        参数:
+            play_at: 这段音频第一个采样的播放时刻（PlaybackClock.schedule 的返回值）
+        """
+        start = time.perf_counter()
+        samples = pcm16_to_float32(data)
+        # 上一块剩下的不足一帧的采样排在这一块前面，它们的播放时刻相应提前
+        first_time = play_at - len(self._pending) / self.sample_rate
+        samples = np.concatenate((self._pending, samples)) if len(self._pending) else samples
+        count = len(samples) // self.frame_len
+        self._pending = samples[count * self.frame_len:]
+        if not count:
+            return []
+        frames = samples[:count * self.frame_len].reshape(count, self.frame_len)
+
+        rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+        level = np.clip((20 * np.log10(rms) - self.floor_db) / (self.ceil_db - self.floor_db), 0.0, 1.0)
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2
+        bands = power @ self._band_matrix + 1e-12
+        f1 = bands[:, 1] / bands[:, 0]
+        front = bands[:, 2] / bands[:, 3]
+        form = np.where(front > _FRONT_RATIO, np.minimum(1.0, front * 2),
+                        -np.clip((_OPEN_F1 - f1) / 200.0, 0.0, 1.0))
+
+        results = []
+        frame_s = self.frame_len / self.sample_rate
+        rows = zip(level.tolist(), np.round(form, 3).tolist(), f1.tolist(), front.tolist())
+        for k, (target, form_k, f1_k, front_k) in enumerate(rows):
+            # 平滑有状态依赖，只能逐帧做；每帧只是几次标量运算
+            coef = self.attack if target > self._open else self.release
+            self._open += coef * (target - self._open)
+            results.append({
+                "t": first_time + k * frame_s,
+                "ParamMouthOpenY": round(self._open, 3),
+                "ParamMouthForm": form_k,
+                "viseme": self._viseme(self._open, f1_k, front_k),
+            })
+        self.frames += count
+        self.analysis_seconds += time.perf_counter() - start
+        return results
+
+    @staticmethod
+    def _viseme(mouth_open, f1, front):
+        """粗分类：够用来驱动 2D 口型贴图，不追求音素级准确"""
+        if mouth_open < 0.08:
+            return "sil"
+        if front > _FRONT_RATIO:
+            return "i" if f1 < _CLOSE_F1 else "e"
+        if f1 > _OPEN_F1:
+            return "a"
+        return "o" if f1 > _MID_F1 else "u"
+
+    def flush(self, play_at=None):
+        """TTS 结束时补一帧闭嘴"""
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._open = 0.0
+        t = time.perf_counter() if play_at is None else play_at
+        return [{"t": t, "ParamMouthOpenY": 0.0, "ParamMouthForm": 0.0, "viseme": "sil"}]
+
+    def report(self):
+        print("口型分析:")
+        print(f"  帧数: {self.frames} | 帧长: {self.frame_len} 采样 ({1000 / self.fps:.1f} ms)")
+        if self.frames:
+            print(f"  每帧分析耗时: {self.analysis_seconds / self.frames * 1e6:.1f} 微秒")
+
+
+class PlaybackClock:
+    """
+    推算写入播放设备的每个音频块何时真正发声
+
+    参数:
+        sample_rate: 采样率
+        output_latency_s: 设备输出延迟（PyAudio: stream.get_output_latency()）
+    """
+
+    def __init__(self, sample_rate, output_latency_s=0.0):
+        self.sample_rate = sample_rate
+        self.output_latency_s = output_latency_s
+        self._end = 0.0
+
+    def schedule(self, samples, now=None):
+        """登记一个即将写入的块（采样数），返回它开始播放的时刻（perf_counter 时间）"""
+        now = time.perf_counter() if now is None else now
+        # 播放队列空了（TTS 供数不足）时从现在重新开始，否则紧接在上一块之后
+        start = max(now + self.output_latency_s, self._end)
+        self._end = start + samples / self.sample_rate
+        return start
+
+    def reset(self):
+        self._end = 0.0
+
+
+class LipSyncEmitter:
+    """
+    按时间戳发出口型帧的后台线程
+
+    参数:
+        send: send(frame) 回调（例如 udp_sender 返回的函数）
+        lead_s: 提前发出的时间，用于抵消前端渲染延迟
+    """
+
+    def __init__(self, send, lead_s=0.0):
+        self.send = send
+        self.lead_s = lead_s
+        self.errors_ms = []   # 实际发出时刻 - 预定时刻
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, frames):
+        for frame in frames:
+            self._queue.put(frame)
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                return
+            due = frame["t"] - self.lead_s
+            # 先粗睡到 2ms 以内，再忙等，time.sleep 的唤醒误差常有 1ms 以上
+            while True:
+                remaining = due - time.perf_counter()
+                if remaining <= 0:
+                    break
+                if remaining > 0.002:
+                    time.sleep(remaining - 0.002)
+            self.errors_ms.append((time.perf_counter() - due) * 1000)
+            self.send(frame)
+
+    def close(self):
+        """等待已排队的帧全部发出"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def report(self, frame_ms):
+        print_latency_summary("口型发出时刻偏差", self.errors_ms)
+        late = sum(1 for ms in self.errors_ms if abs(ms) >= frame_ms)
+        print(f"  偏差超过一帧（{frame_ms:.1f} ms）的帧: {late}")
+
+
+class LipSync:
+    """PlaybackClock + LipSyncAnalyzer + LipSyncEmitter 的组合，供 TTS 回调直接使用"""
+
+    def __init__(self, send, sample_rate=22050, fps=60, output_latency_s=0.0, lead_s=0.0):
+        self.clock = PlaybackClock(sample_rate, output_latency_s)
+        self.analyzer = LipSyncAnalyzer(sample_rate, fps)
+        self.emitter = LipSyncEmitter(send, lead_s)
+
+    def feed(self, data):
+        """TTS 的一段 PCM16 即将写入播放设备"""
+        self.emitter.put(self.analyzer.push(data, self.clock.schedule(len(data) // 2)))
+
+    def close(self):
+        """补一帧闭嘴（在最后一段音频播放完时发出），等待全部帧发出"""
+        self.emitter.put(self.analyzer.flush(self.clock.schedule(0)))
+        self.emitter.close()
+
+    def report(self):
+        self.analyzer.report()
+        self.emitter.report(1000 / self.analyzer.fps)
+
+
+def create_lipsync_from_env(sample_rate=22050, output_latency_s=0.0):
+    """环境变量 LIPSYNC_UDP=host:port 时返回 LipSync，否则返回 None；LIPSYNC_FPS 设置帧率"""
+    address = os.environ.get("LIPSYNC_UDP")
+    if not address:
+        return None
+    host, port = address.rsplit(":", 1)
+    fps = int(os.environ.get("LIPSYNC_FPS", "60"))
+    return LipSync(udp_sender(host, int(port)), sample_rate, fps, output_latency_s)
+
+
+def udp_sender(host, port):
+    """把口型帧编码为 JSON，通过 UDP 发给前端（丢包只影响一帧口型，不阻塞播放）"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(frame):
+        sock.sendto(json.dumps(frame).encode("utf-8"), (host, port))
+
+    return send
+
+
+def synthetic_speech(seconds, sample_rate, seed=0):
+    """
+    合成"元音"音频：100-140Hz 的谐波声源经过各元音的共振峰加权，按音节包络拼接，
+    音节之间有短暂静音；返回 (float32 音频, [(开始秒, 结束秒, 元音)])
+    """
+    formants = {"a": (800, 1200), "i": (300, 2300), "u": (320, 800), "e": (500, 1900), "o": (500, 900)}
+    rng = np.random.default_rng(seed)
+    pieces, labels, position = [], [], 0.0
+    while position < seconds:
+        vowel = rng.choice(list(formants))
+        length = int(rng.uniform(0.12, 0.3) * sample_rate)
+        t = np.arange(length) / sample_rate
+        f0 = rng.uniform(100, 140)
+        harmonics = np.arange(1, int(4000 / f0))
+        weights = sum(np.exp(-((harmonics * f0 - f) / 150.0) ** 2) for f in formants[vowel]) + 0.02
+        source = (weights[:, None] * np.sin(2 * np.pi * f0 * harmonics[:, None] * t)).sum(axis=0)
+        envelope = np.sin(np.pi * np.arange(length) / length) ** 0.5
+        syllable = 0.3 * source / np.abs(source).max() * envelope
+        gap = np.zeros(int(rng.uniform(0.03, 0.12) * sample_rate))
+        labels.append((position, position + length / sample_rate, str(vowel)))
+        pieces.extend((syllable, gap))
+        position += (length + len(gap)) / sample_rate
+    return np.concatenate(pieces).astype(np.float32), labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式口型分析基准")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--sample-rate", type=int, default=22050)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="模拟的设备输出延迟")
+    args = parser.parse_args()
+
+    audio, labels = synthetic_speech(args.seconds, args.sample_rate)
+    pcm = float32_to_pcm16(audio).tobytes()
+    clock = PlaybackClock(args.sample_rate, args.latency_ms / 1000)
+    analyzer = LipSyncAnalyzer(args.sample_rate, args.fps)
+    sent = []
+    emitter = LipSyncEmitter(send=sent.append)
+
+    # 模拟 TTS：随机大小（20-200ms）的分包，比实时快一些到达；播放设备按采样率消耗
+    rng = np.random.default_rng(1)
+    position = 0
+    start = time.perf_counter()
+    while position < len(pcm):
+        size = int(rng.uniform(0.02, 0.2) * args.sample_rate) * 2
+        data = pcm[position:position + size]
+        play_at = clock.schedule(len(data) // 2)
+        emitter.put(analyzer.push(data, play_at))
+        position += size
+        time.sleep(max(0.0, play_at - time.perf_counter() - 0.1))   # 保持约 100ms 的播放缓冲
+    emitter.close()
+
+    # 用合成标签检查口型时间轴：帧时间换算回音频时间后，落在音节中段的帧应判为该元音
+    audio_start = sent[0]["t"] if sent else start
+    voiced = [(frame, vowel) for frame in sent for begin, end, vowel in labels
+              if begin + 0.05 <= frame["t"] - audio_start <= end - 0.05]
+    accuracy = sum(1 for frame, vowel in voiced if frame["viseme"] == vowel) / len(voiced) if voiced else 0.0
+
+    print("=" * 60)
+    analyzer.report()
+    emitter.report(1000 / args.fps)
+    print(f"音节中段的帧口型与合成元音一致的比例: {accuracy * 100:.1f}%")
+    counts = {v: sum(1 for frame in sent if frame["viseme"] == v) for v in VISEMES}
+    print("口型分布: " + " | ".join(f"{v} {n}" for v, n in counts.items()))
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+可插拔的 LLM 客户端
+test.py 的 synthesizer_with_llm 每轮对话都直接调用 dashscope.Generation.call(stream=True)，
+每次都新建 HTTP 连接（DNS + TCP + TLS 握手都算进了首 token 延迟），也无法离线测试。
+
+统一接口：
+    client = create_llm_client("openai", base_url="http://127.0.0.1:8765/v1")
+    client.warmup()                       # 可选：提前建立连接
+    for text in client.stream_chat(messages):
+        ...                               # 增量文本片段
+
+客户端:
+  - dashscope: DashScope SDK（与 test.py 相同，SDK 内部管理连接）
+  - openai:    OpenAI 兼容接口（httpx 长连接池，支持 HTTP/2）。
+               DashScope 的兼容模式地址 https://dashscope.aliyuncs.com/compatible-mode/v1
+               也可以直接使用；本地替身见 mock_llm_server.py
+"""
+
+import json
+import os
+from http import HTTPStatus
+
+DASHSCOPE_COMPATIBLE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
+
+class LLMError(RuntimeError):
+    """LLM 请求失败"""
+
+
+class LLMClient:
+    """LLM 客户端基类"""
+
+    name = "base"
+
+    def stream_chat(self, messages):
+        """流式对话，逐个产出增量文本"""
+        raise NotImplementedError
+
+    def warmup(self):
+        """提前建立连接（可选）"""
+
+    def close(self):
+        pass
+
+
+class DashScopeLLMClient(LLMClient):
+    """DashScope SDK 流式调用（与 test.py 中的用法一致）"""
+
+    name = "dashscope"
+
+    def __init__(self, model="qwen-turbo"):
+        self.model = model
+
+    def stream_chat(self, messages):
+        from dashscope import Generation
+
+        responses = Generation.call(
+            model=self.model,
+            messages=messages,
+            result_format="message",
+            stream=True,
+            incremental_output=True,
+        )
+        for response in responses:
+            if response.status_code != HTTPStatus.OK:
+                raise LLMError(
+                    "Request id: %s, Status code: %s, error code: %s, error message: %s"
+                    % (response.request_id, response.status_code, response.code, response.message))
+            text = response.output.choices[0]["message"]["content"]
+            if text:
+                yield text
+
+
+class OpenAICompatibleClient(LLMClient):
+    """
+    OpenAI 兼容的 /chat/completions 流式客户端，复用同一个 httpx.Client 的连接池
+
+    参数:
+        base_url: 例如 http://127.0.0.1:8765/v1
+        http2: 是否启用 HTTP/2（需要安装 h2，未安装时自动退回 HTTP/1.1 keep-alive）
+        max_connections: 连接池大小（并发会话数）
+        keepalive_expiry: 空闲连接保留秒数，应大于两轮对话之间的间隔
+    """
+
+    name = "openai"
+
+    def __init__(self, base_url=None, api_key=None, model="qwen-turbo", http2=True,
+                 max_connections=16, keepalive_expiry=300.0, timeout=60.0):
+        import httpx
+
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                http2 = False
+        self.base_url = (base_url or os.environ.get("LLM_BASE_URL", DASHSCOPE_COMPATIBLE_URL)).rstrip("/")
+        self.model = model
+        self.http2 = http2
+        api_key = api_key or os.environ.get("LLM_API_KEY") or os.environ.get("DASHSCOPE_API_KEY", "")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._client = httpx.Client(
+            base_url=self.base_url,
+            headers=headers,
+            http2=http2,
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections,
+                                keepalive_expiry=keepalive_expiry),
+        )
+
+    def warmup(self):
+        """请求一次 /models，让连接池里提前有一条已握手的连接"""
+        try:
+            self._client.get("/models")
+        except Exception:
+            pass
+
+    def stream_chat(self, messages):
+        payload = {"model": self.model, "messages": messages, "stream": True}
+        with self._client.stream("POST", "/chat/completions", json=payload) as response:
+            if response.status_code != HTTPStatus.OK:
+                response.read()
+                raise LLMError(f"Status code: {response.status_code}, body: {response.text[:200]}")
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    # 不要提前 break：读完响应体连接才会放回连接池复用
+                    continue
+                chunk = json.loads(data)
+                choices = chunk.get("choices") or []
+                if choices:
+                    text = (choices[0].get("delta") or {}).get("content")
+                    if text:
+                        yield text
+
+    def close(self):
+        self._client.close()
+
+
+LLM_CLIENTS = {
+    "dashscope": DashScopeLLMClient,
+    "openai": OpenAICompatibleClient,
+}
+
+
+def create_llm_client(name=None, **kwargs):
+    """按名称创建 LLM 客户端，name 为空时读取环境变量 LLM_BACKEND（默认 dashscope）"""
+    name = name or os.environ.get("LLM_BACKEND", "dashscope")
+    if name not in LLM_CLIENTS:
+        raise ValueError(f"未知的 LLM 客户端: {name}，可选: {', '.join(LLM_CLIENTS)}")
+    return LLM_CLIENTS[name](**kwargs)
@@ -0,0 +1,259 @@
+"""
+语音链路负载生成器：回放录音会话，测量不同并发数下的口到耳延迟
+现有脚本都是单个文件跑一遍，回答不了"一台机器在 P95 < 800ms 的前提下能撑多少路同时说话"。
+
+每一路会话按音频时间节奏（可加速）把 600ms chunk 送入流式 VAD + ASR，Endpointer 断句后
+在独立线程里调用 LLM（本地替身 mock_llm_server）并把回复送入 fake TTS（tts_backends），
+记录 语音结束 → 首段 TTS 音频 的延迟，以及每个 chunk 从采集完成到识别完成的滞后。
+逐级提高并发数，输出延迟-并发曲线和饱和点（P95 超过目标或 ASR 跟不上实时的并发数）。
+
+语料: 目录下的 wav 文件（每个文件是一句话，回放时句间插入 --gap 秒静音），或单个 wav 文件。
+
+用法:
+    python load_generator.py --corpus sessions/ --levels 1 2 4 8 16 --target-ms 800
+    python load_generator.py --asr fake --fake-chunk-ms 40 --levels 1 2 4 8 16 32
+      （fake ASR 用占用 GIL 的忙循环模拟单份模型的计算，不需要 funasr）
+"""
+
+import argparse
+import glob
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+from audio_format import ASR_SAMPLE_RATE, normalize_audio
+from endpointing import Endpointer
+from llm_backends import create_llm_client
+from mock_llm_server import start_mock_server, synthetic_timings
+from perf_stats import summarize
+from voice_loop import run_turn
+
+CHUNK_SIZE = [0, 10, 5]
+CHUNK_MS = CHUNK_SIZE[1] * 60
+CHUNK_STRIDE = CHUNK_SIZE[1] * 960
+
+
+class FunASRStack:
+    """fsmn-vad + paraformer-zh-streaming，多路会话共用一份模型（各自一份 cache）"""
+
+    def __init__(self, device):
+        from funasr import AutoModel
+
+        self.vad = AutoModel(model="fsmn-vad", device=device, disable_update=True)
+        self.asr = AutoModel(model="paraformer-zh-streaming", device=device, disable_update=True)
+        # funasr 的 AutoModel 不保证线程安全，同一模型的推理串行执行
+        self.vad_lock = threading.Lock()
+        self.asr_lock = threading.Lock()
+
+    def new_session(self):
+        return _FunASRSession(self)
+
+
+class _FunASRSession:
+    def __init__(self, stack):
+        self.stack = stack
+        self.vad_cache = {}
+        self.asr_cache = {}
+        self.endpointer = Endpointer()
+
+    def _asr(self, chunk, is_final):
+        with self.stack.asr_lock:
+            return self.stack.asr.generate(input=chunk, cache=self.asr_cache, is_final=is_final,
+                                           chunk_size=CHUNK_SIZE, encoder_chunk_look_back=4,
+                                           decoder_chunk_look_back=1)
+
+    def process(self, chunk, chunk_end_ms):
+        """返回 (最终文本, 语音结束时刻 ms)；未断句时返回 (None, None)"""
+        with self.stack.vad_lock:
+            vad_res = self.stack.vad.generate(input=chunk, cache=self.vad_cache, is_final=False,
+                                              chunk_size=CHUNK_MS)
+        asr_res = self._asr(chunk, False)
+        partial = asr_res[0]["text"] if asr_res else ""
+        reason = self.endpointer.update(chunk, ASR_SAMPLE_RATE, partial, vad_res[0]["value"])
+        if not reason:
+            return None, None
+        flush = self._asr(np.zeros(960, dtype=np.float32), True)
+        self.asr_cache = {}
+        text = self.endpointer.text + (flush[0]["text"] if flush else "")
+        speech_end_ms = chunk_end_ms - self.endpointer.silence_ms
+        self.endpointer.finalized(reason, chunk_end_ms)
+        return text, speech_end_ms
+
+
+class FakeASRStack:
+    """
+    ASR 替身：每个 chunk 在全局锁内忙等 chunk_ms（占用 GIL，模拟单份模型的计算），
+    有能量的 chunk 输出一个字，由 Endpointer 的提前断句规则判断句子结束
+    """
+
+    def __init__(self, chunk_ms=40.0):
+        self.chunk_ms = chunk_ms
+        self.lock = threading.Lock()
+
+    def new_session(self):
+        return _FakeASRSession(self)
+
+
+class _FakeASRSession:
+    def __init__(self, stack):
+        self.stack = stack
+        self.endpointer = Endpointer()
+
+    def process(self, chunk, chunk_end_ms):
+        with self.stack.lock:
+            end = time.perf_counter() + self.stack.chunk_ms / 1000
+            while time.perf_counter() < end:
+                pass
+        voiced = float(np.sqrt(np.mean(chunk * chunk))) >= self.endpointer.silence_rms if len(chunk) else False
+        reason = self.endpointer.update(chunk, ASR_SAMPLE_RATE, "字" if voiced else "", [])
+        if not reason:
+            return None, None
+        text = self.endpointer.text
+        speech_end_ms = chunk_end_ms - self.endpointer.silence_ms
+        self.endpointer.finalized(reason, chunk_end_ms)
+        return text, speech_end_ms
+
+
+def load_corpus(path, gap_s):
+    """读取语料，每句话后面补 gap_s 秒静音"""
+    import soundfile
+
+    files = sorted(glob.glob(os.path.join(path, "*.wav"))) if os.path.isdir(path) else [path]
+    utterances = []
+    for file in files:
+        speech, sample_rate = soundfile.read(file)
+        speech, _ = normalize_audio(speech, sample_rate)
+        utterances.append(np.concatenate((speech, np.zeros(int(gap_s * ASR_SAMPLE_RATE), dtype=np.float32))))
+    return utterances
+
+
+def synthetic_corpus(count=4, gap_s=1.5, seed=0):
+    """没有录音时使用：1-3 秒的调幅噪声"说话" + 静音"""
+    rng = np.random.default_rng(seed)
+    utterances = []
+    for _ in range(count):
+        n = int(rng.uniform(1.0, 3.0) * ASR_SAMPLE_RATE)
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * np.arange(n) / ASR_SAMPLE_RATE)
+        speech = (rng.standard_normal(n) * 0.1 * envelope).astype(np.float32)
+        utterances.append(np.concatenate((speech, np.zeros(int(gap_s * ASR_SAMPLE_RATE), dtype=np.float32))))
+    return utterances
+
+
+def run_session(stack, audio, speedup, base_url, results, start_delay_s):
+    """回放一路会话，结果追加到 results（线程安全由 list.append 保证）"""
+    time.sleep(start_delay_s)
+    session = stack.new_session()
+    llm = create_llm_client("openai", base_url=base_url)
+    llm.warmup()
+    turn_threads = []
+    chunk_s = CHUNK_MS / 1000 / speedup
+    start = time.perf_counter()
+
+    def reply(text, speech_end_wall):
+        turn_start = time.perf_counter()
+        result = run_turn(llm, [{"role": "user", "content": text}], "fake")
+        if result["first_audio_ms"] is not None:
+            first_audio_wall = turn_start + result["first_audio_ms"] / 1000
+            results["turn_ms"].append((first_audio_wall - speech_end_wall) * 1000)
+
+    total_chunks = int((len(audio) - 1) / CHUNK_STRIDE + 1)
+    for i in range(total_chunks):
+        due = start + (i + 1) * chunk_s   # 这个 chunk 采集完成的时刻
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        chunk = audio[i * CHUNK_STRIDE:(i + 1) * CHUNK_STRIDE]
+        chunk_end_ms = min((i + 1) * CHUNK_STRIDE, len(audio)) / ASR_SAMPLE_RATE * 1000
+        text, speech_end_ms = session.process(chunk, chunk_end_ms)
+        results["chunk_lag_ms"].append((time.perf_counter() - due) * 1000)
+        if text:
+            speech_end_wall = start + speech_end_ms / 1000 / speedup
+            thread = threading.Thread(target=reply, args=(text, speech_end_wall), daemon=True)
+            thread.start()
+            turn_threads.append(thread)
+    for thread in turn_threads:
+        thread.join()
+    llm.close()
+
+
+def run_level(stack, corpus, concurrency, speedup, base_url, turns_per_session, seed=0):
+    rng = random.Random(seed)
+    results = {"turn_ms": [], "chunk_lag_ms": []}
+    threads = []
+    for n in range(concurrency):
+        order = [corpus[(n + k) % len(corpus)] for k in range(turns_per_session)]
+        audio = np.concatenate(order)
+        # 错开各路会话的起点，避免所有 chunk 同时到达
+        thread = threading.Thread(target=run_session, daemon=True, args=(
+            stack, audio, speedup, base_url, results, rng.uniform(0, CHUNK_MS / 1000 / speedup)))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语音链路并发负载生成器")
+    parser.add_argument("--corpus", default=None, help="wav 目录或单个 wav；为空时使用合成语料")
+    parser.add_argument("--asr", choices=["funasr", "fake"], default="funasr")
+    parser.add_argument("--fake-chunk-ms", type=float, default=40.0, help="fake ASR 每个 chunk 的计算耗时")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--speedup", type=float, default=1.0, help="回放加速倍数（>1 时音频节奏更快）")
+    parser.add_argument("--turns", type=int, default=3, help="每路会话说几句话")
+    parser.add_argument("--gap", type=float, default=1.5, help="句间静音秒数")
+    parser.add_argument("--target-ms", type=float, default=800.0, help="口到耳延迟 P95 目标")
+    parser.add_argument("--llm-ttft-ms", type=float, default=250.0, help="LLM 替身首 token 延迟")
+    args = parser.parse_args()
+
+    if args.asr == "fake":
+        stack = FakeASRStack(args.fake_chunk_ms)
+    else:
+        import torch
+        stack = FunASRStack("cuda:0" if torch.cuda.is_available() else "cpu")
+    corpus = load_corpus(args.corpus, args.gap) if args.corpus else synthetic_corpus(gap_s=args.gap)
+    server, base_url = start_mock_server(timings=synthetic_timings(ttft_ms=args.llm_ttft_ms))
+
+    chunk_budget_ms = CHUNK_MS / args.speedup
+    rows = []
+    for level in args.levels:
+        results = run_level(stack, corpus, level, args.speedup, base_url, args.turns)
+        turn = summarize(results["turn_ms"])
+        lag = summarize(results["chunk_lag_ms"])
+        ok = turn["count"] > 0 and turn["p95"] <= args.target_ms and lag["p95"] <= chunk_budget_ms
+        rows.append((level, turn, lag, ok))
+        print(f"并发 {level:>3}: 口到耳 P50 {turn['p50']:7.1f} ms | P95 {turn['p95']:7.1f} ms | "
+              f"chunk 滞后 P95 {lag['p95']:7.1f} ms | {'达标' if ok else '超标'}", flush=True)
+    server.shutdown()
+
+    print("=" * 72)
+    print(f"延迟-并发曲线（口到耳 P95，目标 {args.target_ms:.0f} ms，每格 {args.target_ms / 20:.0f} ms）")
+    print("=" * 72)
+    for level, turn, lag, ok in rows:
+        bar = "#" * min(60, int(turn["p95"] / (args.target_ms / 20)))
+        print(f"{level:>4} | {bar:<60} {turn['p95']:.0f}")
+    # 饱和点取第一个超标级别之前的最高达标级别；更高并发偶尔达标只是测量波动，不能算作容量
+    ordered = sorted(rows, key=lambda row: row[0])
+    first_fail = next((level for level, _, _, ok in ordered if not ok), None)
+    saturation = max((level for level, _, _, ok in ordered
+                      if ok and (first_fail is None or level < first_fail)), default=None)
+    unstable = [level for level, _, _, ok in ordered if ok and first_fail is not None and level > first_fail]
+    print("-" * 72)
+    if saturation is not None:
+        print(f"饱和点: 最多 {saturation} 路并发满足 P95 < {args.target_ms:.0f} ms 且 ASR 跟得上实时")
+    else:
+        print(f"最低并发级别即未达标（{ordered[0][0]} 路）")
+    if unstable:
+        print(f"注意: {', '.join(map(str, unstable))} 路在超标级别之后又达标，结果不稳定，建议增加 --turns 重测")
+    if first_fail is not None:
+        _, turn, lag, _ = next(row for row in rows if row[0] == first_fail)
+        cause = "ASR 跟不上实时（chunk 积压）" if lag["p95"] > chunk_budget_ms else "端到端延迟超标"
+        print(f"首个超标级别: {first_fail} 路，原因: {cause}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
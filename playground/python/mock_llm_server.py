@@ -0,0 +1,140 @@
+"""
+本地 OpenAI 兼容 LLM 替身服务
+按录制的（或合成的）token 时间序列回放流式输出，用于离线测试完整语音链路。
+
+  POST /v1/chat/completions  (stream=true 时返回 SSE，按 token 时间间隔逐个发送)
+  GET  /v1/models
+
+--connect-delay-ms 模拟每条新连接的握手开销（TCP + TLS 往返），
+用来对比"每轮新建连接"和"长连接复用"对首 token 延迟的影响。
+
+用法:
+    python mock_llm_server.py --port 8765 --ttft-ms 250 --interval-ms 30
+    python mock_llm_server.py --port 8765 --timings recorded_tokens.json
+
+timings 文件格式: [{"text": "你好", "delay_ms": 240.0}, {"text": "，", "delay_ms": 28.5}, ...]
+其中 delay_ms 为与上一个 token（第一个 token 为请求到达时刻）的间隔。
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "你好，我是你的桌面虚拟助手。我可以陪你聊天、回答问题，还能帮你查资料。今天想聊点什么呢？"
+
+
+def synthetic_timings(text=DEFAULT_REPLY, ttft_ms=250.0, interval_ms=30.0, chars_per_token=2):
+    """把回复文本按固定字数切成 token，首 token 延迟 ttft_ms，之后每 interval_ms 一个"""
+    tokens = [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)]
+    return [{"text": tok, "delay_ms": ttft_ms if i == 0 else interval_ms} for i, tok in enumerate(tokens)]
+
+
+def load_timings(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _make_handler(timings, connect_delay_ms, speedup):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # 支持 keep-alive
+
+        def setup(self):
+            super().setup()
+            # 每条新连接只执行一次：模拟握手往返
+            if connect_delay_ms > 0:
+                time.sleep(connect_delay_ms / 1000)
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _write_chunk(self, data):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": "not found"})
+                return
+
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = request.get("model", "mock")
+            if not request.get("stream"):
+                for item in timings:
+                    time.sleep(item["delay_ms"] / 1000 / speedup)
+                text = "".join(item["text"] for item in timings)
+                self._send_json(200, {"id": completion_id, "object": "chat.completion", "model": model,
+                                      "choices": [{"index": 0, "finish_reason": "stop",
+                                                   "message": {"role": "assistant", "content": text}}]})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for item in timings:
+                time.sleep(item["delay_ms"] / 1000 / speedup)
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": item["text"]}, "finish_reason": None}]}
+                self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+    return Handler
+
+
+def start_mock_server(port=0, timings=None, connect_delay_ms=0.0, speedup=1.0):
+    """
+    在后台线程启动替身服务
+
+    返回: (server, base_url)，用完调用 server.shutdown()
+    """
+    handler = _make_handler(timings or synthetic_timings(), connect_delay_ms, speedup)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容 LLM 替身")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timings", default=None, help="录制的 token 时间序列 JSON")
+    parser.add_argument("--ttft-ms", type=float, default=250.0)
+    parser.add_argument("--interval-ms", type=float, default=30.0)
+    parser.add_argument("--connect-delay-ms", type=float, default=0.0)
+    parser.add_argument("--speedup", type=float, default=1.0, help="回放加速倍数")
+    args = parser.parse_args()
+
+    timings = load_timings(args.timings) if args.timings else synthetic_timings(
+        ttft_ms=args.ttft_ms, interval_ms=args.interval_ms)
+    server, base_url = start_mock_server(args.port, timings, args.connect_delay_ms, args.speedup)
+    print(f"LLM 替身服务已启动: {base_url}（{len(timings)} 个 token）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
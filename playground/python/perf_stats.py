@@ -0,0 +1,83 @@
+"""
+性能统计小工具
+各个实验脚本共用的延迟分布统计：百分位、均值、最大值以及统一格式的打印输出，
+另外提供识别准确率评估用的字错误率（CER）
+"""
+
+import math
+
+
+def percentile(values, pct):
+    """
+    计算百分位数（线性插值，与 numpy.percentile 默认行为一致）
+
+    参数:
+        values: 数值序列
+        pct: 百分位，取值 0-100
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return float(ordered[0])
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return float(ordered[low])
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values):
+    """返回延迟分布摘要字典：count/avg/min/p50/p90/p95/p99/max；None（未测到的值）不参与统计"""
+    values = [v for v in values if v is not None]
+    if not values:
+        return {"count": 0, "avg": 0.0, "min": 0.0, "p50": 0.0,
+                "p90": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "count": len(values),
+        "avg": sum(values) / len(values),
+        "min": min(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def print_latency_summary(title, values_ms, indent="  "):
+    """按毫秒打印延迟分布"""
+    stats = summarize(values_ms)
+    print(f"{title}（{stats['count']} 次）:")
+    if not stats["count"]:
+        print(f"{indent}无数据")
+        return stats
+    print(f"{indent}平均: {stats['avg']:.3f} 毫秒")
+    print(f"{indent}P50: {stats['p50']:.3f} 毫秒 | P90: {stats['p90']:.3f} 毫秒 | "
+          f"P95: {stats['p95']:.3f} 毫秒 | P99: {stats['p99']:.3f} 毫秒")
+    print(f"{indent}最小: {stats['min']:.3f} 毫秒 | 最大: {stats['max']:.3f} 毫秒")
+    return stats
+
+
+def _normalize_text(text):
+    """CER 计算前去掉空白和标点"""
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+def char_error_rate(hypothesis, reference):
+    """
+    字错误率 CER = 编辑距离 / 参考文本长度（忽略空白和标点）
+    """
+    hyp = _normalize_text(hypothesis)
+    ref = _normalize_text(reference)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1] / len(ref)
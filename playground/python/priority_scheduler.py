@@ -0,0 +1,289 @@
+"""
+模型前的优先级调度与实时会话准入控制
+同一台机器上既跑 SenseVoice 离线批量转写（batch_size_s=60 这种一批几十秒音频），
+又跑 paraformer 实时流式识别时，一个大批次会把实时 chunk 堵住好几秒。
+
+ModelScheduler 在模型前面放一个单工作线程的优先级队列：
+  - 两个优先级: PRIORITY_LIVE（实时 chunk）高于 PRIORITY_BULK（离线批次）
+  - 离线任务按批次切开逐个提交；每个批次执行完（批次边界）工作线程都重新取最高优先级的任务，
+    实时 chunk 因此最多等待一个批次的剩余时间（再加上排在它前面的实时 chunk）
+  - 实时会话准入: 新会话接入前估算每个 chunk 的最坏排队 + 计算时间
+        (活跃会话数 + 1) × 实时 chunk 平均耗时 + 最近 bulk_window 个离线批次的最大耗时
+    超过 RTF 预算（rtf_budget × chunk 时长）时拒绝，或排队等其他会话结束
+  - 空闲时离线批次填满算力，实时负载越高离线吞吐越低；离线一侧可以按
+    bulk_batch_budget_s() 决定每批的音频量，批次越小实时 chunk 的等待越短
+
+用法:
+    scheduler = ModelScheduler(chunk_duration_s=0.6, rtf_budget=0.5)
+    session = scheduler.open_session(wait_s=0)        # 超预算时返回 None
+    future = scheduler.submit_live(lambda: asr.generate(input=chunk, cache=cache, ...))
+    scheduler.submit_bulk(lambda: sensevoice.generate(input=batch, batch_size_s=10))
+    scheduler.close_session(session)
+
+realtime_asr_2pass.py 中设置 MODEL_SCHEDULER=1（create_model_scheduler_from_env）时，paraformer 流式 chunk 作为实时任务、
+SenseVoice 第二遍重识别作为离线任务经由同一个 ModelScheduler 执行。
+
+模拟基准（忙等模拟模型计算，对比 FIFO 与优先级调度；FIFO 使用与优先级调度相同的已准入会话数）:
+    python priority_scheduler.py --sessions 6 --bulk-batch-ms 100
+"""
+
+import argparse
+import collections
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from perf_stats import print_latency_summary
+
+PRIORITY_LIVE = 0
+PRIORITY_BULK = 1
+
+
+class ModelScheduler:
+    """
+    参数:
+        chunk_duration_s: 实时 chunk 的音频时长
+        rtf_budget: 每个 chunk 从提交到完成允许占用的 chunk 时长比例
+        fifo: True 时忽略优先级按提交顺序执行（对照组）
+        admission: 是否启用实时会话准入控制
+        ewma: 耗时估计的平滑系数
+        bulk_window: 离线批次最大耗时取最近多少个批次（批次调小后准入估计随之回落）
+    """
+
+    def __init__(self, chunk_duration_s=0.6, rtf_budget=0.5, fifo=False, admission=True, ewma=0.2,
+                 bulk_window=32):
+        self.chunk_duration_s = chunk_duration_s
+        self.rtf_budget = rtf_budget
+        self.fifo = fifo
+        self.admission = admission
+        self.ewma = ewma
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()       # 任务队列
+        self._admission = threading.Condition()  # 会话准入（与任务队列分开，避免 notify 唤醒错对象）
+        self._closed = False
+        self._sessions = set()
+        self._session_ids = itertools.count(1)
+
+        self.live_service_s = None       # 实时 chunk 平均计算耗时（EWMA）
+        self._bulk_recent_s = collections.deque(maxlen=bulk_window)   # 最近离线批次的耗时
+        self.live_latencies_ms = []      # 实时 chunk 提交 → 完成
+        self.bulk_completed = 0
+        self.bulk_busy_s = 0.0
+        self.admitted = 0
+        self.rejected = 0
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def _submit(self, priority, fn):
+        future = Future()
+        with self._cond:
+            key = (0 if self.fifo else priority, next(self._seq))
+            heapq.heappush(self._heap, (key, priority, time.perf_counter(), fn, future))
+            self._cond.notify()
+        return future
+
+    def submit_live(self, fn):
+        """提交实时 chunk 推理，返回 Future"""
+        return self._submit(PRIORITY_LIVE, fn)
+
+    def submit_bulk(self, fn):
+        """提交一个离线批次，返回 Future；长任务应切成多个批次分别提交"""
+        return self._submit(PRIORITY_BULK, fn)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, priority, submitted, fn, future = heapq.heappop(self._heap)
+            if not future.set_running_or_notify_cancel():
+                continue
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except BaseException as exc:
+                future.set_exception(exc)
+                continue
+            end = time.perf_counter()
+            self._record(priority, submitted, end - start, end)
+            future.set_result(result)
+
+    def _record(self, priority, submitted, service_s, end):
+        if priority == PRIORITY_LIVE:
+            self.live_latencies_ms.append((end - submitted) * 1000)
+            self.live_service_s = (service_s if self.live_service_s is None
+                                   else (1 - self.ewma) * self.live_service_s + self.ewma * service_s)
+        else:
+            self.bulk_completed += 1
+            self.bulk_busy_s += service_s
+            with self._admission:
+                self._bulk_recent_s.append(service_s)
+                self._admission.notify_all()
+
+    @property
+    def bulk_service_max_s(self):
+        """最近 bulk_window 个离线批次的最大耗时（不可抢占部分）"""
+        return max(self._bulk_recent_s, default=0.0)
+
+    def projected_chunk_latency_s(self, sessions):
+        """sessions 路实时会话时，一个 chunk 的最坏排队 + 计算时间估计"""
+        live = self.live_service_s or 0.0
+        return sessions * live + self.bulk_service_max_s
+
+    def bulk_batch_budget_s(self):
+        """
+        当前实时负载下离线批次的建议最大耗时：离线一侧据此决定每批音频量（batch_size_s），
+        保证实时 chunk 在批次边界被调度时仍在预算内
+        """
+        live = (self.live_service_s or 0.0) * len(self._sessions)
+        return max(0.0, self.rtf_budget * self.chunk_duration_s - live)
+
+    def open_session(self, wait_s=0.0):
+        """
+        申请一路实时会话；预计超出 RTF 预算时最多等待 wait_s 秒（其他会话结束），仍不满足则返回 None
+        """
+        budget = self.rtf_budget * self.chunk_duration_s
+        deadline = time.perf_counter() + wait_s
+        with self._admission:
+            while self.admission and self.projected_chunk_latency_s(len(self._sessions) + 1) > budget:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.rejected += 1
+                    return None
+                self._admission.wait(remaining)
+            session = next(self._session_ids)
+            self._sessions.add(session)
+            self.admitted += 1
+            return session
+
+    def close_session(self, session):
+        with self._admission:
+            self._sessions.discard(session)
+            self._admission.notify_all()
+
+    @property
+    def active_sessions(self):
+        return len(self._sessions)
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+
+    def report(self, title, elapsed_s):
+        print(f"[{title}]")
+        print_latency_summary("实时 chunk 延迟", self.live_latencies_ms)
+        budget_ms = self.rtf_budget * self.chunk_duration_s * 1000
+        over = sum(1 for ms in self.live_latencies_ms if ms > budget_ms)
+        print(f"  超出预算 {budget_ms:.0f} ms 的 chunk: {over}")
+        print(f"离线批次: 完成 {self.bulk_completed} 个 | 吞吐 {self.bulk_completed / elapsed_s:.2f} 批/秒 | "
+              f"占用 {self.bulk_busy_s / elapsed_s * 100:.1f}% 时间")
+        print(f"接入的实时会话: {self.admitted} | 拒绝: {self.rejected}")
+
+
+def create_model_scheduler_from_env(chunk_duration_s):
+    """
+    MODEL_SCHEDULER=1 时返回 ModelScheduler，否则返回 None
+    MODEL_SCHEDULER_RTF: RTF 预算（默认 0.5）
+    """
+    if os.environ.get("MODEL_SCHEDULER") != "1":
+        return None
+    rtf_budget = float(os.environ.get("MODEL_SCHEDULER_RTF", "0.5"))
+    print(f"模型调度: 实时优先 | RTF 预算 {rtf_budget}")
+    return ModelScheduler(chunk_duration_s, rtf_budget)
+
+
+def _busy(ms):
+    end = time.perf_counter() + ms / 1000
+    while time.perf_counter() < end:
+        pass
+
+
+def _simulate(fifo, sessions, seconds, chunk_ms, live_ms, bulk_batch_ms, rtf_budget, extra_sessions):
+    scheduler = ModelScheduler(chunk_ms / 1000, rtf_budget, fifo=fifo, admission=not fifo)
+    stop = threading.Event()
+
+    def bulk_feeder():
+        # 一个很长的离线转写任务：始终有若干个批次已经提交在排队
+        pending = []
+        while not stop.is_set():
+            while len(pending) < 8:
+                pending.append(scheduler.submit_bulk(lambda: _busy(bulk_batch_ms)))
+            pending.pop(0).result()
+        for future in pending:
+            future.cancel()
+
+    def live_session(offset_s):
+        session = scheduler.open_session()
+        if session is None:
+            return
+        time.sleep(offset_s)
+        start = time.perf_counter()
+        for i in range(int(seconds * 1000 / chunk_ms)):
+            delay = start + (i + 1) * chunk_ms / 1000 - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            scheduler.submit_live(lambda: _busy(live_ms)).result()
+        scheduler.close_session(session)
+
+    # 预热一个实时 chunk 与一个离线批次，让准入控制有耗时估计
+    scheduler.submit_live(lambda: _busy(live_ms)).result()
+    scheduler.submit_bulk(lambda: _busy(bulk_batch_ms)).result()
+    scheduler.live_latencies_ms.clear()
+    scheduler.bulk_completed = 0
+    scheduler.bulk_busy_s = 0.0
+
+    started = time.perf_counter()
+    feeder = threading.Thread(target=bulk_feeder, daemon=True)
+    feeder.start()
+    threads = [threading.Thread(target=live_session, args=(n * chunk_ms / 1000 / (sessions + extra_sessions),))
+               for n in range(sessions + extra_sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    feeder.join()
+    elapsed = time.perf_counter() - started
+    scheduler.shutdown()
+    return scheduler, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="实时 / 离线混合负载的优先级调度基准")
+    parser.add_argument("--sessions", type=int, default=6, help="实时会话数")
+    parser.add_argument("--extra-sessions", type=int, default=4, help="额外尝试接入的会话（测试准入控制）")
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--chunk-ms", type=float, default=600.0)
+    parser.add_argument("--live-ms", type=float, default=30.0, help="实时 chunk 计算耗时")
+    parser.add_argument("--bulk-batch-ms", type=float, default=100.0, help="离线批次计算耗时")
+    parser.add_argument("--rtf-budget", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"实时会话 {args.sessions} (+{args.extra_sessions}) 路 | chunk {args.chunk_ms:.0f} ms / 计算 {args.live_ms:.0f} ms | "
+          f"离线批次 {args.bulk_batch_ms:.0f} ms")
+    print("=" * 60)
+    # 先跑优先级调度 + 准入控制，FIFO 再以同样的已准入会话数运行，两者的实时负载相同
+    scheduler, elapsed = _simulate(False, args.sessions, args.seconds, args.chunk_ms, args.live_ms,
+                                   args.bulk_batch_ms, args.rtf_budget, args.extra_sessions)
+    fifo_scheduler, fifo_elapsed = _simulate(True, scheduler.admitted, args.seconds, args.chunk_ms, args.live_ms,
+                                             args.bulk_batch_ms, args.rtf_budget, 0)
+    fifo_scheduler.report(f"FIFO（无优先级、无准入控制，{scheduler.admitted} 路会话）", fifo_elapsed)
+    print()
+    scheduler.report("优先级调度 + 准入控制", elapsed)
+    print()
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+热路径慢 chunk 的按需剖析（profiling）
+realtime_asr_paraformer.py 里某个 chunk 从 50ms 突然跳到 400ms 时，无法知道时间花在了
+funasr 前端 fbank、编码器、Python 解释器开销还是 GC 上。
+
+SlowChunkProfiler 只在"慢 chunk"上输出剖析结果：
+  - Python 采样剖析：chunk 执行期间后台线程按固定间隔采样推理线程的调用栈（开销很低，常开），
+    chunk 超过阈值时输出 speedscope 文件和 flamegraph.pl 可用的折叠栈（.folded，值为微秒）
+  - GC 停顿：从 gc_instrumentation.GcPauseRecorder 统计 chunk 执行期间垃圾回收占用的时间，写入报告
+  - torch.profiler 算子级剖析：开销较大，不常开。出现慢 chunk 后对接下来的若干个 chunk 开启
+    （尖峰往往会重复出现），另外按 torch_sample_rate 随机抽样；被剖析的 chunk 如果也慢，
+    导出 Chrome trace 并打印耗时最多的算子
+
+所有输出文件名都带 chunk 序号与耗时，例如 chunk00042_412ms.speedscope.json。
+
+用法:
+    profiler = SlowChunkProfiler(threshold_ms=150, output_dir="profiles")
+    for i, chunk in enumerate(chunks):
+        with profiler.chunk(i):
+            model.generate(...)
+    profiler.report()
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from gc_instrumentation import GcPauseRecorder, overlap_ms
+
+try:
+    import torch
+    from torch.profiler import ProfilerActivity, profile
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+
+class _StackSampler:
+    """后台线程采样指定线程的调用栈"""
+
+    def __init__(self, interval_ms):
+        self.interval = interval_ms / 1000
+        self._active = threading.Event()
+        self._target = None
+        self.samples = []          # [(timestamp, stack_tuple)]，栈从外到内
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def start(self, thread_id):
+        self.samples = []
+        self._target = thread_id
+        self._active.set()
+
+    def stop(self):
+        self._active.clear()
+        return self.samples
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            frame = sys._current_frames().get(self._target)
+            if frame is not None and self._active.is_set():
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, frame.f_lineno))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.append((time.perf_counter(), tuple(stack)))
+            time.sleep(self.interval)
+
+
+def _sample_weights(samples, interval_ms, end=None):
+    """
+    每个样本的权重（毫秒）：到下一个样本的实际间隔
+
+    采样线程受 GIL 和 sleep 精度影响，实际间隔往往大于 interval_ms（GIL 被长时间占用时尤其明显），
+    按固定间隔或样本数计权会少算时间。最后一个样本计到 end（chunk 结束时刻），未给出时按 interval_ms。
+    """
+    times = [t for t, _ in samples]
+    weights = [(after - before) * 1000 for before, after in zip(times, times[1:])]
+    if times:
+        weights.append(max(0.0, (end - times[-1]) * 1000) if end is not None else interval_ms)
+    return weights
+
+
+def _write_speedscope(path, name, samples, interval_ms, end=None):
+    """sampled 类型的 speedscope 文件（https://www.speedscope.app），权重见 _sample_weights"""
+    frames = []
+    frame_index = {}
+    stacks = []
+    for _, stack in samples:
+        indices = []
+        for func, filename, lineno in stack:
+            key = (func, filename)
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                frames.append({"name": func, "file": filename, "line": lineno})
+            indices.append(frame_index[key])
+        stacks.append(indices)
+    weights = _sample_weights(samples, interval_ms, end)
+    document = {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "playground.profiling_hooks",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": stacks,
+            "weights": weights,
+        }],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f)
+
+
+def _write_folded(path, samples, interval_ms, end=None):
+    """
+    Brendan Gregg flamegraph.pl 使用的折叠栈格式: a;b;c 值
+
+    值为该栈的耗时（整数微秒），与 speedscope 文件使用同一套实测间隔权重，两者的火焰图宽度一致
+    """
+    counts = {}
+    for (_, stack), weight in zip(samples, _sample_weights(samples, interval_ms, end)):
+        key = ";".join(f"{func} ({os.path.basename(filename)})" for func, filename, _ in stack)
+        counts[key] = counts.get(key, 0) + weight
+    with open(path, "w", encoding="utf-8") as f:
+        for key, count in sorted(counts.items()):
+            f.write(f"{key} {round(count * 1000)}\n")
+
+
+class SlowChunkProfiler:
+    """
+    参数:
+        threshold_ms: 超过该耗时的 chunk 视为慢 chunk 并输出剖析文件
+        output_dir: 输出目录
+        sample_interval_ms: Python 栈采样间隔
+        torch_after_slow: 出现慢 chunk 后，对接下来多少个 chunk 开启 torch.profiler
+        torch_sample_rate: 其余 chunk 随机开启 torch.profiler 的概率
+        max_reports: 最多输出多少个慢 chunk，防止磁盘被写满
+    """
+
+    def __init__(self, threshold_ms=150.0, output_dir="profiles", sample_interval_ms=5.0,
+                 torch_after_slow=5, torch_sample_rate=0.02, max_reports=20):
+        self.threshold_ms = threshold_ms
+        self.output_dir = output_dir
+        self.sample_interval_ms = sample_interval_ms
+        self.torch_after_slow = torch_after_slow
+        self.torch_sample_rate = torch_sample_rate
+        self.max_reports = max_reports
+        os.makedirs(output_dir, exist_ok=True)
+
+        self._sampler = _StackSampler(sample_interval_ms)
+        self._torch_armed = 0
+        self._gc = GcPauseRecorder.acquire()
+        self.chunks = 0
+        self.slow_chunks = []      # [(index, latency_ms, gc_ms, [输出文件])]
+
+    def _want_torch(self):
+        # 报告数已满时慢 chunk 不再输出，torch.profiler 的开销白花
+        if not TORCH_AVAILABLE or len(self.slow_chunks) >= self.max_reports:
+            return False
+        if self._torch_armed > 0:
+            self._torch_armed -= 1
+            return True
+        return random.random() < self.torch_sample_rate
+
+    @contextmanager
+    def chunk(self, index):
+        """包住一次 chunk 推理"""
+        self.chunks += 1
+        use_torch = self._want_torch()
+        torch_prof = None
+        if use_torch:
+            torch_prof = profile(activities=[ProfilerActivity.CPU] + (
+                [ProfilerActivity.CUDA] if torch.cuda.is_available() else []))
+            torch_prof.__enter__()
+        gc_cursor = self._gc.cursor()
+        self._sampler.start(threading.get_ident())
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            latency_ms = (end - start) * 1000
+            samples = self._sampler.stop()
+            gc_ms = sum(overlap_ms(pause, start, end) for pause in self._gc.since(gc_cursor))
+            self._gc.release_cursor(gc_cursor)
+            if torch_prof is not None:
+                torch_prof.__exit__(None, None, None)
+            if latency_ms >= self.threshold_ms and len(self.slow_chunks) < self.max_reports:
+                self._emit(index, latency_ms, gc_ms, samples, torch_prof, end)
+                self._torch_armed = self.torch_after_slow if len(self.slow_chunks) < self.max_reports else 0
+
+    def _emit(self, index, latency_ms, gc_ms, samples, torch_prof, end=None):
+        tag = f"chunk{index:05d}_{latency_ms:.0f}ms"
+        files = []
+        if samples:
+            path = os.path.join(self.output_dir, f"{tag}.speedscope.json")
+            _write_speedscope(path, f"{tag} (Python 采样)", samples, self.sample_interval_ms, end)
+            files.append(path)
+            path = os.path.join(self.output_dir, f"{tag}.folded")
+            _write_folded(path, samples, self.sample_interval_ms, end)
+            files.append(path)
+        if torch_prof is not None:
+            path = os.path.join(self.output_dir, f"{tag}.torch_trace.json")
+            torch_prof.export_chrome_trace(path)
+            files.append(path)
+            print(f"\n[慢 chunk {index}: {latency_ms:.1f} ms, GC {gc_ms:.1f} ms] 耗时最多的算子:")
+            print(torch_prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=10))
+        self.slow_chunks.append((index, latency_ms, gc_ms, files))
+
+    def close(self):
+        if self._gc is not None:
+            self._gc.release()
+            self._gc = None
+
+    def report(self):
+        print("慢 chunk 剖析:")
+        print(f"  阈值: {self.threshold_ms:.0f} ms | 总 chunk 数: {self.chunks} | 慢 chunk 数: {len(self.slow_chunks)}")
+        for index, latency_ms, gc_ms, files in self.slow_chunks:
+            print(f"  chunk {index}: {latency_ms:.1f} ms（其中 GC {gc_ms:.1f} ms）")
+            for path in files:
+                print(f"    {path}")
+
+
+def create_profiler_from_env():
+    """设置 ASR_PROFILE_SLOW_MS（阈值）时返回 SlowChunkProfiler，输出目录由 ASR_PROFILE_DIR 指定"""
+    threshold = os.environ.get("ASR_PROFILE_SLOW_MS")
+    if not threshold:
+        return None
+    return SlowChunkProfiler(float(threshold), os.environ.get("ASR_PROFILE_DIR", "profiles"))
@@ -9,6 +9,14 @@ try:
 except ImportError:
     PSUTIL_AVAILABLE = False
 
+from decode_timing import DecodeStepTimer
+from frame_ingest import create_camera_from_env, memoize_visual_encoder
+from metrics import start_metrics_server_from_env
+from vision_budget import budget_from_env, load_image, visual_tokens
+
+# 设置环境变量 METRICS_PORT 后启动 /metrics 端点，记录 TTFT、token 间隔与增量解码失败数
+metrics = start_metrics_server_from_env()
+
 # Check GPU availability
 device = "cuda" if torch.cuda.is_available() else "cpu"
 print(f"使用设备: {device}")
@@ -28,11 +36,16 @@ if torch.cuda.is_available():
 print("\n正在加载模型...")
 model_load_start_mem = torch.cuda.memory_allocated() / 1024**3 if torch.cuda.is_available() else 0
 
-model = Qwen3VLForConditionalGeneration.from_pretrained(
-    "Qwen/Qwen3-VL-2B-Instruct",
-    torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
-    device_map="auto"
-)
+# CPU 上多进程部署时设置 SHARED_WEIGHTS=1，所有进程映射同一份权重（见 shared_weights.py）
+if os.environ.get("SHARED_WEIGHTS") and not torch.cuda.is_available():
+    from shared_weights import load_qwen3_vl_shared
+    model = load_qwen3_vl_shared("Qwen/Qwen3-VL-2B-Instruct")
+else:
+    model = Qwen3VLForConditionalGeneration.from_pretrained(
+        "Qwen/Qwen3-VL-2B-Instruct",
+        torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
+        device_map="auto"
+    )
 print(f"模型已加载到: {model.device}")
 
 # Record memory after model loading
@@ -50,13 +63,32 @@ if torch.cuda.is_available():
 
 processor = AutoProcessor.from_pretrained("Qwen/Qwen3-VL-2B-Instruct")
 
+image_source = "http://localhost/123.jpeg"
+# 设置 VL_CAMERA=<摄像头编号|视频文件|synthetic> 后改为"看"摄像头的当前画面：
+# 按 VL_CAMERA_FPS 采样、感知哈希去重，视觉编码按像素缓存（见 frame_ingest.py）
+camera = create_camera_from_env()
+encoder_cache = None
+if camera:
+    encoder_cache = memoize_visual_encoder(model)
+    camera.advance(float(os.environ.get("VL_CAMERA_SECONDS", "5")))
+    image_source = camera.current_image()
+    print(f"摄像头画面: {camera.source}，已读取 {camera.position:.1f} 秒")
+# 设置 VL_MAX_VISUAL_TOKENS 后加载时预先缩小图像，视觉 token 数（prefill 耗时）可预期
+max_visual_tokens = budget_from_env()
+if max_visual_tokens:
+    resize_start = time.perf_counter()
+    image_source = load_image(image_source, max_visual_tokens)
+    print(f"图像预缩放: {image_source.size[0]}x{image_source.size[1]}，"
+          f"视觉 token {visual_tokens(*image_source.size)}（上限 {max_visual_tokens}），"
+          f"耗时 {(time.perf_counter() - resize_start)*1000:.2f} 毫秒")
+
 messages = [
     {
         "role": "user",
         "content": [
             {
                 "type": "image",
-                "image": "http://localhost/123.jpeg",
+                "image": image_source,
             },
             {"type": "text", "text": "这张图片中你看到了什么"},
         ],
@@ -98,15 +130,25 @@ class StreamingTextStreamer:
         self.generated_tokens = []
         self.current_text = ""
         self.token_intervals = []  # 存储每个token的时间间隔
+        self.tokens_per_put = []   # 每次 put 的 token 数（投机解码时一次可以输出多个）
+        self.next_tokens_are_prompt = True
         
     def put(self, value):
         """Called when a new token is generated - 这个方法在每个token生成时立即被调用"""
+        # generate 开始时会先把 prompt 整体 put 一次，不是生成的 token
+        if self.skip_prompt and self.next_tokens_are_prompt:
+            self.next_tokens_are_prompt = False
+            return
+        if decode_timer:
+            decode_timer.put_begin()
         current_time = time.perf_counter()
         
         # 计算与上一个token的时间差
         if self.previous_token_time is not None:
             interval = current_time - self.previous_token_time
             self.token_intervals.append(interval)
+            if metrics:
+                metrics.inter_token.labels(model="qwen3-vl-2b").observe(interval)
             interval_ms = interval * 1000
             print(f"[间隔: {interval_ms:.2f}ms]", end='', flush=True)
         elif self.token_count == 0:
@@ -126,7 +168,8 @@ class StreamingTextStreamer:
             token_ids = token_ids[0]
         
         self.generated_tokens.extend(token_ids)
-        self.token_count += 1
+        self.token_count += len(token_ids)
+        self.tokens_per_put.append(len(token_ids))
         
         # Decode and print the new text
         try:
@@ -142,7 +185,10 @@ class StreamingTextStreamer:
                 self.current_text = new_text
         except Exception as e:
             # If decoding fails, just continue
-            pass
+            if metrics:
+                metrics.errors.labels(stage="detokenize").inc()
+        if decode_timer:
+            decode_timer.put_end()
         
     def end(self):
         """Called when generation is complete"""
@@ -163,6 +209,10 @@ if PSUTIL_AVAILABLE:
     process = psutil.Process(os.getpid())
     gen_start_ram = process.memory_info().rss / 1024**3
 
+# 设置环境变量 DECODE_TIMING_FILE=<输出文件> 后，逐步拆分解码耗时（前向/采样/streamer）并导出
+decode_timing_file = os.environ.get("DECODE_TIMING_FILE")
+decode_timer = DecodeStepTimer(model) if decode_timing_file else None
+
 # Create streaming text streamer
 streamer = StreamingTextStreamer(
     tokenizer=processor.tokenizer,
@@ -170,6 +220,24 @@ streamer = StreamingTextStreamer(
     skip_special_tokens=True
 )
 
+# 投机解码（可选，贪心解码下输出与普通解码一致）:
+#   SPECULATIVE=prompt_lookup       从 prompt 中查找 n-gram 作为草稿（无需额外模型），
+#                                   草稿长度由 PROMPT_LOOKUP_TOKENS 指定
+#   SPECULATIVE_VERIFY=1            额外跑一遍普通贪心解码，逐 token 比较输出并给出加速比
+# 不支持用独立草稿模型：纯文本小模型收不了 pixel_values，带图输入下 assistant_model 无法工作
+speculative = os.environ.get("SPECULATIVE", "")
+speculative_kwargs = {}
+if speculative == "prompt_lookup":
+    speculative_kwargs["prompt_lookup_num_tokens"] = int(os.environ.get("PROMPT_LOOKUP_TOKENS", "10"))
+    # prompt 里有成段的 <|image_pad|>，草稿照抄过来后图像 token 数与 pixel_values 对不上（generate 报错）；
+    # 屏蔽视觉占位 token 后草稿在这些位置截断（正常回答本来也不会输出它们）
+    speculative_kwargs["suppress_tokens"] = [model.config.image_token_id, model.config.video_token_id,
+                                             model.config.vision_start_token_id, model.config.vision_end_token_id]
+elif speculative:
+    sys.exit(f"不支持的 SPECULATIVE={speculative}（只支持 prompt_lookup）")
+if speculative_kwargs:
+    print(f"投机解码: {speculative}")
+
 # Start timing from RIGHT BEFORE model.generate() call
 # This is the TRUE start time for first token latency
 true_start_time = time.perf_counter()
@@ -181,6 +249,7 @@ generated_ids = model.generate(
     streamer=streamer,
     do_sample=False,
     use_cache=True,
+    **speculative_kwargs,
 )
 
 end_time = time.perf_counter()
@@ -203,6 +272,8 @@ if PSUTIL_AVAILABLE:
 # Calculate first token latency (TRUE TTFT - from model.generate() call to first token)
 if streamer.first_token_time:
     first_token_latency = streamer.first_token_time - true_start_time
+    if metrics:
+        metrics.ttft.labels(model="qwen3-vl-2b").observe(first_token_latency)
     # Total time including preprocessing
     total_time_with_prep = first_token_latency + prep_time
 else:
@@ -251,6 +322,61 @@ if streamer.token_intervals:
     print(f"  最小间隔: {min_interval:.2f} 毫秒")
     print(f"  最大间隔: {max_interval:.2f} 毫秒")
     print(f"  总间隔数: {len(intervals_ms)}")
+    # 投机解码时一次间隔可以输出多个 token，按 token 平摊后才能和普通解码比较
+    interval_tokens = sum(streamer.tokens_per_put[1:])
+    if interval_tokens:
+        print(f"  平均每 token 间隔: {sum(intervals_ms) / interval_tokens:.2f} 毫秒")
+    print(f"  平均每次输出 token 数: {streamer.token_count / len(streamer.tokens_per_put):.2f}")
+
+if decode_timer:
+    print()
+    decode_timer.report()
+    decode_timer.export(decode_timing_file)
+    decode_timer.close()
+    print(f"  明细已导出: {decode_timing_file}")
+if speculative_kwargs and os.environ.get("SPECULATIVE_VERIFY"):
+    baseline_start = time.perf_counter()
+    baseline_ids = model.generate(**inputs, max_new_tokens=128, do_sample=False, use_cache=True,
+                                  suppress_tokens=speculative_kwargs.get("suppress_tokens"))
+    baseline_time = time.perf_counter() - baseline_start
+    baseline_trimmed = baseline_ids[0][len(inputs.input_ids[0]):].tolist()
+    speculative_trimmed = generated_ids_trimmed[0].tolist()
+    mismatch = next((i for i, (a, b) in enumerate(zip(baseline_trimmed, speculative_trimmed)) if a != b), None)
+    print(f"\n投机解码校验:")
+    print(f"  普通贪心解码耗时: {baseline_time:.2f} 秒 ({len(baseline_trimmed) / baseline_time:.2f} tokens/秒)")
+    print(f"  加速比: {baseline_time / generation_time:.2f}x")
+    if mismatch is None and len(baseline_trimmed) == len(speculative_trimmed):
+        print(f"  输出与普通贪心解码完全一致（{len(baseline_trimmed)} 个 token）")
+    elif mismatch is None:
+        # 最后一轮草稿被整段接受时，投机解码可能比 max_new_tokens 多输出 token
+        common = min(len(baseline_trimmed), len(speculative_trimmed))
+        print(f"  前 {common} 个 token 与普通贪心解码一致"
+              f"（长度 {len(speculative_trimmed)} vs {len(baseline_trimmed)}）")
+    else:
+        print(f"  输出在第 {mismatch + 1} 个 token 处不同（数值误差导致的 argmax 平局翻转时可能出现）")
+if camera:
+    # 追问若干轮：每轮先读一段新画面，画面没变时像素与上一轮相同，视觉编码直接命中缓存
+    camera_turns = int(os.environ.get("VL_CAMERA_TURNS", "3"))
+    camera_interval = float(os.environ.get("VL_CAMERA_SECONDS", "5"))
+    print(f"\n摄像头追问（{camera_turns} 轮，每轮读取 {camera_interval:.0f} 秒画面）:")
+    for turn_index in range(camera_turns):
+        changed = camera.advance(camera_interval)
+        turn_image = camera.current_image()
+        if max_visual_tokens:
+            turn_image = load_image(turn_image, max_visual_tokens)
+        turn_messages = [{"role": "user", "content": [{"type": "image", "image": turn_image},
+                                                      {"type": "text", "text": "这张图片中你看到了什么"}]}]
+        turn_inputs = processor.apply_chat_template(turn_messages, tokenize=True, add_generation_prompt=True,
+                                                    return_dict=True, return_tensors="pt").to(model.device)
+        misses_before = encoder_cache.misses
+        turn_start = time.perf_counter()
+        model.generate(**turn_inputs, max_new_tokens=1, do_sample=False, use_cache=True)
+        turn_ms = (time.perf_counter() - turn_start) * 1000
+        encoded = "运行编码器" if encoder_cache.misses > misses_before else "命中缓存"
+        print(f"  第 {turn_index + 1} 轮: 新画面 {changed} 帧 | 视觉编码 {encoded} | 首 token {turn_ms:.2f} 毫秒")
+    camera.ingest.report()
+    encoder_cache.report()
+
 print("\n内存统计:")
 print("-" * 50)
 if torch.cuda.is_available():
@@ -0,0 +1,321 @@
+"""
+两遍识别：paraformer 流式部分结果 + SenseVoiceSmall 整句重识别
+realtime_asr_paraformer.py（流式，准确率较低）和 realtime_asr_funasr.py（SenseVoiceSmall 离线，
+准确率高、有标点和情感标签）只能二选一。
+
+第一遍: fsmn-vad + paraformer-zh-streaming 逐 chunk 识别，部分结果实时显示，Endpointer 断句
+第二遍: 每句话（断句时截取该句音频，VAD 起点前留 300ms）交给后台线程里的 SenseVoiceSmall 重新识别，
+       富文本标签清理（text_postprocess）后按句原位替换第一遍的结果
+第二遍跟不上时（待处理句数超过 --max-pending），最旧的句子保留第一遍结果，不再重识别，
+保证第二遍的延迟不会无限增长。
+
+MODEL_SCHEDULER=1: 两个模型经由 priority_scheduler.ModelScheduler 串行执行，流式 chunk 优先，
+第二遍重识别在批次边界让出（实时 chunk 最多等待一句话的重识别耗时）。
+
+SHARED_FBANK=1: 整条音频流的 fbank 每个 chunk 只增量计算一次（streaming_fbank.SharedModelFrontends），
+fsmn-vad 与 paraformer 经由 generate(frontend=...) 共用它，各自只做 LFR + CMVN；断句后把该句的特征
+（SenseVoice 的 LFR + CMVN）直接交给第二遍，SenseVoice 也不再从采样重算前端。
+启动时先与三个模型自带的前端各做一次一致性校验。
+
+统计: 断句 → 第二遍替换 的延迟、排队等待、SenseVoice 解码耗时（及其相对句子时长的 RTF）、丢弃句数。
+
+用法:
+    python realtime_asr_2pass.py --wav asr_example_zh.wav
+    python realtime_asr_2pass.py --wav asr_example_zh.wav --no-realtime   # 不按音频节奏送入，尽快处理
+"""
+
+import argparse
+import collections
+import threading
+import time
+
+import numpy as np
+
+from audio_format import normalize_audio
+from endpointing import Endpointer
+from metrics import start_metrics_server_from_env
+from perf_stats import print_latency_summary
+from priority_scheduler import create_model_scheduler_from_env
+from streaming_fbank import (FRAME_SHIFT, check_parity, create_shared_frontends_from_env, frontend_kwargs,
+                             lfr_cmvn_from_frontend)
+from text_postprocess import TextPostprocessor
+
+CHUNK_SIZE = [0, 10, 5]   # 600ms
+ENCODER_CHUNK_LOOK_BACK = 4
+DECODER_CHUNK_LOOK_BACK = 1
+CHUNK_MS = CHUNK_SIZE[1] * 60
+PREROLL_MS = 300
+
+
+class SecondPassWorker:
+    """
+    后台线程里对整句音频做 SenseVoiceSmall 重识别
+
+    参数:
+        model: SenseVoiceSmall 的 AutoModel
+        on_result: on_result(segment_id, text) 第二遍结果回调（在工作线程中调用）
+        max_pending: 待处理句数上限，超过时丢弃最旧的（保留第一遍结果）
+        scheduler: 可选的 ModelScheduler，重识别作为离线任务提交
+        metrics: 可选的 PipelineMetrics，记录排队句数、因积压丢弃的句数和解码失败数
+    """
+
+    def __init__(self, model, on_result, max_pending=4, sample_rate=16000, scheduler=None, metrics=None):
+        self.model = model
+        self.scheduler = scheduler
+        self.on_result = on_result
+        self.max_pending = max_pending
+        self.sample_rate = sample_rate
+        self.postprocessor = TextPostprocessor(itn=False, rich=True)
+
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.delay_ms = []        # 断句 → 第二遍结果可用
+        self.queue_wait_ms = []   # 断句 → 开始解码
+        self.decode_ms = []
+        self.decode_rtf = []
+        self.queue_depths = []    # 提交时已在排队的句数
+        self.dropped = 0
+        self.failed = 0
+        self._depth_metric = self._drop_metric = self._error_metric = None
+        if metrics:
+            self._depth_metric = metrics.queue_depth.labels(queue="second_pass")
+            self._drop_metric = metrics.cancellations.labels(stage="second_pass")
+            self._error_metric = metrics.errors.labels(stage="second_pass")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, segment_id, audio, feats=None):
+        """feats 为该句已算好的特征（LFR + CMVN 之后）时跳过 SenseVoice 的前端"""
+        with self._cond:
+            self.queue_depths.append(len(self._pending))
+            self._pending.append((segment_id, audio, feats, time.perf_counter()))
+            while len(self._pending) > self.max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+                if self._drop_metric:
+                    self._drop_metric.inc()
+            if self._depth_metric:
+                self._depth_metric.set(len(self._pending))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                segment_id, audio, feats, submitted = self._pending.popleft()
+                if self._depth_metric:
+                    self._depth_metric.set(len(self._pending))
+            start = time.perf_counter()
+            try:
+                if self.scheduler is None:
+                    res = self._decode(audio, feats)
+                else:
+                    res = self.scheduler.submit_bulk(lambda: self._decode(audio, feats)).result()
+            except Exception as exc:
+                # 解码失败时保留第一遍结果，继续处理后面的句子
+                self.failed += 1
+                if self._error_metric:
+                    self._error_metric.inc()
+                print(f"[第二遍] 第 {segment_id + 1} 句解码失败: {exc!r}")
+                continue
+            decoded = time.perf_counter()
+            text = self.postprocessor.process(res[0]["text"]) if res else ""
+            end = time.perf_counter()
+            self.queue_wait_ms.append((start - submitted) * 1000)
+            self.decode_ms.append((decoded - start) * 1000)
+            self.decode_rtf.append((decoded - start) / (len(audio) / self.sample_rate))
+            self.delay_ms.append((end - submitted) * 1000)
+            self.on_result(segment_id, text)
+
+    def _decode(self, audio, feats=None):
+        if feats is None:
+            return self.model.generate(input=audio, cache={}, language="auto", use_itn=True, batch_size_s=60)
+        import torch
+
+        return self.model.generate(input=torch.from_numpy(feats)[None], input_len=torch.tensor([len(feats)]),
+                                   data_type="fbank", cache={}, language="auto", use_itn=True)
+
+    def close(self):
+        """等待已提交的句子全部处理完"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def report(self):
+        print("第二遍（SenseVoiceSmall）:")
+        print_latency_summary("  断句 → 第二遍替换", self.delay_ms, indent="    ")
+        print_latency_summary("  排队等待", self.queue_wait_ms, indent="    ")
+        print_latency_summary("  解码耗时", self.decode_ms, indent="    ")
+        if self.decode_rtf:
+            print(f"  解码 RTF: 平均 {sum(self.decode_rtf) / len(self.decode_rtf):.3f} | 最大 {max(self.decode_rtf):.3f}")
+        if self.queue_depths:
+            print(f"  提交时排队句数: 最大 {max(self.queue_depths)}")
+        print(f"  因积压丢弃（保留第一遍结果）: {self.dropped} 句")
+        if self.failed:
+            print(f"  解码失败（保留第一遍结果）: {self.failed} 句")
+
+
+class Transcript:
+    """按句保存识别结果；第二遍结果到达时原位替换"""
+
+    def __init__(self):
+        self.segments = []
+        self._lock = threading.Lock()
+
+    def add(self, first_pass):
+        with self._lock:
+            self.segments.append({"first": first_pass, "second": None})
+            return len(self.segments) - 1
+
+    def replace(self, segment_id, text):
+        with self._lock:
+            self.segments[segment_id]["second"] = text
+        print(f"[第二遍] 第 {segment_id + 1} 句: {text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="paraformer 流式 + SenseVoiceSmall 两遍识别")
+    parser.add_argument("--wav", default="/home/leedow/下载/asr_example_zh.wav")
+    parser.add_argument("--no-realtime", action="store_true", help="不按音频节奏送入 chunk")
+    parser.add_argument("--max-pending", type=int, default=4, help="第二遍待处理句数上限")
+    args = parser.parse_args()
+
+    import soundfile
+    import torch
+    from funasr import AutoModel
+
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    print(f"推理设备: {device}")
+    print("\n正在加载模型...")
+    model_load_start = time.perf_counter()
+    vad_model = AutoModel(model="fsmn-vad", device=device, disable_update=True)
+    asr_model = AutoModel(model="paraformer-zh-streaming", device=device, disable_update=True)
+    rescore_model = AutoModel(model="iic/SenseVoiceSmall", device=device, disable_update=True)
+    print(f"模型加载完成！耗时: {time.perf_counter() - model_load_start:.2f} 秒")
+
+    speech, sample_rate = normalize_audio(*soundfile.read(args.wav))
+    # 文件末尾补 2 秒静音，模拟说完话后麦克风仍在采集
+    speech = np.concatenate((speech, np.zeros(2 * sample_rate, dtype=np.float32)))
+    chunk_stride = CHUNK_SIZE[1] * 960
+    total_chunk_num = int((len(speech) - 1) / chunk_stride + 1)
+
+    scheduler = create_model_scheduler_from_env(CHUNK_MS / 1000)
+    # 设置环境变量 METRICS_PORT 后启动 /metrics 端点，记录第二遍的排队句数、丢弃数和失败数
+    metrics = start_metrics_server_from_env()
+
+    def run_live(fn):
+        return fn() if scheduler is None else scheduler.submit_live(fn).result()
+
+    # 共享 fbank：frames 保存当前句缓冲起点之后的 fbank 帧，frames_offset 为 frames[0] 的帧序号
+    shared_frontend = create_shared_frontends_from_env(vad=vad_model, asr=asr_model)
+    if shared_frontend is not None:
+        for name, model in (("fsmn-vad", vad_model), ("paraformer", asr_model), ("SenseVoice", rescore_model)):
+            max_diff, ours_shape, ref_shape = check_parity(model.kwargs["frontend"], speech[:3 * sample_rate])
+            print(f"共享 fbank 与 {name} 前端一致性: 最大误差 {max_diff:.2e} | {ours_shape} vs {ref_shape}")
+        sense_lfr = lfr_cmvn_from_frontend(rescore_model.kwargs["frontend"])
+        frames, frames_offset = [], 0
+
+    transcript = Transcript()
+    worker = SecondPassWorker(rescore_model, transcript.replace, args.max_pending, sample_rate, scheduler,
+                              metrics)
+    endpointer = Endpointer()
+    vad_cache, asr_cache = {}, {}
+    segment_start = 0          # 当前句音频缓冲的起点（采样）
+    vad_begin_ms = None
+    first_pass_ms = []
+
+    print("\n开始推理...")
+    print("=" * 60)
+    stream_start = time.perf_counter()
+    for i in range(total_chunk_num):
+        chunk_end = min((i + 1) * chunk_stride, len(speech))
+        if not args.no_realtime:
+            delay = stream_start + chunk_end / sample_rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        speech_chunk = speech[i * chunk_stride:chunk_end]
+        chunk_end_ms = chunk_end / sample_rate * 1000
+
+        chunk_start = time.perf_counter()
+        if shared_frontend is not None:
+            frames.append(shared_frontend.push(speech_chunk))
+        vad_res, asr_res = run_live(lambda: (
+            vad_model.generate(input=speech_chunk, cache=vad_cache, is_final=False, chunk_size=CHUNK_MS,
+                               **frontend_kwargs(shared_frontend, "vad")),
+            asr_model.generate(input=speech_chunk, cache=asr_cache, is_final=False, chunk_size=CHUNK_SIZE,
+                               encoder_chunk_look_back=ENCODER_CHUNK_LOOK_BACK,
+                               decoder_chunk_look_back=DECODER_CHUNK_LOOK_BACK,
+                               **frontend_kwargs(shared_frontend, "asr"))))
+        for beg, _ in vad_res[0]["value"]:
+            if beg != -1 and vad_begin_ms is None:
+                vad_begin_ms = beg
+        partial = asr_res[0]["text"] if asr_res else ""
+        reason = endpointer.update(speech_chunk, sample_rate, partial, vad_res[0]["value"])
+
+        if reason:
+            flush_audio = np.zeros(960, dtype=np.float32)
+            if shared_frontend is not None:
+                shared_frontend.flush("asr", flush_audio)
+            flush_res = run_live(lambda: asr_model.generate(
+                input=flush_audio, cache=asr_cache, is_final=True, chunk_size=CHUNK_SIZE,
+                encoder_chunk_look_back=ENCODER_CHUNK_LOOK_BACK, decoder_chunk_look_back=DECODER_CHUNK_LOOK_BACK,
+                **frontend_kwargs(shared_frontend, "asr")))
+            asr_cache = {}
+            text = endpointer.text + (flush_res[0]["text"] if flush_res else "")
+            emit_ms = chunk_end_ms + (time.perf_counter() - chunk_start) * 1000
+            endpointer.finalized(reason, emit_ms)
+
+            # 截取这句话的音频：VAD 起点前留一点余量，到当前 chunk 结束
+            begin = segment_start
+            if vad_begin_ms is not None:
+                begin = max(segment_start, int((vad_begin_ms - PREROLL_MS) * sample_rate / 1000))
+            segment_id = transcript.add(text)
+            feats = None
+            if shared_frontend is not None:
+                # 起点对齐到帧移，这样增量帧与单独对该句音频分帧的结果完全相同
+                begin -= begin % FRAME_SHIFT
+                stream_frames = np.concatenate(frames)
+                feats = sense_lfr.process(segment_id, stream_frames[begin // FRAME_SHIFT - frames_offset:],
+                                          is_final=True)
+            worker.submit(segment_id, speech[begin:chunk_end].copy(), feats)
+            print(f"[第一遍 {reason}] 第 {segment_id + 1} 句 {emit_ms / 1000:.2f}s: {text}")
+            # 下一句的缓冲从本句末尾的余量开始（提前断句时下一句可能紧接着开始）
+            segment_start = max(begin, chunk_end - PREROLL_MS * sample_rate // 1000)
+            vad_begin_ms = None
+            if shared_frontend is not None:
+                # 下一句只会从 segment_start 之后开始，之前的帧可以丢掉
+                keep_from = segment_start // FRAME_SHIFT
+                frames = [stream_frames[keep_from - frames_offset:]]
+                frames_offset = keep_from
+        elif partial:
+            print(f"[部分] {chunk_end_ms / 1000:.2f}s: {endpointer.text}")
+        first_pass_ms.append((time.perf_counter() - chunk_start) * 1000)
+
+    worker.close()
+    stream_elapsed = time.perf_counter() - stream_start
+    if scheduler is not None:
+        scheduler.shutdown()
+
+    print("\n" + "=" * 60)
+    print("识别结果（第一遍 → 第二遍）:")
+    for n, segment in enumerate(transcript.segments, 1):
+        print(f"  第 {n} 句: {segment['first']}")
+        print(f"        → {segment['second'] if segment['second'] is not None else '（未重识别）'}")
+    print("-" * 60)
+    print_latency_summary("第一遍每 chunk 耗时", first_pass_ms)
+    endpointer.report()
+    if shared_frontend is not None:
+        shared_frontend.report()
+    worker.report()
+    if scheduler is not None:
+        scheduler.report("模型调度", stream_elapsed)
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
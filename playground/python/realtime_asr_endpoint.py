@@ -0,0 +1,164 @@
+"""
+fsmn-vad + paraformer-zh-streaming 实时识别，带提前断句
+每个 600ms chunk 同时送入 VAD 和流式 ASR，由 Endpointer 决定何时 is_final 冲刷并重置 cache，
+模拟真实麦克风（没有"最后一个 chunk"）的场景，输出语音结束到最终文本的延迟分布。
+
+设置 VOICE_REPLY=mock|openai|dashscope 时，每句最终文本接着交给 voice_loop.run_turn
+（LLM → TTS，VOICE_REPLY_TTS 选择 TTS 后端，默认 fake），并沿用这句话的 Turn，
+配合 TRACE_FILE 得到 语音进入 → 断句 → 识别 → LLM → TTS → 播放 的完整 trace。
+回复在识别循环里同步执行，会推迟后续 chunk 的处理，仅用于测量单句的口到耳延迟。
+
+设置 SHARED_FBANK=1 时，VAD 与 ASR 共用一份增量 fbank（streaming_fbank.SharedModelFrontends），
+每个 chunk 只计算一次前端。
+"""
+
+from funasr import AutoModel
+import time
+import soundfile
+import numpy as np
+import os
+import torch
+
+from audio_format import normalize_audio
+from endpointing import Endpointer
+from streaming_fbank import create_shared_frontends_from_env, frontend_kwargs
+from tracing import STAGE_ASR, STAGE_INGEST, STAGE_VAD, create_tracer_from_env, stage_report
+
+chunk_size = [0, 10, 5] #[0, 10, 5] 600ms, [0, 8, 4] 480ms
+encoder_chunk_look_back = 4 #number of chunks to lookback for encoder self-attention
+decoder_chunk_look_back = 1 #number of encoder chunks to lookback for decoder cross-attention
+chunk_ms = chunk_size[1] * 60
+
+# 检测并配置 GPU
+device = "cuda:0" if torch.cuda.is_available() else "cpu"
+print(f"推理设备: {device}")
+
+print("\n正在加载模型...")
+model_load_start = time.perf_counter()
+vad_model = AutoModel(model="fsmn-vad", device=device)
+asr_model = AutoModel(model="paraformer-zh-streaming", device=device)
+model_load_time = time.perf_counter() - model_load_start
+print(f"模型加载完成！耗时: {model_load_time:.2f} 秒")
+
+speech, sample_rate = soundfile.read("/home/leedow/下载/asr_example_zh.wav")
+speech, sample_rate = normalize_audio(speech, sample_rate)
+# 文件末尾补 2 秒静音，模拟说完话后麦克风仍在采集
+speech = np.concatenate((speech, np.zeros(2 * sample_rate, dtype=np.float32)))
+chunk_stride = chunk_size[1] * 960
+
+vad_cache = {}
+asr_cache = {}
+shared_frontend = create_shared_frontends_from_env(vad=vad_model, asr=asr_model)
+endpointer = Endpointer()
+total_chunk_num = int((len(speech) - 1) / chunk_stride + 1)
+finals = []
+# 设置环境变量 TRACE_FILE 后，每句话记录 语音进入 → 断句 → 最终文本 的追踪
+tracer = create_tracer_from_env("realtime-asr")
+turn = None
+
+reply_backend = os.environ.get("VOICE_REPLY")
+reply_tts = os.environ.get("VOICE_REPLY_TTS", "fake")
+reply_llm = None
+reply_server = None
+if reply_backend:
+    from llm_backends import create_llm_client
+    from voice_loop import run_turn
+    if reply_backend == "mock":
+        from mock_llm_server import start_mock_server
+        reply_server, base_url = start_mock_server()
+        reply_llm = create_llm_client("openai", base_url=base_url)
+    else:
+        reply_llm = create_llm_client(reply_backend)
+    reply_llm.warmup()
+
+print(f"\n音频总长度（含尾部静音）: {len(speech)/sample_rate:.2f} 秒")
+print(f"Chunk 大小: {chunk_ms} ms")
+print("\n开始推理...")
+print("="*60)
+
+for i in range(total_chunk_num):
+    speech_chunk = speech[i*chunk_stride:(i+1)*chunk_stride]
+    chunk_end_ms = min((i + 1) * chunk_stride, len(speech)) / sample_rate * 1000
+
+    chunk_start = time.perf_counter()
+    if shared_frontend:
+        shared_frontend.push(speech_chunk)
+    vad_res = vad_model.generate(input=speech_chunk, cache=vad_cache, is_final=False, chunk_size=chunk_ms,
+                                 **frontend_kwargs(shared_frontend, "vad"))
+    # VAD 结果在这里就已可用；断句要等 ASR 和 Endpointer 之后才确定，打点时间用这一刻，不含本 chunk 的 ASR 耗时
+    vad_done_ns = tracer.now_ns() if tracer else None
+    asr_res = asr_model.generate(input=speech_chunk, cache=asr_cache, is_final=False, chunk_size=chunk_size,
+                                 encoder_chunk_look_back=encoder_chunk_look_back,
+                                 decoder_chunk_look_back=decoder_chunk_look_back,
+                                 **frontend_kwargs(shared_frontend, "asr"))
+    partial = asr_res[0]["text"] if asr_res else ""
+    reason = endpointer.update(speech_chunk, sample_rate, partial, vad_res[0]["value"])
+    if tracer and turn is None and (partial or any(beg != -1 for beg, _ in vad_res[0]["value"])):
+        chunk_start_ns = tracer.to_ns(chunk_start)
+        turn = tracer.start_turn(start_ns=chunk_start_ns)
+        turn.mark(STAGE_INGEST, at_ns=chunk_start_ns)
+
+    if reason:
+        if turn:
+            turn.mark(STAGE_VAD, at_ns=vad_done_ns)
+        # is_final 冲刷：送一帧（60ms）静音把前端和解码器里剩余的文字吐出来，然后重置会话 cache
+        flush_audio = np.zeros(960, dtype=np.float32)
+        if shared_frontend:
+            shared_frontend.flush("asr", flush_audio)
+        flush_res = asr_model.generate(input=flush_audio, cache=asr_cache, is_final=True,
+                                       chunk_size=chunk_size, encoder_chunk_look_back=encoder_chunk_look_back,
+                                       decoder_chunk_look_back=decoder_chunk_look_back,
+                                       **frontend_kwargs(shared_frontend, "asr"))
+        tail = flush_res[0]["text"] if flush_res else ""
+        asr_cache = {}
+        emit_ms = chunk_end_ms + (time.perf_counter() - chunk_start) * 1000
+        text = endpointer.text + tail
+        endpointer.finalized(reason, emit_ms)
+        finals.append(text)
+        if turn:
+            turn.mark(STAGE_ASR)
+        print(f"[最终 {reason}] {emit_ms/1000:.2f}s: {text}")
+        if reply_llm is not None and text:
+            reply = run_turn(reply_llm, [{"role": "user", "content": text}], reply_tts, turn=turn)
+            print(f"[回复] {reply['text']}")
+        if turn:
+            turn.end(endpoint_reason=reason, text=text)
+            turn = None
+    elif partial:
+        print(f"[部分] {chunk_end_ms/1000:.2f}s: {endpointer.text}")
+
+# 流结束时还没断句的句子：冲刷出剩余文字并结束 Turn，否则这一轮不会导出
+if turn or endpointer.text:
+    flush_audio = np.zeros(960, dtype=np.float32)
+    if shared_frontend:
+        shared_frontend.flush("asr", flush_audio)
+    flush_res = asr_model.generate(input=flush_audio, cache=asr_cache, is_final=True,
+                                   chunk_size=chunk_size, encoder_chunk_look_back=encoder_chunk_look_back,
+                                   decoder_chunk_look_back=decoder_chunk_look_back,
+                                   **frontend_kwargs(shared_frontend, "asr"))
+    text = endpointer.text + (flush_res[0]["text"] if flush_res else "")
+    if text:
+        finals.append(text)
+        print(f"[最终 stream_end] {len(speech)/sample_rate:.2f}s: {text}")
+    if turn:
+        turn.mark(STAGE_ASR)
+        turn.end(endpoint_reason="stream_end", text=text)
+        turn = None
+
+print("\n" + "="*60)
+print("识别结果:")
+for n, text in enumerate(finals, 1):
+    print(f"  第 {n} 句: {text}")
+print("-"*60)
+endpointer.report()
+if shared_frontend:
+    shared_frontend.report()
+print("="*60)
+
+if reply_llm is not None:
+    reply_llm.close()
+if reply_server is not None:
+    reply_server.shutdown()
+
+if tracer:
+    stage_report(tracer.finished)
@@ -90,7 +90,8 @@ def get_memory_info():
     return None
 
 from funasr import AutoModel
-from funasr.utils.postprocess_utils import rich_transcription_postprocess
+
+from text_postprocess import TextPostprocessor
 
 model_dir = "iic/SenseVoiceSmall"
 
@@ -171,6 +172,9 @@ except RuntimeError as e:
     else:
         raise
 
+# 富文本标签清理在后处理线程里做，不计入推理耗时；ITN 由 SenseVoice 的 use_itn 在模型内完成
+postprocessor = TextPostprocessor(itn=False, rich=True)
+
 # 测试音频URL
 test_audio_url = "https://isv-data.oss-cn-hangzhou.aliyuncs.com/ics/MaaS/ASR/test_audio/asr_example_zh.wav"
 
@@ -212,8 +216,7 @@ print(res)
 inference_end = time.perf_counter()
 first_inference_time = inference_end - inference_start
 
-text = rich_transcription_postprocess(res[0]["text"])
-print(f"识别结果: {text}")
+postprocessor.submit(res[0]["text"]).add_done_callback(lambda f: print(f"识别结果: {f.result()}"))
 print(f"第一次推理耗时（含预热）: {first_inference_time:.2f} 秒 ({first_inference_time*1000:.2f} 毫秒)")
 
 if cuda_available:
@@ -248,6 +251,7 @@ for i in range(num_runs):
     inference_end = time.perf_counter()
     inference_time = inference_end - inference_start
     inference_times.append(inference_time)
+    postprocessor.submit(res[0]["text"])
     
     if cuda_available:
         after_memory = get_memory_info()
@@ -261,6 +265,10 @@ for i in range(num_runs):
     else:
         print(f"  第 {i+1} 次推理: {inference_time*1000:.2f} 毫秒")
 
+postprocessor.close()
+print()
+postprocessor.report()
+
 # 统计信息
 if inference_times:
     avg_time = sum(inference_times) / len(inference_times)
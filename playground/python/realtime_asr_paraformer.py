@@ -4,10 +4,33 @@ import soundfile
 import os
 import torch
 
+from aot_artifacts import load_model_from_env
+from audio_format import normalize_audio
+from cache_guard import SessionCacheGuard
+from chunk_controller import AdaptiveChunkController
+from gc_instrumentation import create_gc_monitor_from_env
+from metrics import start_metrics_server_from_env
+from profiling_hooks import create_profiler_from_env
+from streaming_fbank import create_shared_frontends_from_env, frontend_kwargs
+from text_postprocess import TextPostprocessor
+
 chunk_size = [0, 10, 5] #[0, 10, 5] 600ms, [0, 8, 4] 480ms
 encoder_chunk_look_back = 4 #number of chunks to lookback for encoder self-attention
 decoder_chunk_look_back = 1 #number of encoder chunks to lookback for decoder cross-attention
 
+# 自适应 chunk：设置环境变量 ASR_CHUNK_STATE=<状态文件> 后，
+# 根据历史会话实测的每 chunk 耗时和当前系统负载为本次会话选择 chunk 大小与 look-back
+chunk_state_path = os.environ.get("ASR_CHUNK_STATE")
+chunk_controller = None
+if chunk_state_path:
+    chunk_controller = AdaptiveChunkController()
+    chunk_controller.load_state(chunk_state_path)
+    chunk_config = chunk_controller.select()
+    chunk_size = chunk_config["chunk_size"]
+    encoder_chunk_look_back = chunk_config["encoder_chunk_look_back"]
+    decoder_chunk_look_back = chunk_config["decoder_chunk_look_back"]
+    print(f"自适应 chunk: 本次会话使用 {chunk_config['name']} {chunk_size}")
+
 # 检测并配置 GPU
 device = "cuda:0" if torch.cuda.is_available() else "cpu"
 if torch.cuda.is_available():
@@ -19,7 +42,10 @@ else:
 # 记录模型加载时间
 print("\n正在加载模型...")
 model_load_start = time.perf_counter()
-model = AutoModel(model="paraformer-zh-streaming", device=device)
+# 设置环境变量 AOT_BACKEND=compile 后改用 aot_artifacts.py 的后端加载（先运行 build 填好 Inductor 缓存）
+model = load_model_from_env("paraformer-zh-streaming", device)
+if model is None:
+    model = AutoModel(model="paraformer-zh-streaming", device=device)
 
 
  
@@ -27,11 +53,18 @@ model_load_end = time.perf_counter()
 model_load_time = model_load_end - model_load_start
 print(f"模型加载完成！耗时: {model_load_time:.2f} 秒 ({model_load_time*1000:.2f} 毫秒)")
 
+# 设置环境变量 GC_MONITOR=1 记录每次 GC 停顿；GC_FREEZE=1 冻结加载后的堆，GC_THRESHOLD=a,b,c 调整阈值
+gc_monitor = create_gc_monitor_from_env()
+
 wav_file = os.path.join(model.model_path, "example/asr_example.wav")
 speech, sample_rate = soundfile.read("/home/leedow/下载/asr_example_zh.wav")
+# 模型要求 16 kHz 单声道 float32，其他采样率/声道/位深先经过格式归一化
+speech, sample_rate = normalize_audio(speech, sample_rate)
 chunk_stride = chunk_size[1] * 960 # 600ms
 
 cache = {}
+# 没有 VAD 断句边界：一句话以 is_final 结束，只在这时重置；句中超过硬上限只告警，不清空识别上下文
+cache_guard = SessionCacheGuard(hard_reset=False)
 total_chunk_num = int(len((speech)-1)/chunk_stride+1)
 
 print(f"\n音频总长度: {len(speech)/sample_rate:.2f} 秒")
@@ -41,6 +74,23 @@ print(f"总 Chunk 数: {total_chunk_num}")
 print("\n开始推理...")
 print("="*60)
 
+# 设置环境变量 METRICS_PORT 后启动 /metrics 端点，记录每个 chunk 的延迟与 RTF
+metrics = start_metrics_server_from_env()
+if metrics:
+    chunk_latency_metric = metrics.chunk_latency.labels(model="paraformer-zh-streaming")
+    chunk_rtf_metric = metrics.rtf.labels(model="paraformer-zh-streaming")
+    metrics.active_sessions.inc()
+
+# 设置环境变量 ASR_PROFILE_SLOW_MS=<阈值> 后，超过阈值的 chunk 输出火焰图（目录 ASR_PROFILE_DIR）
+profiler = create_profiler_from_env()
+
+# ITN 不在每个 chunk 的 generate 里做：整段识别结束（is_final）后提交给后处理线程
+postprocessor = TextPostprocessor(itn=True)
+transcript = []
+
+# 设置环境变量 SHARED_FBANK=1 后改用增量 fbank 前端：只计算新增的帧，不再每块重算保留的波形
+shared_frontend = create_shared_frontends_from_env(asr=model)
+
 # 记录推理时间
 inference_times = []
 total_inference_start = time.perf_counter()
@@ -51,14 +101,35 @@ for i in range(total_chunk_num):
     
     # 记录每个 chunk 的推理时间
     chunk_start = time.perf_counter()
-    res = model.generate(input=speech_chunk, cache=cache, use_itn=True, is_final=is_final, chunk_size=chunk_size, encoder_chunk_look_back=encoder_chunk_look_back, decoder_chunk_look_back=decoder_chunk_look_back)
+    if shared_frontend:
+        shared_frontend.push(speech_chunk)
+    if profiler:
+        with profiler.chunk(i):
+            res = model.generate(input=speech_chunk, cache=cache, is_final=is_final, chunk_size=chunk_size, encoder_chunk_look_back=encoder_chunk_look_back, decoder_chunk_look_back=decoder_chunk_look_back, **frontend_kwargs(shared_frontend, "asr"))
+    else:
+        res = model.generate(input=speech_chunk, cache=cache, is_final=is_final, chunk_size=chunk_size, encoder_chunk_look_back=encoder_chunk_look_back, decoder_chunk_look_back=decoder_chunk_look_back, **frontend_kwargs(shared_frontend, "asr"))
     chunk_end = time.perf_counter()
     chunk_time = chunk_end - chunk_start
     inference_times.append(chunk_time)
+    if gc_monitor:
+        gc_monitor.record_chunk(i, chunk_start, chunk_end)
+    if metrics:
+        chunk_latency_metric.observe(chunk_time)
+        chunk_rtf_metric.observe(chunk_time / (len(speech_chunk) / sample_rate))
+    if chunk_controller and i > 0 and not is_final:  # 第一个 chunk 含预热、最后一个 chunk 不完整，不计入
+        chunk_controller.observe(chunk_time, len(speech_chunk) / sample_rate)
+    
+    cache_guard.after_chunk(cache, (i + 1) * chunk_stride / sample_rate * 1000, at_boundary=is_final)
+    if res:
+        transcript.append(res[0]["text"])
+    if is_final:
+        final_text = postprocessor.submit("".join(transcript))
     
     print(f"Chunk {i+1}/{total_chunk_num}: {chunk_time*1000:.2f} ms - {res}")
 
 total_inference_end = time.perf_counter()
+if metrics:
+    metrics.active_sessions.dec()
 total_inference_time = total_inference_end - total_inference_start
 
 # 统计信息
@@ -125,4 +196,31 @@ if inference_times:
     else:
         print(f"  推理速度: {rtf:.2f}x 音频时长")
 
+postprocessor.close()
+print(f"\n最终文本（ITN）: {final_text.result()}")
+postprocessor.report()
+
+print()
+cache_guard.report()
+
+if shared_frontend:
+    print()
+    shared_frontend.report()
+
+if gc_monitor:
+    print()
+    gc_monitor.report()
+    gc_monitor.close()
+
+if profiler:
+    print()
+    profiler.report()
+    profiler.close()
+
+if chunk_controller:
+    print()
+    chunk_controller.select()
+    chunk_controller.report()
+    chunk_controller.save_state(chunk_state_path)
+
 print("="*60)
\ No newline at end of file
@@ -3,6 +3,13 @@ import time
 import soundfile
 import torch
 
+from aot_artifacts import load_model_from_env
+from audio_format import normalize_audio
+from cache_guard import SessionCacheGuard
+from gc_instrumentation import create_gc_monitor_from_env
+from metrics import start_metrics_server_from_env
+from streaming_fbank import create_shared_frontends_from_env, frontend_kwargs
+
 chunk_size = 200 # ms
 
 # 检测并配置 GPU
@@ -16,16 +23,26 @@ else:
 # 记录模型加载时间
 print("\n正在加载模型...")
 model_load_start = time.perf_counter()
-model = AutoModel(model="fsmn-vad", device=device)
+# 设置环境变量 AOT_BACKEND=compile 后改用 aot_artifacts.py 的后端加载（先运行 build 填好 Inductor 缓存）
+model = load_model_from_env("fsmn-vad", device)
+if model is None:
+    model = AutoModel(model="fsmn-vad", device=device)
 model_load_end = time.perf_counter()
 model_load_time = model_load_end - model_load_start
 print(f"模型加载完成！耗时: {model_load_time:.2f} 秒 ({model_load_time*1000:.2f} 毫秒)")
 
+# 设置环境变量 GC_MONITOR=1 记录每次 GC 停顿；GC_FREEZE=1 冻结加载后的堆，GC_THRESHOLD=a,b,c 调整阈值
+gc_monitor = create_gc_monitor_from_env()
+
 wav_file = f"{model.model_path}/example/vad_example.wav"
 speech, sample_rate = soundfile.read("/home/leedow/下载/asr_example_zh.wav")
+# 模型要求 16 kHz 单声道 float32，其他采样率/声道/位深先经过格式归一化
+speech, sample_rate = normalize_audio(speech, sample_rate)
 chunk_stride = int(chunk_size * sample_rate / 1000)
 
 cache = {}
+# 在 VAD 断句边界重置 cache，避免长时间运行时 cache 持续增长
+cache_guard = SessionCacheGuard()
 total_chunk_num = int(len((speech)-1)/chunk_stride+1)
 
 print(f"\n音频总长度: {len(speech)/sample_rate:.2f} 秒")
@@ -36,6 +53,16 @@ print(f"总 Chunk 数: {total_chunk_num}")
 print("\n开始推理...")
 print("="*60)
 
+# 设置环境变量 METRICS_PORT 后启动 /metrics 端点，记录每个 chunk 的延迟与 RTF
+metrics = start_metrics_server_from_env()
+if metrics:
+    chunk_latency_metric = metrics.chunk_latency.labels(model="fsmn-vad")
+    chunk_rtf_metric = metrics.rtf.labels(model="fsmn-vad")
+    metrics.active_sessions.inc()
+
+# 设置环境变量 SHARED_FBANK=1 后改用增量 fbank 前端：只计算新增的帧，不再每块重算保留的波形
+shared_frontend = create_shared_frontends_from_env(vad=model)
+
 # 记录推理时间
 inference_times = []
 total_inference_start = time.perf_counter()
@@ -46,17 +73,32 @@ for i in range(total_chunk_num):
     
     # 记录每个 chunk 的推理时间
     chunk_start = time.perf_counter()
-    res = model.generate(input=speech_chunk, cache=cache, is_final=is_final, chunk_size=chunk_size)
+    if shared_frontend:
+        shared_frontend.push(speech_chunk)
+    res = model.generate(input=speech_chunk, cache=cache, is_final=is_final, chunk_size=chunk_size,
+                         **frontend_kwargs(shared_frontend, "vad"))
     chunk_end = time.perf_counter()
     chunk_time = chunk_end - chunk_start
     inference_times.append(chunk_time)
+    if gc_monitor:
+        gc_monitor.record_chunk(i, chunk_start, chunk_end)
+    if metrics:
+        chunk_latency_metric.observe(chunk_time)
+        chunk_rtf_metric.observe(chunk_time / (len(speech_chunk) / sample_rate))
     
-    if len(res[0]["value"]):
-        print(f"Chunk {i+1}/{total_chunk_num}: {chunk_time*1000:.2f} ms - {res}")
+    # 时间戳换算到整条流上；本 chunk 最后一个语音段已结束即为断句边界
+    segments = cache_guard.to_stream_time(res[0]["value"])
+    at_boundary = bool(segments) and segments[-1][1] != -1
+    cache_guard.after_chunk(cache, (i + 1) * chunk_size, at_boundary=at_boundary and not is_final)
+    
+    if len(segments):
+        print(f"Chunk {i+1}/{total_chunk_num}: {chunk_time*1000:.2f} ms - {segments}")
     else:
         print(f"Chunk {i+1}/{total_chunk_num}: {chunk_time*1000:.2f} ms - 无语音活动")
 
 total_inference_end = time.perf_counter()
+if metrics:
+    metrics.active_sessions.dec()
 total_inference_time = total_inference_end - total_inference_start
 
 # 统计信息
@@ -123,4 +165,16 @@ if inference_times:
     else:
         print(f"  推理速度: {rtf:.2f}x 音频时长")
 
+print()
+cache_guard.report()
+
+if shared_frontend:
+    print()
+    shared_frontend.report()
+
+if gc_monitor:
+    print()
+    gc_monitor.report()
+    gc_monitor.close()
+
 print("="*60)
\ No newline at end of file
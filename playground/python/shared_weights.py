@@ -0,0 +1,275 @@
+"""
+多进程共享一份模型权重
+把 ASR / VLM 脚本扩展成多个进程时，每个进程都会调用 AutoModel / from_pretrained，
+各自持有一份权重：Qwen3-VL-2B 在 CPU 上用 float32 时每个副本约 8 GB。
+
+这里的加载方式是把权重只物化一次：
+  1. export_shared_weights: 第一个进程把 state_dict 保存到 /dev/shm（tmpfs，内存中的文件）
+  2. 其余进程 torch.load(mmap=True) 映射同一个文件，张量直接指向页缓存，
+     所有进程共享同一份物理内存（写时复制，推理不会写权重）
+  3. 模型参数在 meta 设备上构建（不分配内存），再 load_state_dict(assign=True)
+     直接把映射的张量挂到模型上，不发生拷贝
+
+因此增加一个副本只增加激活内存，加载时间接近 0。只适用于 CPU 推理，
+GPU 上每个进程仍然需要把权重拷贝到自己的显存。
+
+共享文件名包含检查点指纹（模型目录下权重文件的 文件名 + 大小 + 修改时间 的摘要），
+模型更新后自动导出新文件，不会挂上过期的权重。
+
+用法:
+    model = load_qwen3_vl_shared("Qwen/Qwen3-VL-2B-Instruct")     # 第一次调用时导出
+    auto_model = load_funasr_shared("paraformer-zh-streaming")     # funasr 同样在 meta 上构建再挂权重
+
+测量多个工作进程的内存（USS 为进程独占内存，PSS 按共享进程数均摊）:
+    python shared_weights.py --model paraformer --workers 4
+    python shared_weights.py --model qwen3-vl --workers 3
+"""
+
+import argparse
+import contextlib
+import gc
+import glob
+import hashlib
+import multiprocessing
+import os
+import re
+import time
+
+import torch
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+SHARED_DIR = os.environ.get("SHARED_WEIGHTS_DIR", "/dev/shm/playground_weights")
+WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt", ".pth")
+
+
+def model_dir(model_id):
+    """模型在 modelscope 本地缓存中的目录（已缓存时不联网）"""
+    if os.path.isdir(model_id):
+        return model_id
+    from modelscope import snapshot_download
+
+    try:
+        return snapshot_download(model_id, local_files_only=True)
+    except Exception:
+        return snapshot_download(model_id)
+
+
+def checkpoint_fingerprint(directory):
+    """模型目录下权重文件的 相对路径 + 大小 + 修改时间 的摘要（不读取文件内容）"""
+    digest = hashlib.sha1()
+    for root, _, files in sorted(os.walk(directory)):
+        for name in sorted(files):
+            if name.endswith(WEIGHT_SUFFIXES):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f"{os.path.relpath(os.path.join(root, name), directory)}:"
+                              f"{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:12]
+
+
+def shared_path(name, fingerprint=None):
+    """模型名（及检查点指纹）对应的共享权重文件"""
+    stem = name.replace("/", "--")
+    return os.path.join(SHARED_DIR, stem + (f"-{fingerprint}" if fingerprint else "") + ".pt")
+
+
+def export_shared_weights(module, path):
+    """把 module 的 state_dict 保存为可 mmap 的文件（先写临时文件再原子替换，避免其他进程读到半个文件）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    state = {key: tensor.detach().contiguous() for key, tensor in module.state_dict().items()}
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+
+
+def _remove_stale(path):
+    """删除同一模型其他指纹的共享文件（检查点已更新）"""
+    prefix = path[:-len(".pt")].rsplit("-", 1)[0]
+    pattern = re.compile(re.escape(os.path.basename(prefix)) + r"-[0-9a-f]{12}\.pt")
+    for stale in glob.glob(glob.escape(prefix) + "-*.pt"):
+        if stale != path and pattern.fullmatch(os.path.basename(stale)):
+            os.remove(stale)
+
+
+def map_shared_weights(path):
+    """只读映射共享权重文件，返回 state_dict（张量数据不读入进程私有内存）"""
+    return torch.load(path, mmap=True, weights_only=True, map_location="cpu")
+
+
+def attach_shared_weights(module, path, strict=True):
+    """把映射的张量直接挂到 module 上（assign=True 不拷贝），原有的参数随后可被回收"""
+    state = map_shared_weights(path)
+    module.load_state_dict(state, strict=strict, assign=True)
+    if hasattr(module, "tie_weights"):
+        module.tie_weights()
+    gc.collect()
+    return module
+
+
+def load_qwen3_vl_shared(model_name="Qwen/Qwen3-VL-2B-Instruct", dtype=torch.float32):
+    """
+    以共享权重方式加载 Qwen3-VL（CPU）
+
+    共享文件不存在时按常规方式加载一次并导出；之后的进程在 meta 设备上构建模型结构，
+    再挂上映射的权重。
+    """
+    from accelerate import init_empty_weights
+    from modelscope import AutoConfig, Qwen3VLForConditionalGeneration
+
+    path = shared_path(f"{model_name}-{str(dtype).replace('torch.', '')}",
+                       checkpoint_fingerprint(model_dir(model_name)))
+    if not os.path.exists(path):
+        model = Qwen3VLForConditionalGeneration.from_pretrained(model_name, torch_dtype=dtype)
+        export_shared_weights(model, path)
+        _remove_stale(path)
+        del model
+        gc.collect()
+
+    config = AutoConfig.from_pretrained(model_name)
+    # 参数放在 meta 设备上；buffer 照常创建，因为旋转位置编码的 inv_freq 等非持久 buffer
+    # 不在 state_dict 中，需要保留真实的值
+    with init_empty_weights(include_buffers=False):
+        model = Qwen3VLForConditionalGeneration._from_config(config, torch_dtype=dtype)
+    attach_shared_weights(model, path)
+    return model.eval()
+
+
+def _funasr_shared_path(name):
+    from funasr.download.name_maps_from_hub import name_maps_ms
+
+    return shared_path(f"funasr-{name}", checkpoint_fingerprint(model_dir(name_maps_ms.get(name, name))))
+
+
+@contextlib.contextmanager
+def _funasr_attach_on_build(path):
+    """
+    AutoModel 构建期间：参数建在 meta 设备上，原本读取检查点的 load_pretrained_model
+    换成挂上映射的共享权重（之后 build_model 里的 model.to(device) 面对的已是真实张量）
+    """
+    from accelerate import init_empty_weights
+    import funasr.auto.auto_model as auto_model_module
+
+    original = auto_model_module.load_pretrained_model
+
+    def attach(*args, model=None, **kwargs):
+        model = model if model is not None else args[1]
+        model.load_state_dict(map_shared_weights(path), strict=True, assign=True)
+
+    auto_model_module.load_pretrained_model = attach
+    try:
+        with init_empty_weights(include_buffers=False):
+            yield
+    finally:
+        auto_model_module.load_pretrained_model = original
+
+
+def load_funasr_shared(name, **kwargs):
+    """
+    以共享权重方式构建 funasr AutoModel（CPU）
+
+    共享文件不存在时按常规方式加载一次并导出；之后的进程不再读取检查点，
+    在 meta 设备上构建模型后直接挂上映射的权重。
+    """
+    from funasr import AutoModel
+
+    kwargs = {"device": "cpu", "disable_update": True, **kwargs}
+    path = _funasr_shared_path(name)
+    if not os.path.exists(path):
+        auto_model = AutoModel(model=name, **kwargs)
+        export_shared_weights(auto_model.model, path)
+        _remove_stale(path)
+        attach_shared_weights(auto_model.model, path)
+        return auto_model
+    with _funasr_attach_on_build(path):
+        auto_model = AutoModel(model=name, **kwargs)
+    return auto_model
+
+
+def share_funasr_weights(auto_model, name):
+    """
+    把已构建的 funasr AutoModel 的权重换成共享映射版本
+
+    AutoModel 构建时已经完整读取过一次检查点；新代码优先用 load_funasr_shared 跳过这一步。
+    """
+    path = _funasr_shared_path(name)
+    if not os.path.exists(path):
+        export_shared_weights(auto_model.model, path)
+        _remove_stale(path)
+    attach_shared_weights(auto_model.model, path)
+    return auto_model
+
+
+def memory_usage_mb():
+    """返回 (RSS, USS, PSS)，单位 MB；USS/PSS 需要 psutil 且仅 Linux 可用"""
+    if not PSUTIL_AVAILABLE:
+        return 0.0, 0.0, 0.0
+    info = psutil.Process(os.getpid()).memory_full_info()
+    return (info.rss / 1024**2, getattr(info, "uss", 0) / 1024**2, getattr(info, "pss", 0) / 1024**2)
+
+
+def _load(model, shared):
+    if model == "qwen3-vl":
+        if shared:
+            return load_qwen3_vl_shared()
+        from modelscope import Qwen3VLForConditionalGeneration
+        return Qwen3VLForConditionalGeneration.from_pretrained(
+            "Qwen/Qwen3-VL-2B-Instruct", torch_dtype=torch.float32)
+    if shared:
+        return load_funasr_shared("paraformer-zh-streaming")
+    from funasr import AutoModel
+    return AutoModel(model="paraformer-zh-streaming", device="cpu", disable_update=True)
+
+
+def _worker(model, shared, ready, results):
+    start = time.perf_counter()
+    _load(model, shared)
+    load_time = time.perf_counter() - start
+    gc.collect()
+    results.put((os.getpid(), load_time, *memory_usage_mb()))
+    ready.wait()  # 所有进程都加载完再退出，保证测量时共享页同时被映射
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程共享权重的内存与加载时间基准")
+    parser.add_argument("--model", choices=["paraformer", "qwen3-vl"], default="paraformer")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--private", action="store_true", help="每个进程各自加载（对照组）")
+    args = parser.parse_args()
+
+    shared = not args.private
+    if shared:
+        # 预先导出一次，让所有工作进程都走映射路径
+        _load(args.model, shared=True)
+        gc.collect()
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(args.model, shared, ready, results))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    ready.set()
+    for process in processes:
+        process.join()
+
+    print("=" * 60)
+    print(f"模型: {args.model} | 工作进程: {args.workers} | 权重: {'共享映射' if shared else '各自加载'}")
+    print("=" * 60)
+    print(f"{'PID':>8} {'加载(秒)':>10} {'RSS(MB)':>10} {'USS(MB)':>10} {'PSS(MB)':>10}")
+    for pid, load_time, rss, uss, pss in rows:
+        print(f"{pid:>8} {load_time:>10.2f} {rss:>10.0f} {uss:>10.0f} {pss:>10.0f}")
+    print(f"\n独占内存合计 (USS): {sum(r[3] for r in rows):.0f} MB")
+    print(f"按比例分摊合计 (PSS): {sum(r[4] for r in rows):.0f} MB")
+    if shared:
+        print(f"共享权重文件目录: {SHARED_DIR}（重启或手动删除前常驻内存）")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
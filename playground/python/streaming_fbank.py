@@ -0,0 +1,546 @@
+"""
+增量式 log-mel（fbank）前端，VAD 与 ASR 共用，多会话批量计算
+funasr 每次 model.generate 都在内部从原始采样重新计算 fbank：WavFrontendOnline 会保留
+上一块末尾的一段波形（reserve_waveforms）并连同新块一起重算，VAD + ASR 组合时
+fsmn-vad 与 paraformer 还各算一遍。
+
+这里的前端只计算新增的帧：
+  - IncrementalFbank: 每个会话只保留不足一帧的尾部采样，新块到达时只对新帧做
+    分帧 → 去直流 → 预加重 → 汉明窗 → FFT → mel 滤波 → log；多个会话的新帧拼在一起
+    做一次 rfft 和一次矩阵乘法（process_batch）
+  - LfrCmvn: 每个模型自己的低帧率拼接（LFR）+ CMVN，同样是增量的
+    （fsmn-vad: lfr_m=5, lfr_n=1；paraformer-zh-streaming: lfr_m=7, lfr_n=6）
+  - SharedFrontend: 一份 fbank 分发给多个 LfrCmvn，VAD 和 ASR 不再各算一遍
+  - ModelFrontend / SharedModelFrontends: 接到 funasr 上。funasr 的流式 inference 每个 chunk
+    调用 frontend(...)，model.generate(..., frontend=shared["vad"]) 让 fsmn-vad 与 paraformer
+    取同一份增量 fbank，只各做自己的 LFR + CMVN；分块、cache、断句逻辑仍由 funasr 完成
+
+参数与 funasr 的 WavFrontend 一致（16 kHz、80 维、25ms 帧长、10ms 帧移、汉明窗、
+采样放大到 int16 范围、dither=0），CMVN 读取模型目录下的 am.mvn。
+check_parity 用模型自带的 WavFrontend 对同一段音频计算特征并比较误差。
+
+SHARED_FBANK=1（create_shared_frontends_from_env）时：
+  - realtime_asr_vad.py / realtime_asr_paraformer.py: 模型改用增量前端（不再每块重算保留的波形）
+  - realtime_asr_endpoint.py / realtime_asr_2pass.py: fsmn-vad 与 paraformer 共用一份 fbank；
+    2pass 断句后还把同一份 fbank 的该句特征交给 SenseVoiceSmall（data_type="fbank"）
+断句重置 ASR cache 后，下一句的帧接着整条音频流分帧；funasr 自带前端则从下一块开头重新分帧，
+丢掉上一块末尾不足一帧的采样（最多 25ms），因此下一句开头的特征与原来有不到一帧的相位差。
+
+运行本文件会校验增量结果与整段计算一致，并对比"每块重算 × 2 个模型"与共享增量前端的耗时；
+装有 funasr 时，另外与 funasr 的 WavFrontendOnline（fsmn-vad + paraformer 各一个）逐块对比特征和耗时:
+    python streaming_fbank.py
+"""
+
+import math
+import os
+import re
+import time
+
+import numpy as np
+
+from perf_stats import summarize
+
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 400         # 25ms
+FRAME_SHIFT = 160          # 10ms
+N_FFT = 512
+N_MELS = 80
+PREEMPH = 0.97
+LOW_FREQ = 20.0
+_EPS = np.finfo(np.float32).eps
+
+
+def _mel(freq):
+    return 1127.0 * np.log(1.0 + freq / 700.0)
+
+
+def kaldi_mel_banks(n_mels=N_MELS, n_fft=N_FFT, sample_rate=SAMPLE_RATE, low_freq=LOW_FREQ, high_freq=None):
+    """Kaldi 风格的三角 mel 滤波器组，形状 (n_fft // 2 + 1, n_mels)"""
+    high_freq = high_freq or sample_rate / 2
+    mel_low, mel_high = _mel(low_freq), _mel(high_freq)
+    delta = (mel_high - mel_low) / (n_mels + 1)
+    centers = mel_low + delta * np.arange(n_mels + 2)
+    left, center, right = centers[:-2, None], centers[1:-1, None], centers[2:, None]
+    # Kaldi 的滤波器覆盖 n_fft/2 个频点，奈奎斯特频点权重为 0
+    bin_mel = _mel(sample_rate / n_fft * np.arange(n_fft // 2))[None, :]
+    up = (bin_mel - left) / (center - left)
+    down = (right - bin_mel) / (right - center)
+    banks = np.maximum(0.0, np.minimum(up, down))
+    banks = np.pad(banks, ((0, 0), (0, 1)))
+    return banks.T.astype(np.float32)
+
+
+_MEL_BANKS = kaldi_mel_banks()
+_WINDOW = (0.54 - 0.46 * np.cos(2 * math.pi * np.arange(FRAME_LENGTH) / (FRAME_LENGTH - 1))).astype(np.float32)
+
+
+def fbank_frames(frames):
+    """
+    对已分好的帧（形状 (帧数, 400)，int16 量级的 float32）计算 log-mel，返回 (帧数, 80)
+    """
+    if len(frames) == 0:
+        return np.zeros((0, N_MELS), dtype=np.float32)
+    frames = frames - frames.mean(axis=1, keepdims=True)
+    emphasized = np.empty_like(frames)
+    emphasized[:, 1:] = frames[:, 1:] - PREEMPH * frames[:, :-1]
+    emphasized[:, 0] = frames[:, 0] * (1.0 - PREEMPH)
+    spectrum = np.fft.rfft(emphasized * _WINDOW, n=N_FFT)
+    power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+    return np.log(np.maximum(power @ _MEL_BANKS, _EPS))
+
+
+def fbank(samples):
+    """整段计算（参考实现），samples 为 [-1, 1) 的 float32"""
+    scaled = np.asarray(samples, dtype=np.float32) * 32768.0
+    if len(scaled) < FRAME_LENGTH:
+        return np.zeros((0, N_MELS), dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(scaled, FRAME_LENGTH)[::FRAME_SHIFT]
+    return fbank_frames(frames)
+
+
+class IncrementalFbank:
+    """每个会话只保留不足一帧的尾部采样的增量 fbank"""
+
+    def __init__(self):
+        self._tails = {}
+
+    def _split(self, session_id, samples):
+        tail = self._tails.get(session_id)
+        scaled = np.asarray(samples, dtype=np.float32) * 32768.0
+        buffer = scaled if tail is None or len(tail) == 0 else np.concatenate([tail, scaled])
+        if len(buffer) < FRAME_LENGTH:
+            self._tails[session_id] = buffer
+            return np.zeros((0, FRAME_LENGTH), dtype=np.float32)
+        count = 1 + (len(buffer) - FRAME_LENGTH) // FRAME_SHIFT
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, FRAME_LENGTH)[::FRAME_SHIFT][:count]
+        self._tails[session_id] = buffer[count * FRAME_SHIFT:].copy()
+        return frames
+
+    def process(self, session_id, samples):
+        """处理一个会话的新音频块，返回新增的 fbank 帧 (帧数, 80)"""
+        return fbank_frames(self._split(session_id, samples))
+
+    def peek(self, session_id, samples):
+        """尾部采样接上 samples 计算 fbank，但不改变会话状态（句末冲刷送入的静音不进入音频流）"""
+        tail = self._tails.get(session_id)
+        frames = fbank_frames(self._split(session_id, samples))
+        if tail is None:
+            self._tails.pop(session_id, None)
+        else:
+            self._tails[session_id] = tail
+        return frames
+
+    def process_batch(self, chunks):
+        """
+        多个会话一起处理
+
+        参数:
+            chunks: {session_id: 新音频块}
+        返回: {session_id: 新增的 fbank 帧}
+        """
+        ids = list(chunks)
+        frames = [self._split(sid, chunks[sid]) for sid in ids]
+        counts = [len(f) for f in frames]
+        features = fbank_frames(np.concatenate(frames)) if sum(counts) else None
+        result = {}
+        offset = 0
+        for sid, count in zip(ids, counts):
+            result[sid] = (features[offset:offset + count] if count
+                           else np.zeros((0, N_MELS), dtype=np.float32))
+            offset += count
+        return result
+
+    def end(self, session_id):
+        """会话结束，丢弃尾部采样"""
+        self._tails.pop(session_id, None)
+
+
+def load_cmvn(path):
+    """
+    读取 funasr 模型目录下的 am.mvn（Kaldi nnet 文本格式），返回 (shift, scale)
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    def vector(tag):
+        match = re.search(tag + r".*?\[([^\]]*)\]", text, re.S)
+        return np.array(match.group(1).split(), dtype=np.float32)
+
+    return vector("<AddShift>"), vector("<Rescale>")
+
+
+class LfrCmvn:
+    """
+    增量的低帧率拼接（与 funasr apply_lfr 一致）+ CMVN
+
+    参数:
+        lfr_m: 每个输出帧拼接的输入帧数
+        lfr_n: 输出帧的步长（输入帧数）
+        cmvn: load_cmvn 的返回值，None 表示不做归一化
+    """
+
+    def __init__(self, lfr_m, lfr_n, cmvn=None):
+        self.lfr_m = lfr_m
+        self.lfr_n = lfr_n
+        self.cmvn = cmvn
+        self._state = {}   # session_id -> (缓冲帧, 已输出的 LFR 帧数, 已收到的原始帧数)
+
+    def process(self, session_id, feats, is_final=False):
+        """输入新增 fbank 帧，返回新增的 LFR 帧 (帧数, 80 * lfr_m)"""
+        buffer, emitted, received = self._state.get(session_id, (None, 0, 0))
+        if buffer is None:
+            if len(feats) == 0:
+                return np.zeros((0, N_MELS * self.lfr_m), dtype=np.float32)
+            # 左侧补 (lfr_m - 1) // 2 个第一帧
+            buffer = np.repeat(feats[:1], (self.lfr_m - 1) // 2, axis=0)
+        buffer = np.concatenate([buffer, feats])
+        received += len(feats)
+
+        # buffer[0] 对应第 emitted 个 LFR 帧的起点
+        ready = max(0, (len(buffer) - self.lfr_m) // self.lfr_n + 1)
+        if is_final:
+            ready = max(0, math.ceil(received / self.lfr_n) - emitted)
+            need = (ready - 1) * self.lfr_n + self.lfr_m
+            if ready and len(buffer) < need:
+                buffer = np.concatenate([buffer, np.repeat(buffer[-1:], need - len(buffer), axis=0)])
+        if ready:
+            windows = np.lib.stride_tricks.sliding_window_view(buffer, (self.lfr_m, N_MELS))[::self.lfr_n, 0][:ready]
+            out = windows.reshape(ready, -1)
+            if self.cmvn is not None:
+                shift, scale = self.cmvn
+                out = (out + shift) * scale
+            else:
+                out = out.copy()
+        else:
+            out = np.zeros((0, N_MELS * self.lfr_m), dtype=np.float32)
+
+        if is_final:
+            self._state.pop(session_id, None)
+        else:
+            self._state[session_id] = (buffer[ready * self.lfr_n:], emitted + ready, received)
+        return out.astype(np.float32, copy=False)
+
+
+def lfr_cmvn_from_frontend(frontend):
+    """按 funasr WavFrontend 的 lfr_m / lfr_n / cmvn_file 构建对应的 LfrCmvn"""
+    cmvn_file = getattr(frontend, "cmvn_file", None)
+    return LfrCmvn(frontend.lfr_m, frontend.lfr_n, load_cmvn(cmvn_file) if cmvn_file else None)
+
+
+def check_parity(frontend, samples):
+    """
+    与 funasr WavFrontend 整段计算的特征对比（比较时临时把 dither 置 0）
+
+    参数:
+        frontend: funasr 的 WavFrontend / WavFrontendOnline（AutoModel(...).kwargs["frontend"]）
+        samples: [-1, 1) 的 16 kHz float32 音频
+    返回: (最大绝对误差, 本前端输出形状, WavFrontend 输出形状)
+    """
+    import torch
+
+    dither = frontend.dither
+    frontend.dither = 0.0
+    try:
+        with torch.no_grad():
+            waveform = torch.from_numpy(np.asarray(samples, dtype=np.float32))[None]
+            # 在线前端（WavFrontendOnline）按一整段 is_final 处理，输出全部帧
+            ref, ref_lens = frontend(waveform, torch.tensor([waveform.shape[1]]), cache={}, is_final=True)
+    finally:
+        frontend.dither = dither
+    ref = ref[0, :int(ref_lens[0])].cpu().numpy()
+    ours = lfr_cmvn_from_frontend(frontend).process("parity", fbank(samples), is_final=True)
+    if ours.shape != ref.shape:
+        return float("inf"), ours.shape, ref.shape
+    return float(np.abs(ours - ref).max()), ours.shape, ref.shape
+
+
+class SharedFrontend:
+    """
+    一份增量 fbank 分发给多个模型的 LFR + CMVN
+
+    用法:
+        frontend = SharedFrontend({"vad": LfrCmvn(5, 1, vad_cmvn), "asr": LfrCmvn(7, 6, asr_cmvn)})
+        feats = frontend.process_batch({"s1": chunk1, "s2": chunk2})
+        feats["s1"]["vad"], feats["s1"]["asr"]
+    """
+
+    def __init__(self, consumers):
+        self.fbank = IncrementalFbank()
+        self.consumers = consumers
+
+    def process_batch(self, chunks, final_sessions=()):
+        frames = self.fbank.process_batch(chunks)
+        result = {}
+        for sid, feats in frames.items():
+            is_final = sid in final_sessions
+            result[sid] = {name: consumer.process(sid, feats, is_final)
+                           for name, consumer in self.consumers.items()}
+            if is_final:
+                self.fbank.end(sid)
+        return result
+
+    def process(self, session_id, chunk, is_final=False):
+        return self.process_batch({session_id: chunk}, (session_id,) if is_final else ())[session_id]
+
+
+class ModelFrontend:
+    """
+    funasr 流式模型的前端替身: model.generate(input=chunk, cache=cache, frontend=ModelFrontend(...), ...)
+
+    funasr 的流式 inference 对每个 chunk 调用 frontend(采样, 长度, cache=cache["frontend"], is_final=...)，
+    这里不从采样计算 fbank，而是取出 push() 送来的共享 fbank 帧，只做本模型的 LFR + CMVN。
+    LFR 状态放在 funasr 传入的 cache 中，模型 cache 重置（下一句）时 LFR 随之重新开始，与 WavFrontendOnline 一致。
+    fsmn-vad 用与特征帧对齐的原始采样计算分贝，按 WavFrontendOnline 的规则从传入的采样中截取。
+
+    参数:
+        frontend: 模型自带的 WavFrontendOnline（AutoModel(...).kwargs["frontend"]），提供 fs / lfr_m / lfr_n / cmvn_file
+    """
+
+    supports_aligned_waveforms = True
+
+    def __init__(self, frontend):
+        self.fs = frontend.fs
+        self.frame_shift = frontend.frame_shift
+        self.lfr_m = frontend.lfr_m
+        self.lfr_n = frontend.lfr_n
+        cmvn_file = getattr(frontend, "cmvn_file", None)
+        self.cmvn = load_cmvn(cmvn_file) if cmvn_file else None
+        self._frames = []
+        self.seconds = 0.0   # LFR + CMVN 累计耗时
+
+    def output_size(self):
+        return N_MELS * self.lfr_m
+
+    def push(self, frames):
+        """送入新增的 fbank 帧，下一次 generate 调用前端时消费"""
+        self._frames.append(frames)
+
+    def __call__(self, input, input_lengths, cache=None, is_final=False, **kwargs):
+        import torch
+
+        start = time.perf_counter()
+        cache = {} if cache is None else cache
+        if "lfr" not in cache:
+            cache["lfr"] = LfrCmvn(self.lfr_m, self.lfr_n, self.cmvn)
+        frames = np.concatenate(self._frames) if self._frames else np.zeros((0, N_MELS), dtype=np.float32)
+        self._frames = []
+        feats = cache["lfr"].process("model", frames, is_final)
+        samples = np.asarray(input[0, :int(input_lengths[0])], dtype=np.float32)
+        waveform = torch.from_numpy(self._aligned_waveform(cache, samples, len(feats)))[None]
+        # 新版 funasr 读 aligned_waveforms，旧版读 waveforms
+        cache["aligned_waveforms"] = cache["waveforms"] = waveform
+        self.seconds += time.perf_counter() - start
+        return torch.from_numpy(feats)[None], torch.tensor([len(feats)])
+
+    def _aligned_waveform(self, cache, samples, count):
+        """本次输出的 count 个 LFR 帧对应的原始采样：第 k 帧从 k * lfr_n * 帧移 开始，最后一帧取满帧长"""
+        buffer = samples if cache.get("wave") is None else np.concatenate([cache["wave"], samples])
+        start = cache.get("wave_start", 0)
+        emitted = cache.get("wave_emitted", 0)
+        shift = self.lfr_n * FRAME_SHIFT
+        begin = emitted * shift - start
+        aligned = buffer[begin:begin + (count - 1) * shift + FRAME_LENGTH].copy() if count else buffer[:0].copy()
+        emitted += count
+        drop = min(emitted * shift - start, len(buffer))
+        cache["wave"], cache["wave_start"], cache["wave_emitted"] = buffer[drop:], start + drop, emitted
+        return aligned
+
+
+class SharedModelFrontends:
+    """
+    一份增量 fbank 分发给多个 funasr 流式模型，VAD 与 ASR 不再各自从采样计算前端
+
+    用法:
+        shared = SharedModelFrontends(vad=vad_model.kwargs["frontend"], asr=asr_model.kwargs["frontend"])
+        shared.push(speech_chunk)                   # 每个 chunk 只算一次 fbank
+        vad_model.generate(input=speech_chunk, cache=vad_cache, frontend=shared["vad"], ...)
+        asr_model.generate(input=speech_chunk, cache=asr_cache, frontend=shared["asr"], ...)
+    """
+
+    def __init__(self, **frontends):
+        self.fbank = IncrementalFbank()
+        self.frontends = {name: ModelFrontend(frontend) for name, frontend in frontends.items()}
+        self.fbank_seconds = 0.0
+        self.chunks = 0
+
+    def __getitem__(self, name):
+        return self.frontends[name]
+
+    def push(self, chunk, session_id="stream"):
+        """计算新块的 fbank 并分发给所有模型，返回新增的 fbank 帧"""
+        start = time.perf_counter()
+        frames = self.fbank.process(session_id, chunk)
+        self.fbank_seconds += time.perf_counter() - start
+        self.chunks += 1
+        for frontend in self.frontends.values():
+            frontend.push(frames)
+        return frames
+
+    def flush(self, name, samples, session_id="stream"):
+        """
+        句末冲刷：samples（通常是一段静音）接在音频流尾部计算 fbank，只送给 name 对应的模型，
+        不进入共享音频流；随后照常 model.generate(input=samples, is_final=True, frontend=shared[name])
+        """
+        start = time.perf_counter()
+        frames = self.fbank.peek(session_id, samples)
+        self.fbank_seconds += time.perf_counter() - start
+        self.frontends[name].push(frames)
+
+    @property
+    def seconds(self):
+        return self.fbank_seconds + sum(frontend.seconds for frontend in self.frontends.values())
+
+    def report(self):
+        chunks = max(self.chunks, 1)
+        print("共享前端（每 chunk 平均）:")
+        print(f"  fbank（只算一次）: {self.fbank_seconds / chunks * 1000:.3f} 毫秒")
+        for name, frontend in self.frontends.items():
+            print(f"  {name} LFR({frontend.lfr_m},{frontend.lfr_n}) + CMVN: {frontend.seconds / chunks * 1000:.3f} 毫秒")
+        print(f"  合计: {self.seconds / chunks * 1000:.3f} 毫秒")
+
+
+def create_shared_frontends_from_env(**models):
+    """
+    SHARED_FBANK=1 时返回 SharedModelFrontends（各模型取自己 AutoModel 的前端参数），否则返回 None
+    """
+    if os.environ.get("SHARED_FBANK") != "1":
+        return None
+    return SharedModelFrontends(**{name: model.kwargs["frontend"] for name, model in models.items()})
+
+
+def frontend_kwargs(shared, name):
+    """传给 model.generate 的前端参数；shared 为 None 时使用模型自带的前端"""
+    return {} if shared is None else {"frontend": shared[name]}
+
+
+def _reference_lfr(feats, lfr_m, lfr_n):
+    """整段 LFR（funasr apply_lfr 的逐帧写法），用于校验"""
+    left = np.repeat(feats[:1], (lfr_m - 1) // 2, axis=0)
+    padded = np.concatenate([left, feats])
+    out = []
+    for i in range(math.ceil(len(feats) / lfr_n)):
+        frame = padded[i * lfr_n:i * lfr_n + lfr_m]
+        if len(frame) < lfr_m:
+            frame = np.concatenate([frame, np.repeat(frame[-1:], lfr_m - len(frame), axis=0)])
+        out.append(frame.reshape(-1))
+    return np.array(out, dtype=np.float32)
+
+
+def _benchmark(sessions=8, seconds=10.0, chunk_ms=600, overlap_ms=100):
+    rng = np.random.default_rng(0)
+    audio = {f"s{i}": (rng.standard_normal(int(SAMPLE_RATE * seconds)) * 0.1).astype(np.float32)
+             for i in range(sessions)}
+    chunk = SAMPLE_RATE * chunk_ms // 1000
+    overlap = SAMPLE_RATE * overlap_ms // 1000
+    steps = int(SAMPLE_RATE * seconds) // chunk
+
+    # 正确性：分块增量计算 == 整段计算
+    frontend = SharedFrontend({"vad": LfrCmvn(5, 1), "asr": LfrCmvn(7, 6)})
+    collected = {"vad": [], "asr": [], "fbank": []}
+    ref_audio = audio["s0"][:steps * chunk]
+    fb = IncrementalFbank()
+    for i in range(steps):
+        piece = ref_audio[i * chunk:(i + 1) * chunk]
+        collected["fbank"].append(fb.process("s0", piece))
+        out = frontend.process("s0", piece, is_final=i == steps - 1)
+        collected["vad"].append(out["vad"])
+        collected["asr"].append(out["asr"])
+    offline = fbank(ref_audio)
+    checks = {
+        "fbank": (np.concatenate(collected["fbank"]), offline),
+        "vad LFR(5,1)": (np.concatenate(collected["vad"]), _reference_lfr(offline, 5, 1)),
+        "asr LFR(7,6)": (np.concatenate(collected["asr"]), _reference_lfr(offline, 7, 6)),
+    }
+
+    # 每块重算：VAD 与 ASR 各自对 (重叠 + 新块) 从原始采样计算一遍
+    recompute_ms = []
+    for i in range(steps):
+        start = time.perf_counter()
+        for sid in audio:
+            piece = audio[sid][max(0, i * chunk - overlap):(i + 1) * chunk]
+            for _ in range(2):
+                fbank(piece)
+        recompute_ms.append((time.perf_counter() - start) * 1000)
+
+    shared = SharedFrontend({"vad": LfrCmvn(5, 1), "asr": LfrCmvn(7, 6)})
+    shared_ms = []
+    for i in range(steps):
+        batch = {sid: audio[sid][i * chunk:(i + 1) * chunk] for sid in audio}
+        start = time.perf_counter()
+        shared.process_batch(batch)
+        shared_ms.append((time.perf_counter() - start) * 1000)
+
+    print("=" * 60)
+    print("增量共享 fbank 前端基准")
+    print("=" * 60)
+    for name, (incremental, reference) in checks.items():
+        same = incremental.shape == reference.shape and np.allclose(incremental, reference, atol=1e-3)
+        print(f"{name:<14} 增量 {incremental.shape} vs 整段 {reference.shape}: {'一致' if same else '不一致'}")
+    print(f"\n{sessions} 个会话，每块 {chunk_ms} ms（重算方式含 {overlap_ms} ms 重叠）:")
+    before = summarize(recompute_ms[1:])
+    after = summarize(shared_ms[1:])
+    print(f"  每块重算 × 2 个模型: 平均 {before['avg']:.2f} ms | P95 {before['p95']:.2f} ms")
+    print(f"  共享增量 + 批量:     平均 {after['avg']:.2f} ms | P95 {after['p95']:.2f} ms")
+    if after["avg"] > 0:
+        print(f"  加速: {before['avg'] / after['avg']:.2f}x")
+    print("=" * 60)
+
+
+def _benchmark_funasr(seconds=10.0, chunk_ms=600):
+    """与 funasr 的 WavFrontendOnline 逐块对比：特征误差、每块输出帧数、每块前端耗时"""
+    try:
+        import torch
+        from funasr.frontends.wav_frontend import WavFrontendOnline
+    except ImportError:
+        print("未安装 funasr，跳过与 WavFrontendOnline 的对比")
+        return
+
+    rng = np.random.default_rng(1)
+    audio = (rng.standard_normal(int(SAMPLE_RATE * seconds)) * 0.1).astype(np.float32)
+    chunk = SAMPLE_RATE * chunk_ms // 1000
+    steps = len(audio) // chunk
+    frontends = {"vad": WavFrontendOnline(lfr_m=5, lfr_n=1, dither=0.0),
+                 "asr": WavFrontendOnline(lfr_m=7, lfr_n=6, dither=0.0)}
+    shared = SharedModelFrontends(**frontends)
+    ref_cache = {name: {} for name in frontends}
+    our_cache = {name: {} for name in frontends}
+    max_diff = {name: 0.0 for name in frontends}
+    count_mismatch = 0
+    funasr_ms, shared_ms = [], []
+    for i in range(steps):
+        piece = torch.from_numpy(audio[i * chunk:(i + 1) * chunk])[None]
+        is_final = i == steps - 1
+        start = time.perf_counter()
+        refs = {name: frontend(piece, [piece.shape[1]], cache=ref_cache[name], is_final=is_final)[0]
+                for name, frontend in frontends.items()}
+        funasr_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        shared.push(piece[0].numpy())
+        ours = {name: shared[name](piece, [piece.shape[1]], cache=our_cache[name], is_final=is_final)[0]
+                for name in frontends}
+        shared_ms.append((time.perf_counter() - start) * 1000)
+
+        for name in frontends:
+            ref_frames = refs[name].shape[1] if refs[name].ndim == 3 else 0
+            if ref_frames != ours[name].shape[1]:
+                count_mismatch += 1
+            elif ref_frames:
+                max_diff[name] = max(max_diff[name], float((refs[name] - ours[name]).abs().max()))
+
+    print(f"\n与 funasr WavFrontendOnline 逐块对比（单会话，每块 {chunk_ms} ms，{steps} 块）:")
+    print(f"  每块输出帧数不一致: {count_mismatch} 次")
+    for name, diff in max_diff.items():
+        print(f"  {name} 特征最大误差: {diff:.2e}")
+    before = summarize(funasr_ms[1:])
+    after = summarize(shared_ms[1:])
+    print(f"  WavFrontendOnline × 2（VAD + ASR 各算一遍）: 平均 {before['avg']:.3f} ms | P95 {before['p95']:.3f} ms")
+    print(f"  共享增量 fbank + 2 个 LFR/CMVN:              平均 {after['avg']:.3f} ms | P95 {after['p95']:.3f} ms")
+    if after["avg"] > 0:
+        print(f"  每块前端耗时降低: {before['avg'] / after['avg']:.2f}x")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    _benchmark()
+    _benchmark_funasr()
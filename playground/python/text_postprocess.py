@@ -0,0 +1,153 @@
+"""
+识别文本后处理：逆文本标准化（ITN）与富文本标签清理，作为独立的异步阶段
+realtime_asr_paraformer.py 在每个 chunk 的 generate 里传 use_itn=True，
+realtime_asr_funasr.py 在推理后同步调用 rich_transcription_postprocess，
+文本处理的耗时都算在了识别延迟里。
+
+TextPostprocessor 在单独的工作线程里处理已经断句的最终文本：
+  - ITN: fun_text_processing 的中文 InverseNormalizer（"二零二四年" → "2024年"），未安装时跳过
+  - 富文本: funasr 的 rich_transcription_postprocess（SenseVoice 的 <|zh|><|NEUTRAL|> 等标签 → 文本 + emoji）
+  - 记忆化: 同样的文本（口头禅、重复指令、同一段音频反复识别）直接返回缓存结果，LRU 淘汰
+流式中间结果只用于显示，不做后处理；submit 立即返回 Future，识别线程不等待。
+
+用法:
+    post = TextPostprocessor(itn=True, rich=False)
+    future = post.submit(segment_text)          # 断句后提交
+    future.add_done_callback(lambda f: print(f.result()))
+    post.close()
+    post.report()
+
+基准（处理耗时与缓存命中）:
+    python text_postprocess.py --texts 200 --distinct 40
+"""
+
+import argparse
+import collections
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from perf_stats import print_latency_summary
+
+try:
+    from fun_text_processing.inverse_text_normalization.inverse_normalize import InverseNormalizer
+    ITN_AVAILABLE = True
+except ImportError:
+    ITN_AVAILABLE = False
+
+try:
+    from funasr.utils.postprocess_utils import rich_transcription_postprocess
+    RICH_AVAILABLE = True
+except ImportError:
+    RICH_AVAILABLE = False
+
+
+class TextPostprocessor:
+    """
+    参数:
+        itn: 是否做逆文本标准化（需要 pip install fun_text_processing）
+        rich: 是否清理 SenseVoice 富文本标签（需要 funasr）
+        cache_size: 记忆化缓存的条目数
+        lang: ITN 语言
+    """
+
+    def __init__(self, itn=True, rich=False, cache_size=1024, lang="zh"):
+        self.itn = itn and ITN_AVAILABLE
+        self.rich = rich and RICH_AVAILABLE
+        if itn and not ITN_AVAILABLE:
+            print("提示: 未安装 fun_text_processing，跳过 ITN（pip install fun_text_processing）")
+        self.lang = lang
+        self.cache_size = cache_size
+        self._normalizer = None
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # 单工作线程：ITN 的 WFST 不保证线程安全，且后处理不应与识别争抢多个核
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="text-post")
+        self.hits = 0
+        self.misses = 0
+        self.process_ms = []      # 未命中缓存时的实际处理耗时
+        self.turnaround_ms = []   # 提交 → 结果可用
+
+    def _normalize(self, text):
+        if self.rich:
+            text = rich_transcription_postprocess(text)
+        if self.itn:
+            if self._normalizer is None:
+                # 构建 WFST 较慢，放在工作线程里第一次用到时再做
+                self._normalizer = InverseNormalizer(lang=self.lang)
+            text = self._normalizer.normalize(text)
+        return text
+
+    def process(self, text):
+        """同步处理（带记忆化）；submit 在工作线程里调用它"""
+        with self._lock:
+            if text in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(text)
+                return self._cache[text]
+        start = time.perf_counter()
+        result = self._normalize(text)
+        self.process_ms.append((time.perf_counter() - start) * 1000)
+        with self._lock:
+            self.misses += 1
+            self._cache[text] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _timed(self, text, submitted):
+        result = self.process(text)
+        self.turnaround_ms.append((time.perf_counter() - submitted) * 1000)
+        return result
+
+    def submit(self, text):
+        """提交一段最终文本，立即返回 Future"""
+        return self._executor.submit(self._timed, text, time.perf_counter())
+
+    def close(self):
+        """等待已提交的文本处理完"""
+        self._executor.shutdown(wait=True)
+
+    def report(self):
+        lookups = self.hits + self.misses
+        print("文本后处理:")
+        print(f"  ITN: {'开' if self.itn else '关'} | 富文本清理: {'开' if self.rich else '关'}")
+        print(f"  处理段数: {lookups} | 缓存命中: {self.hits} | "
+              f"命中率: {self.hits / lookups * 100 if lookups else 0:.1f}%")
+        print_latency_summary("实际处理耗时", self.process_ms)
+        print_latency_summary("提交到结果可用", self.turnaround_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本后处理耗时与记忆化基准")
+    parser.add_argument("--texts", type=int, default=200, help="提交的文本段数")
+    parser.add_argument("--distinct", type=int, default=40, help="其中不同文本的数量")
+    parser.add_argument("--no-itn", action="store_true")
+    args = parser.parse_args()
+
+    samples = ["今天是二零二四年三月五号", "帮我定一个明天早上七点半的闹钟", "<|zh|><|NEUTRAL|><|Speech|><|woitn|>你好",
+               "把音量调到百分之三十", "我的电话是一三八零零一三八零零零", "好的", "嗯", "谢谢"]
+    rng = random.Random(0)
+    distinct = [f"{samples[n % len(samples)]}{'' if n < len(samples) else n}" for n in range(args.distinct)]
+    texts = [rng.choice(distinct) for _ in range(args.texts)]
+
+    post = TextPostprocessor(itn=not args.no_itn, rich=True)
+    submit_ms = []
+    futures = []
+    for text in texts:
+        start = time.perf_counter()
+        futures.append(post.submit(text))
+        submit_ms.append((time.perf_counter() - start) * 1000)
+    post.close()
+
+    print("=" * 60)
+    for text, future in list(zip(texts, futures))[:3]:
+        print(f"  {text} → {future.result()}")
+    print_latency_summary("识别线程的提交耗时", submit_ms)
+    post.report()
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+单轮对话的端到端延迟追踪
+每个脚本只测自己那一段（ASR 的 inference_times、StreamingTextStreamer 的 first_token_time、
+Callback.on_data 里的打印），没有办法把同一句话在各阶段的耗时串起来。
+
+用法:
+    tracer = Tracer("voice-pipeline", "traces.jsonl")
+    turn = tracer.start_turn()           # 一轮对话（一个用户语句）对应一个 trace
+    turn.mark(STAGE_INGEST)              # 各阶段到达时打点
+    ...
+    with turn.span("asr.inference"):     # 也可以记录某段计算的耗时
+        ...
+    turn.mark(STAGE_PLAYBACK)
+    turn.end()                           # 写出该轮的 span
+
+相邻两个打点之间生成一个阶段 span（名称为后一个打点），整轮为根 span "voice.turn"。
+导出格式为 OTLP/JSON（与 OpenTelemetry Collector 的 file exporter 相同，每行一个
+ExportTraceServiceRequest），可以直接导入 Jaeger / Tempo 等工具。
+
+统计各阶段占比:
+    python tracing.py traces.jsonl
+"""
+
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from perf_stats import percentile, summarize
+
+# 语音链路的标准打点（按发生顺序）
+STAGE_INGEST = "audio.ingest"          # 用户语音开始进入服务端
+STAGE_VAD = "vad.end"                  # VAD / 断句判定用户说完
+STAGE_ASR = "asr.final"                # 最终识别文本产出
+STAGE_LLM = "llm.first_token"          # LLM 首 token
+STAGE_TTS = "tts.first_byte"           # TTS 首段音频
+STAGE_PLAYBACK = "playback.start"      # 开始播放
+PIPELINE_STAGES = [STAGE_INGEST, STAGE_VAD, STAGE_ASR, STAGE_LLM, STAGE_TTS, STAGE_PLAYBACK]
+
+ROOT_SPAN = "voice.turn"
+
+
+def _attributes(attrs):
+    """转换为 OTLP 的 KeyValue 列表"""
+    result = []
+    for key, value in attrs.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        result.append({"key": key, "value": typed})
+    return result
+
+
+class Turn:
+    """一轮对话的追踪上下文，可以在多个线程中使用"""
+
+    def __init__(self, tracer, turn_id, attributes, start_ns=None):
+        self.tracer = tracer
+        self.turn_id = turn_id
+        self.trace_id = secrets.token_hex(16)
+        self.root_span_id = secrets.token_hex(8)
+        self.attributes = dict(attributes)
+        self.start_ns = start_ns or tracer.now_ns()
+        self.marks = []          # [(stage, ns)]
+        self.spans = []          # [(name, start_ns, end_ns, attrs)]
+        self._lock = threading.Lock()
+        self._ended = False
+
+    def mark(self, stage, at_ns=None, once=True):
+        """记录阶段打点；once=True 时同一阶段只记录第一次"""
+        at_ns = at_ns or self.tracer.now_ns()
+        with self._lock:
+            if once and any(name == stage for name, _ in self.marks):
+                return
+            self.marks.append((stage, at_ns))
+
+    @contextmanager
+    def span(self, name, **attrs):
+        start = self.tracer.now_ns()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, self.tracer.now_ns(), **attrs)
+
+    def add_span(self, name, start_ns, end_ns, **attrs):
+        with self._lock:
+            self.spans.append((name, start_ns, end_ns, attrs))
+
+    def end(self, **attrs):
+        with self._lock:
+            if self._ended:
+                return
+            self._ended = True
+            self.attributes.update(attrs)
+        self.tracer._export(self, self.tracer.now_ns())
+
+
+class Tracer:
+    """
+    参数:
+        service_name: 写入 resource 的 service.name
+        export_path: OTLP/JSON 输出文件（追加写入）；为 None 时只保存在内存 finished 列表中
+    """
+
+    def __init__(self, service_name="voice-pipeline", export_path=None):
+        self.service_name = service_name
+        self.export_path = export_path
+        self.finished = []
+        self._lock = threading.Lock()
+        # perf_counter 精度高但没有绝对时间，启动时与墙钟对齐一次
+        self._epoch_offset_ns = time.time_ns() - time.perf_counter_ns()
+
+    def now_ns(self):
+        return time.perf_counter_ns() + self._epoch_offset_ns
+
+    def to_ns(self, perf_counter_seconds):
+        """把 time.perf_counter() 的时间换算为 Unix 纳秒"""
+        return int(perf_counter_seconds * 1e9) + self._epoch_offset_ns
+
+    def start_turn(self, turn_id=None, start_ns=None, **attributes):
+        """开始一轮；start_ns 可指定更早的起点（例如这句话第一个音频块到达的时刻）"""
+        return Turn(self, turn_id or uuid.uuid4().hex[:12], attributes, start_ns)
+
+    def _build_spans(self, turn, end_ns):
+        turn_attrs = {"voice.turn_id": turn.turn_id}
+        spans = [{
+            "traceId": turn.trace_id,
+            "spanId": turn.root_span_id,
+            "name": ROOT_SPAN,
+            "kind": 1,
+            "startTimeUnixNano": str(turn.start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": _attributes({**turn_attrs, **turn.attributes}),
+        }]
+        marks = sorted(turn.marks, key=lambda m: m[1])
+        previous_ns = turn.start_ns
+        for stage, at_ns in marks:
+            spans.append(self._child(turn, stage, previous_ns, at_ns, {**turn_attrs, "voice.stage": True}))
+            previous_ns = at_ns
+        for name, start_ns, stop_ns, attrs in turn.spans:
+            spans.append(self._child(turn, name, start_ns, stop_ns, {**turn_attrs, **attrs}))
+        return spans
+
+    @staticmethod
+    def _child(turn, name, start_ns, end_ns, attrs):
+        return {
+            "traceId": turn.trace_id,
+            "spanId": secrets.token_hex(8),
+            "parentSpanId": turn.root_span_id,
+            "name": name,
+            "kind": 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": _attributes(attrs),
+        }
+
+    def _export(self, turn, end_ns):
+        request = {"resourceSpans": [{
+            "resource": {"attributes": _attributes({"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": "playground.tracing"},
+                            "spans": self._build_spans(turn, end_ns)}],
+        }]}
+        with self._lock:
+            self.finished.append(request)
+            if self.export_path:
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+
+def _iter_turns(requests):
+    """把导出的请求还原为 [(root_span, [stage_spans])]"""
+    for request in requests:
+        for resource_spans in request["resourceSpans"]:
+            for scope_spans in resource_spans["scopeSpans"]:
+                spans = scope_spans["spans"]
+                root = next((s for s in spans if s["name"] == ROOT_SPAN), None)
+                if root is None:
+                    continue
+                stages = [s for s in spans if any(
+                    a["key"] == "voice.stage" for a in s.get("attributes", []))]
+                yield root, stages
+
+
+def _duration_ms(span):
+    return (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+
+
+def stage_report(requests):
+    """打印各阶段耗时分布，以及口到耳（首个打点 → 开始播放）延迟 P95 附近各阶段的占比"""
+    per_stage = {}
+    totals = []
+    turns = []
+    for root, stages in _iter_turns(requests):
+        durations = {s["name"]: _duration_ms(s) for s in stages}
+        # 第一个打点之前是 turn 创建到语音进入的时间，不计入口到耳
+        first = min(stages, key=lambda s: int(s["startTimeUnixNano"]), default=None)
+        if first is not None:
+            durations.pop(first["name"], None)
+        for name, ms in durations.items():
+            per_stage.setdefault(name, []).append(ms)
+        total = sum(durations.values())
+        totals.append(total)
+        turns.append((total, durations))
+
+    print("=" * 60)
+    print(f"端到端延迟追踪报告（{len(totals)} 轮）")
+    print("=" * 60)
+    order = [s for s in PIPELINE_STAGES if s in per_stage] + sorted(set(per_stage) - set(PIPELINE_STAGES))
+    print(f"{'阶段':<18} {'P50(ms)':>9} {'P95(ms)':>9} {'最大(ms)':>9}")
+    for name in order:
+        stats = summarize(per_stage[name])
+        print(f"{name:<18} {stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['max']:>9.1f}")
+    if not totals:
+        return
+    p95 = percentile(totals, 95)
+    print(f"\n口到耳延迟: P50 {percentile(totals, 50):.1f} ms | P95 {p95:.1f} ms")
+
+    # P95 及以上的慢轮次中，各阶段平均占比
+    slow = [d for total, d in turns if total >= p95] or [turns[-1][1]]
+    share = {}
+    for durations in slow:
+        total = sum(durations.values()) or 1.0
+        for name, ms in durations.items():
+            share[name] = share.get(name, 0.0) + ms / total / len(slow)
+    dominant = max(share, key=share.get)
+    print("P95 慢轮次中各阶段占比:")
+    for name in order:
+        if name in share:
+            print(f"  {name:<18} {share[name]*100:5.1f}%")
+    print(f"主导阶段: {dominant}")
+    print("=" * 60)
+
+
+def load_requests(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def create_tracer_from_env(service_name="voice-pipeline"):
+    """设置了环境变量 TRACE_FILE 时返回写入该文件的 Tracer，否则返回 None"""
+    path = os.environ.get("TRACE_FILE")
+    return Tracer(service_name, path) if path else None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("用法: python tracing.py traces.jsonl")
+        sys.exit(1)
+    stage_report(load_requests(sys.argv[1]))
@@ -0,0 +1,359 @@
+"""
+可插拔的 TTS 后端
+test.py 直接使用 DashScope 的 SpeechSynthesizer（cosyvoice-v2），每次测 TTS 延迟都需要联网。
+这里把 TTS 抽象成与 SpeechSynthesizer 相同的用法：
+
+    backend = create_tts_backend("fake", callback=MyCallback())
+    backend.streaming_call("你好，")     # 文本片段可以多次送入
+    backend.streaming_complete()        # 阻塞直到所有音频都通过 callback.on_data 送出
+
+回调事件与 DashScope 的 ResultCallback 一致：on_open / on_data / on_complete / on_error / on_close。
+输出统一为 PCM16 单声道，采样率由 sample_rate 指定（默认 22050Hz，与 test.py 相同）。
+
+后端:
+  - dashscope: 阿里云 CosyVoice（需要网络与 API Key）
+  - local:     sherpa-onnx 离线 CPU TTS（需要下载 VITS 模型，例如 vits-zh-aishell3）
+  - fake:      确定性的替身，按可配置的首包延迟 / 合成速度 / 语速输出正弦波 PCM，用于离线基准
+"""
+
+import math
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from audio_format import StreamingResampler, float32_to_pcm16
+
+DEFAULT_SAMPLE_RATE = 22050
+
+# 句子切分：本地引擎按整句合成效果更好
+_SENTENCE_END = re.compile(r"[。！？!?；;，,\n]")
+
+
+class TTSCallback:
+    """TTS 事件回调基类，接口与 dashscope.audio.tts_v2.ResultCallback 相同"""
+
+    def on_open(self):
+        pass
+
+    def on_complete(self):
+        pass
+
+    def on_error(self, message: str):
+        pass
+
+    def on_close(self):
+        pass
+
+    def on_event(self, message):
+        pass
+
+    def on_data(self, data: bytes) -> None:
+        pass
+
+
+class TTSBackend:
+    """TTS 后端基类"""
+
+    name = "base"
+
+    def __init__(self, callback, sample_rate=DEFAULT_SAMPLE_RATE):
+        self.callback = callback
+        self.sample_rate = sample_rate
+        self._last_request_id = None
+
+    def streaming_call(self, text):
+        """送入一段文本（可多次调用）"""
+        raise NotImplementedError
+
+    def streaming_complete(self):
+        """所有文本已送入，阻塞直到合成结束"""
+        raise NotImplementedError
+
+    def get_last_request_id(self):
+        return self._last_request_id
+
+
+class DashScopeTTSBackend(TTSBackend):
+    """阿里云 DashScope CosyVoice 流式合成"""
+
+    name = "dashscope"
+
+    def __init__(self, callback, sample_rate=DEFAULT_SAMPLE_RATE, model="cosyvoice-v2",
+                 voice="longxiaochun_v2"):
+        super().__init__(callback, sample_rate)
+        from dashscope.audio.tts_v2 import AudioFormat, ResultCallback, SpeechSynthesizer
+
+        formats = {
+            8000: AudioFormat.PCM_8000HZ_MONO_16BIT,
+            16000: AudioFormat.PCM_16000HZ_MONO_16BIT,
+            22050: AudioFormat.PCM_22050HZ_MONO_16BIT,
+            24000: AudioFormat.PCM_24000HZ_MONO_16BIT,
+            44100: AudioFormat.PCM_44100HZ_MONO_16BIT,
+            48000: AudioFormat.PCM_48000HZ_MONO_16BIT,
+        }
+        if sample_rate not in formats:
+            raise ValueError(f"DashScope 不支持的采样率: {sample_rate}")
+
+        outer = callback
+
+        class _Forward(ResultCallback):
+            def on_open(self):
+                outer.on_open()
+
+            def on_complete(self):
+                outer.on_complete()
+
+            def on_error(self, message):
+                outer.on_error(message)
+
+            def on_close(self):
+                outer.on_close()
+
+            def on_event(self, message):
+                outer.on_event(message)
+
+            def on_data(self, data):
+                outer.on_data(data)
+
+        self.model = model
+        self.voice = voice
+        self._synthesizer = SpeechSynthesizer(
+            model=model, voice=voice, format=formats[sample_rate], callback=_Forward())
+
+    def streaming_call(self, text):
+        self._synthesizer.streaming_call(text)
+
+    def streaming_complete(self):
+        self._synthesizer.streaming_complete()
+        self._last_request_id = self._synthesizer.get_last_request_id()
+
+
+class _ThreadedBackend(TTSBackend):
+    """
+    本地后端的公共部分：streaming_call 只把文本放入队列，合成在后台线程进行，
+    与 DashScope 一样不阻塞上游（LLM 流式输出）
+    """
+
+    def __init__(self, callback, sample_rate=DEFAULT_SAMPLE_RATE):
+        super().__init__(callback, sample_rate)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._failed = False
+
+    def _ensure_started(self):
+        if self._worker is None:
+            self._last_request_id = uuid.uuid4().hex
+            self._start_session()
+            self.callback.on_open()
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            text = self._queue.get()
+            if text is None:
+                break
+            if self._failed:
+                continue
+            try:
+                for pcm in self._synthesize(text):
+                    self.callback.on_data(pcm)
+            except Exception as e:
+                self._failed = True
+                self.callback.on_error(str(e))
+
+    def _start_session(self):
+        """新一轮合成开始（第一次 streaming_call）时调用，子类在这里清理上一轮的状态"""
+
+    def _synthesize(self, text):
+        """生成器：逐块产出 PCM16 bytes"""
+        raise NotImplementedError
+
+    def streaming_call(self, text):
+        if not text:
+            return
+        self._ensure_started()
+        self._queue.put(text)
+
+    def streaming_complete(self):
+        self._ensure_started()
+        self._queue.put(None)
+        self._worker.join()
+        self._worker = None
+        if not self._failed:
+            self.callback.on_complete()
+        self.callback.on_close()
+        self._failed = False
+
+
+class LocalTTSBackend(_ThreadedBackend):
+    """
+    sherpa-onnx 离线 TTS（CPU）
+
+    参数:
+        model_dir: VITS 模型目录，需包含 model.onnx / tokens.txt（以及 lexicon.txt 或 dict_dir）
+        speaker_id: 多说话人模型的说话人编号
+        num_threads: onnxruntime 线程数
+    """
+
+    name = "local"
+
+    def __init__(self, callback, sample_rate=DEFAULT_SAMPLE_RATE, model_dir=None, speaker_id=0,
+                 speed=1.0, num_threads=2):
+        super().__init__(callback, sample_rate)
+        import sherpa_onnx
+
+        model_dir = model_dir or os.environ.get("LOCAL_TTS_MODEL_DIR", "vits-zh-aishell3")
+
+        def path(name):
+            full = os.path.join(model_dir, name)
+            return full if os.path.exists(full) else ""
+
+        config = sherpa_onnx.OfflineTtsConfig(
+            model=sherpa_onnx.OfflineTtsModelConfig(
+                vits=sherpa_onnx.OfflineTtsVitsModelConfig(
+                    model=path("model.onnx") or path("vits-aishell3.onnx"),
+                    lexicon=path("lexicon.txt"),
+                    tokens=path("tokens.txt"),
+                    dict_dir=path("dict"),
+                ),
+                provider="cpu",
+                num_threads=num_threads,
+            ),
+            max_num_sentences=1,
+        )
+        self._tts = sherpa_onnx.OfflineTts(config)
+        self.speaker_id = speaker_id
+        self.speed = speed
+        self._pending_text = ""
+        self._resampler = None
+        if self._tts.sample_rate != sample_rate:
+            self._resampler = StreamingResampler(self._tts.sample_rate, sample_rate)
+
+    def streaming_call(self, text):
+        # 累积到句末标点再合成，避免逐字合成导致韵律断裂
+        self._pending_text += text
+        parts = _SENTENCE_END.split(self._pending_text)
+        if len(parts) == 1:
+            return
+        cut = len(self._pending_text) - len(parts[-1])
+        super().streaming_call(self._pending_text[:cut])
+        self._pending_text = parts[-1]
+
+    def streaming_complete(self):
+        if self._pending_text.strip():
+            super().streaming_call(self._pending_text)
+        self._pending_text = ""
+        super().streaming_complete()
+
+    def _start_session(self):
+        # 重采样器保存了上一轮末尾的历史样本与计数，不清空会把上一轮的尾音混进这一轮开头
+        if self._resampler is not None:
+            self._resampler.reset()
+
+    def _synthesize(self, text):
+        chunks = queue.Queue()
+        errors = []
+
+        def on_samples(samples, progress):
+            chunks.put(np.asarray(samples, dtype=np.float32).copy())
+            return 1  # 返回 1 继续合成
+
+        def generate():
+            try:
+                self._tts.generate(text, sid=self.speaker_id, speed=self.speed, callback=on_samples)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                chunks.put(None)
+
+        # generate() 是同步的，放到单独线程里，边合成边输出
+        producer = threading.Thread(target=generate, daemon=True)
+        producer.start()
+        while True:
+            samples = chunks.get()
+            if samples is None:
+                break
+            if self._resampler is not None:
+                samples = self._resampler.process(samples)
+            yield float32_to_pcm16(samples).tobytes()
+        producer.join()
+        if errors:
+            # 在工作线程里重新抛出，由 _ThreadedBackend._run 转给 callback.on_error
+            raise errors[0]
+
+
+class FakeTTSBackend(_ThreadedBackend):
+    """
+    确定性的 TTS 替身
+
+    参数:
+        first_byte_ms: 一次合成会话的首包延迟（模拟网络建连 + 模型启动）
+        rtf: 合成耗时 / 音频时长（0.1 表示 10 倍实时速度）
+        chars_per_second: 语速，决定每个字生成多长的音频
+        packet_ms: 每次 on_data 的音频时长
+    """
+
+    name = "fake"
+
+    def __init__(self, callback, sample_rate=DEFAULT_SAMPLE_RATE, first_byte_ms=150.0, rtf=0.1,
+                 chars_per_second=5.0, packet_ms=100):
+        super().__init__(callback, sample_rate)
+        self.first_byte_ms = first_byte_ms
+        self.rtf = rtf
+        self.chars_per_second = chars_per_second
+        self.packet_ms = packet_ms
+        self._first_packet_sent = False
+
+    def _ensure_started(self):
+        if self._worker is None:
+            self._first_packet_sent = False
+        super()._ensure_started()
+
+    def _render(self, text):
+        """每个字一段正弦波，频率由字符编码决定，结果完全可复现"""
+        per_char = int(self.sample_rate / self.chars_per_second)
+        t = np.arange(per_char) / self.sample_rate
+        envelope = np.sin(np.pi * np.arange(per_char) / per_char)
+        pieces = []
+        for ch in text:
+            if not ch.isalnum():  # 标点和空白不发音
+                continue
+            freq = 150.0 + (ord(ch) % 200)
+            pieces.append(0.3 * envelope * np.sin(2 * math.pi * freq * t))
+        if not pieces:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(pieces).astype(np.float32)
+
+    def _synthesize(self, text):
+        audio = self._render(text)
+        packet = int(self.sample_rate * self.packet_ms / 1000)
+        for start in range(0, len(audio), packet):
+            if not self._first_packet_sent:
+                time.sleep(self.first_byte_ms / 1000)
+                self._first_packet_sent = True
+            piece = audio[start:start + packet]
+            time.sleep(len(piece) / self.sample_rate * self.rtf)
+            yield float32_to_pcm16(piece).tobytes()
+
+
+TTS_BACKENDS = {
+    "dashscope": DashScopeTTSBackend,
+    "local": LocalTTSBackend,
+    "fake": FakeTTSBackend,
+}
+
+
+def create_tts_backend(name=None, callback=None, **kwargs):
+    """
+    按名称创建 TTS 后端，name 为空时读取环境变量 TTS_BACKEND（默认 dashscope）
+    """
+    name = name or os.environ.get("TTS_BACKEND", "dashscope")
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"未知的 TTS 后端: {name}，可选: {', '.join(TTS_BACKENDS)}")
+    return TTS_BACKENDS[name](callback or TTSCallback(), **kwargs)
@@ -0,0 +1,322 @@
+"""
+常用语句的 TTS 音频缓存
+虚拟角色会反复说很多相同的话：问候语、"让我想一想"、各种出错提示……
+test.py 每次都重新请求 CosyVoice 合成一遍。
+
+TTSCache 把合成结果以原始 PCM16 文件保存在磁盘上：
+  - 键: (model, voice, 音频格式, 规范化后的文本) 的 SHA1
+  - 读取: mmap 只读映射，命中时直接把映射的内存交给 on_data，几乎没有额外延迟；
+    映射在锁内打开并按读取者计数，release 后最后一个读取者关闭映射
+  - 淘汰: 按最近访问时间 LRU，总大小不超过 max_bytes；正在被读取的条目不淘汰
+  - 指标: 命中率、命中/未命中的首包延迟
+
+CachedTTSBackend 包装任意 TTS 后端（见 tts_backends.py）：
+  - speak(text): 整句已知（问候语、提示语）时先查缓存，未命中再合成并写入缓存
+  - streaming_call / streaming_complete: 流式文本照常透传合成，结束后把整句写入缓存，
+    同样的回复下次就可以通过 speak() 命中
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from perf_stats import print_latency_summary
+from tts_backends import DEFAULT_SAMPLE_RATE, TTSBackend, TTSCallback, create_tts_backend
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """缓存键使用的文本规范化：全半角统一、去首尾空白、合并连续空白、英文小写"""
+    text = unicodedata.normalize("NFKC", text).strip()
+    return _SPACES.sub(" ", text).lower()
+
+
+class TTSCache:
+    """
+    参数:
+        cache_dir: 缓存目录
+        max_bytes: 缓存总大小上限（超过后按 LRU 淘汰）
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, cache_dir="tts_cache", max_bytes=256 * 1024**2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        self._mapped = {}   # key -> [mmap, 读取者数]
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model, voice, audio_format, text):
+        raw = json.dumps([model, voice, audio_format, normalize_text(text)], ensure_ascii=False)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pcm")
+
+    def _load_index(self):
+        path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            index = json.load(f)
+        # 丢掉文件已不存在的条目
+        return {key: meta for key, meta in index.items() if os.path.exists(self._path(key))}
+
+    def flush(self):
+        """把索引（含访问时间）原子地写回磁盘"""
+        with self._lock:
+            if not self._dirty:
+                return
+            path = os.path.join(self.cache_dir, self.INDEX_FILE)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._index, f, ensure_ascii=False)
+            os.replace(tmp, path)
+            self._dirty = False
+
+    @property
+    def total_bytes(self):
+        return sum(meta["bytes"] for meta in self._index.values())
+
+    def get(self, key):
+        """
+        命中时返回只读 memoryview（mmap 映射的 PCM16 数据），未命中返回 None
+        用完后调用 release(key, view)；在此之前该条目不会被淘汰
+        """
+        with self._lock:
+            meta = self._index.get(key)
+            if meta is None:
+                self.misses += 1
+                return None
+            meta["last_access"] = time.time()
+            self._dirty = True
+            self.hits += 1
+            if meta["bytes"] == 0:
+                return memoryview(b"")
+            # 在锁内打开映射，避免查到索引之后、打开文件之前被另一个线程淘汰
+            entry = self._mapped.get(key)
+            if entry is None:
+                with open(self._path(key), "rb") as f:
+                    entry = self._mapped[key] = [mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), 0]
+            entry[1] += 1
+            return memoryview(entry[0])
+
+    def release(self, key, view):
+        """归还 get() 返回的 memoryview；最后一个读取者归还时关闭映射"""
+        view.release()
+        with self._lock:
+            entry = self._mapped.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._mapped[key]
+                self._close_mapping(entry[0])
+
+    @staticmethod
+    def _close_mapping(mapped):
+        try:
+            mapped.close()
+        except BufferError:
+            # 回调还持有切片（例如播放器缓冲了数据），映射在最后一个切片释放时由 GC 关闭
+            pass
+
+    def put(self, key, pcm, text="", sample_rate=DEFAULT_SAMPLE_RATE):
+        """写入一条缓存，然后按 LRU 淘汰到 max_bytes 以内"""
+        if len(pcm) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(pcm)
+        os.replace(tmp, path)
+        with self._lock:
+            self._index[key] = {"bytes": len(pcm), "text": text, "sample_rate": sample_rate,
+                                "last_access": time.time()}
+            self._dirty = True
+            self._evict()
+        self.flush()
+
+    def _evict(self):
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+        for key, meta in sorted(self._index.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if key in self._mapped:
+                continue  # 正在被读取，留到下次淘汰
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            total -= meta["bytes"]
+            del self._index[key]
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self):
+        print("TTS 缓存:")
+        print(f"  条目数: {len(self._index)} | 占用: {self.total_bytes/1024**2:.2f} MB / "
+              f"{self.max_bytes/1024**2:.0f} MB")
+        print(f"  命中: {self.hits} | 未命中: {self.misses} | 命中率: {self.hit_rate*100:.1f}%")
+
+
+class _TeeCallback(TTSCallback):
+    """把音频同时转交给外层回调并收集下来，用于写入缓存"""
+
+    def __init__(self, outer):
+        self.outer = outer
+        self.buffer = bytearray()
+        self.failed = False
+
+    def on_open(self):
+        self.outer.on_open()
+
+    def on_complete(self):
+        self.outer.on_complete()
+
+    def on_error(self, message: str):
+        self.failed = True
+        self.outer.on_error(message)
+
+    def on_close(self):
+        self.outer.on_close()
+
+    def on_event(self, message):
+        self.outer.on_event(message)
+
+    def on_data(self, data: bytes) -> None:
+        self.buffer.extend(data)
+        self.outer.on_data(data)
+
+
+class CachedTTSBackend(TTSBackend):
+    """
+    带缓存的 TTS 后端
+
+    参数:
+        cache: TTSCache 实例
+        backend_name / backend_kwargs: 未命中时使用的真实后端（见 create_tts_backend）
+        model / voice: 参与缓存键，更换音色后不会命中旧音频
+        packet_ms: 命中时每次 on_data 的音频时长（0 表示一次性交给播放器）
+    """
+
+    name = "cached"
+
+    def __init__(self, callback, cache, backend_name=None, backend_kwargs=None,
+                 sample_rate=DEFAULT_SAMPLE_RATE, model="cosyvoice-v2", voice="longxiaochun_v2",
+                 packet_ms=200):
+        super().__init__(callback, sample_rate)
+        self.cache = cache
+        self.backend_name = backend_name
+        self.backend_kwargs = dict(backend_kwargs or {})
+        self.model = model
+        self.voice = voice
+        self.packet_ms = packet_ms
+        self.audio_format = f"pcm16_{sample_rate}hz_mono"
+        self._inner = None
+        self._tee = None
+        self._text = ""
+
+    def _key(self, text):
+        return TTSCache.make_key(self.model, self.voice, self.audio_format, text)
+
+    def _start_inner(self):
+        self._tee = _TeeCallback(self.callback)
+        self._inner = create_tts_backend(self.backend_name, callback=self._tee,
+                                         sample_rate=self.sample_rate, **self.backend_kwargs)
+        self._text = ""
+
+    def speak(self, text):
+        """合成一句完整的话；命中缓存时直接从 mmap 输出。返回是否命中"""
+        data = self.cache.get(self._key(text))
+        if data is None:
+            self.streaming_call(text)
+            self.streaming_complete()
+            return False
+
+        self.callback.on_open()
+        packet = int(self.sample_rate * self.packet_ms / 1000) * 2 if self.packet_ms else len(data)
+        try:
+            for start in range(0, len(data), packet or 1):
+                self.callback.on_data(data[start:start + packet])
+        finally:
+            self.cache.release(self._key(text), data)
+        self.callback.on_complete()
+        self.callback.on_close()
+        return True
+
+    def streaming_call(self, text):
+        if self._inner is None:
+            self._start_inner()
+        self._text += text
+        self._inner.streaming_call(text)
+
+    def streaming_complete(self):
+        if self._inner is None:
+            return
+        self._inner.streaming_complete()
+        self._last_request_id = self._inner.get_last_request_id()
+        if not self._tee.failed and self._tee.buffer and self._text.strip():
+            self.cache.put(self._key(self._text), bytes(self._tee.buffer), self._text, self.sample_rate)
+        self._inner = None
+        self._tee = None
+
+
+def _benchmark():
+    """用 fake 后端模拟一段对话中的常用语句分布，统计命中率与首包延迟"""
+    import random
+    import tempfile
+
+    phrases = ["你好呀！", "让我想一想。", "抱歉，我没有听清楚，可以再说一遍吗？",
+               "网络好像有点问题，请稍后再试。", "好的，马上为你处理。"]
+    weights = [5, 8, 3, 1, 4]
+
+    class FirstData(TTSCallback):
+        def __init__(self):
+            self.first = None
+
+        def on_data(self, data: bytes) -> None:
+            if self.first is None:
+                self.first = time.perf_counter()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = TTSCache(cache_dir, max_bytes=8 * 1024**2)
+        hit_ms, miss_ms = [], []
+        for _ in range(60):
+            text = rng.choices(phrases, weights)[0]
+            callback = FirstData()
+            backend = CachedTTSBackend(callback, cache, backend_name="fake")
+            start = time.perf_counter()
+            hit = backend.speak(text)
+            (hit_ms if hit else miss_ms).append((callback.first - start) * 1000)
+        cache.flush()
+
+        print("=" * 60)
+        print("TTS 缓存基准（fake 后端，首包延迟 150ms）")
+        print("=" * 60)
+        print_latency_summary("命中时首包延迟", hit_ms)
+        print_latency_summary("未命中时首包延迟", miss_ms)
+        cache.report()
+        print("=" * 60)
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,98 @@
+"""
+视觉 token 预算：加载图像时按像素 / token 上限预先缩小
+qwen3-vl-2b.py 把原始分辨率的图片直接交给 processor.apply_chat_template，
+视觉 token 数（以及 prefill 耗时和显存）随像素数线性增长，一张 4K 截图就有上万个 token。
+
+Qwen3-VL 的 patch 为 16 像素、2×2 合并，因此每个视觉 token 对应 32×32 像素。
+fit_to_budget 计算保持宽高比、边长对齐到 32 且 token 数不超过上限的目标尺寸；
+load_image 在解码阶段就缩小：
+  - JPEG 先用 Image.draft 在 DCT 域按 1/2、1/4、1/8 缩小解码（几乎不花时间）
+  - 再用 resize(reducing_gap=...) 先做整数倍盒式缩小、最后一步做高质量插值
+缩放后的尺寸已对齐到 32，processor 不会再次缩放。
+
+用法:
+    image = load_image("screenshot.png", max_tokens=256)
+    messages = [{"role": "user", "content": [{"type": "image", "image": image}, ...]}]
+
+环境变量 VL_MAX_VISUAL_TOKENS 设置后，qwen3-vl-2b.py 会使用该预算。
+"""
+
+import io
+import math
+import os
+import urllib.request
+
+from PIL import Image
+
+PATCH_SIZE = 16
+MERGE_SIZE = 2
+TOKEN_PIXELS = PATCH_SIZE * MERGE_SIZE   # 每个视觉 token 对应的边长（像素）
+MIN_TOKENS = 64                          # processor 默认 shortest_edge=65536 像素，再小会被放大回去
+
+
+def visual_tokens(width, height):
+    """对齐后的尺寸对应的视觉 token 数"""
+    return (width // TOKEN_PIXELS) * (height // TOKEN_PIXELS)
+
+
+def fit_to_budget(width, height, max_tokens, min_tokens=MIN_TOKENS):
+    """
+    返回满足预算的目标尺寸 (width, height)
+
+    保持宽高比，边长对齐到 32；原图本身在预算内时只做对齐，不放大
+    """
+    factor = TOKEN_PIXELS
+    w = max(factor, round(width / factor) * factor)
+    h = max(factor, round(height / factor) * factor)
+    if visual_tokens(w, h) > max_tokens:
+        scale = math.sqrt(max_tokens * factor * factor / (width * height))
+        w = max(factor, math.floor(width * scale / factor) * factor)
+        h = max(factor, math.floor(height * scale / factor) * factor)
+        # 宽高比极端时短边被夹到 32，按比例缩放后仍会超出预算：继续缩短长边
+        if visual_tokens(w, h) > max_tokens:
+            if w >= h:
+                w = max(factor, max_tokens // (h // factor) * factor)
+            else:
+                h = max(factor, max_tokens // (w // factor) * factor)
+    elif visual_tokens(w, h) < min_tokens:
+        scale = math.sqrt(min_tokens * factor * factor / (width * height))
+        w = math.ceil(width * scale / factor) * factor
+        h = math.ceil(height * scale / factor) * factor
+    return w, h
+
+
+def open_image(source):
+    """打开本地路径、http(s) 地址、bytes 或 PIL.Image"""
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray)):
+        return Image.open(io.BytesIO(source))
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(source) as response:
+            return Image.open(io.BytesIO(response.read()))
+    return Image.open(source)
+
+
+def resize_to_budget(image, max_tokens, reducing_gap=2.0):
+    """把已打开（可以尚未解码）的图像缩放到预算内，返回 RGB 图像"""
+    target = fit_to_budget(image.width, image.height, max_tokens)
+    if image.format == "JPEG":
+        # draft 只在解码前有效：让 libjpeg 直接输出不小于目标尺寸的缩小图
+        image.draft("RGB", target)
+    image = image.convert("RGB")
+    if image.size != target:
+        image = image.resize(target, Image.Resampling.BICUBIC, reducing_gap=reducing_gap)
+    return image
+
+
+def load_image(source, max_tokens=None):
+    """加载图像；max_tokens 为 None 时按原始分辨率返回"""
+    image = open_image(source)
+    if max_tokens is None:
+        return image.convert("RGB")
+    return resize_to_budget(image, max_tokens)
+
+
+def budget_from_env():
+    value = os.environ.get("VL_MAX_VISUAL_TOKENS")
+    return int(value) if value else None
@@ -0,0 +1,274 @@
+"""
+Qwen3-VL 两级流水线：预处理线程池 + 有界队列 + 生成循环
+qwen3-vl-2b.py 中图片下载、processor.apply_chat_template、.to(model.device) 是在
+model.generate 之前串行执行的（prep_time）。连续有请求时，这部分 CPU 工作完全可以
+在上一个请求解码的同时完成。
+
+VLPipeline:
+  - 预处理阶段: 线程池并行执行下载 / 解码 / 缩放（vision_budget）/ 分词，
+    产出可以直接送进 generate 的张量
+  - 有界队列: 按提交顺序存放已就绪的输入；同时在预处理和已就绪的请求最多 queue_size + workers 个，
+    达到上限时新请求留在等待队列里、不开始预处理（背压），避免预处理跑得太快堆积大量像素张量
+  - 生成阶段: 单线程依次从队列取出并调用 generate
+
+串行模式（workers=0）在生成线程里依次执行预处理和生成，作为对照。
+
+离线模拟（用 sleep 模拟两个阶段的耗时，不需要模型）:
+    python vl_pipeline.py --simulate --requests 30 --interval-ms 400 --prep-ms 250 --gen-ms 350
+真实模型:
+    python vl_pipeline.py --image 123.jpeg --requests 10 --interval-ms 2000 --max-visual-tokens 256
+"""
+
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import start_metrics_server_from_env
+from perf_stats import print_latency_summary
+
+_DONE = object()
+
+
+class VLPipeline:
+    """
+    参数:
+        preprocess: preprocess(payload) -> inputs，在线程池中执行
+        generate: generate(inputs) -> 结果，在生成线程中执行
+        workers: 预处理线程数；0 表示串行（预处理也在生成线程里做）
+        queue_size: 已就绪输入队列的容量
+        metrics: 可选的 PipelineMetrics，记录两个队列的深度和各阶段的失败数
+    """
+
+    def __init__(self, preprocess, generate, workers=2, queue_size=2, metrics=None):
+        self.preprocess = preprocess
+        self.generate = generate
+        self.workers = workers
+        self.results = []
+        self.failures = []   # 预处理或生成抛出异常的请求
+        self._pending = queue.Queue()                  # 按提交顺序排列的 (request_id, 提交时间, payload)
+        self._inflight = queue.Queue()                 # 已交给线程池的 (request_id, 提交时间, future)
+        self._ready = queue.Queue(maxsize=queue_size)  # 已就绪的输入
+        # 预处理中 + 已就绪的请求数上限；生成完成（或预处理失败）后归还
+        self._slots = threading.BoundedSemaphore(queue_size + workers)
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="vl-prep") if workers else None
+        self._threads = []
+        self.metrics = metrics
+
+    def _record_depth(self):
+        if self.metrics:
+            self.metrics.queue_depth.labels(queue="vl_pending").set(self._pending.qsize())
+            self.metrics.queue_depth.labels(queue="vl_ready").set(self._ready.qsize())
+
+    def _timed_preprocess(self, payload):
+        start = time.perf_counter()
+        inputs = self.preprocess(payload)
+        return inputs, start, time.perf_counter()
+
+    def submit(self, request_id, payload):
+        self._pending.put((request_id, time.perf_counter(), payload))
+        self._record_depth()
+
+    def close(self):
+        """不再提交新请求；等待全部完成"""
+        self._pending.put(_DONE)
+        for thread in self._threads:
+            thread.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def start(self):
+        if self._pool is None:
+            self._threads = [threading.Thread(target=self._serial_loop, daemon=True)]
+        else:
+            self._threads = [threading.Thread(target=self._dispatch_loop, daemon=True),
+                             threading.Thread(target=self._feed_loop, daemon=True),
+                             threading.Thread(target=self._generate_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def _dispatch_loop(self):
+        """有空位时才把等待中的请求交给预处理线程池"""
+        while True:
+            item = self._pending.get()
+            if item is _DONE:
+                self._inflight.put(_DONE)
+                return
+            request_id, submitted, payload = item
+            self._record_depth()
+            self._slots.acquire()
+            self._inflight.put((request_id, submitted, self._pool.submit(self._timed_preprocess, payload)))
+
+    def _feed_loop(self):
+        """按提交顺序等待预处理完成，放入有界队列"""
+        while True:
+            item = self._inflight.get()
+            if item is _DONE:
+                self._ready.put(_DONE)
+                return
+            request_id, submitted, future = item
+            try:
+                inputs, prep_start, prep_end = future.result()
+            except Exception as exc:
+                self._record_failure(request_id, submitted, exc, "preprocess")
+                self._slots.release()
+                continue
+            self._ready.put((request_id, submitted, inputs, prep_start, prep_end))
+            self._record_depth()
+
+    def _generate_loop(self):
+        while True:
+            item = self._ready.get()
+            if item is _DONE:
+                return
+            self._record_depth()
+            try:
+                self._run_generate(*item)
+            finally:
+                self._slots.release()
+
+    def _serial_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is _DONE:
+                return
+            request_id, submitted, payload = item
+            self._record_depth()
+            try:
+                inputs, prep_start, prep_end = self._timed_preprocess(payload)
+            except Exception as exc:
+                self._record_failure(request_id, submitted, exc, "preprocess")
+                continue
+            self._run_generate(request_id, submitted, inputs, prep_start, prep_end)
+
+    def _record_failure(self, request_id, submitted, exc, stage):
+        self.failures.append({"request_id": request_id, "stage": stage, "error": repr(exc),
+                              "e2e_ms": (time.perf_counter() - submitted) * 1000})
+        if self.metrics:
+            self.metrics.errors.labels(stage=f"vl_{stage}").inc()
+
+    def _run_generate(self, request_id, submitted, inputs, prep_start, prep_end):
+        gen_start = time.perf_counter()
+        try:
+            output = self.generate(inputs)
+        except Exception as exc:
+            self._record_failure(request_id, submitted, exc, "generate")
+            return
+        gen_end = time.perf_counter()
+        self.results.append({
+            "request_id": request_id,
+            "output": output,
+            "prep_ms": (prep_end - prep_start) * 1000,
+            "prep_wait_ms": (prep_start - submitted) * 1000,     # 等待预处理线程
+            "queue_wait_ms": (gen_start - prep_end) * 1000,      # 已就绪，等待生成线程
+            "generate_ms": (gen_end - gen_start) * 1000,
+            "e2e_ms": (gen_end - submitted) * 1000,
+        })
+
+    def report(self, title):
+        print(f"[{title}]")
+        print_latency_summary("端到端延迟", [r["e2e_ms"] for r in self.results])
+        print_latency_summary("预处理耗时", [r["prep_ms"] for r in self.results])
+        print_latency_summary("生成耗时", [r["generate_ms"] for r in self.results])
+        print_latency_summary("就绪后等待生成", [r["queue_wait_ms"] for r in self.results])
+        if self.failures:
+            print(f"失败的请求: {len(self.failures)}")
+            for failure in self.failures[:5]:
+                print(f"  请求 {failure['request_id']}（{failure['stage']}）: {failure['error']}")
+
+
+def make_qwen_stages(model, processor, question, max_visual_tokens=None, max_new_tokens=128):
+    """Qwen3-VL 的预处理 / 生成函数；payload 为图片路径、URL 或 PIL.Image"""
+    from vision_budget import load_image
+
+    def preprocess(payload):
+        image = load_image(payload, max_visual_tokens)
+        messages = [{"role": "user", "content": [
+            {"type": "image", "image": image},
+            {"type": "text", "text": question},
+        ]}]
+        inputs = processor.apply_chat_template(
+            messages, tokenize=True, add_generation_prompt=True, return_dict=True, return_tensors="pt")
+        # 锁页内存可以让生成线程里的 .to(cuda) 异步拷贝
+        return {key: value.pin_memory() if model.device.type == "cuda" else value
+                for key, value in inputs.items()}
+
+    def generate(inputs):
+        inputs = {key: value.to(model.device, non_blocking=True) for key, value in inputs.items()}
+        generated = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False, use_cache=True)
+        return processor.decode(generated[0][inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+    return preprocess, generate
+
+
+def make_simulated_stages(prep_ms, gen_ms):
+    """sleep 模拟：预处理（释放 GIL 的 IO / C 扩展）与生成的耗时"""
+    def preprocess(payload):
+        time.sleep(prep_ms / 1000)
+        return payload
+
+    def generate(inputs):
+        time.sleep(gen_ms / 1000)
+        return inputs
+
+    return preprocess, generate
+
+
+def run(preprocess, generate, payloads, interval_ms, workers, queue_size, metrics=None):
+    pipeline = VLPipeline(preprocess, generate, workers, queue_size, metrics)
+    pipeline.start()
+    for index, payload in enumerate(payloads):
+        pipeline.submit(index, payload)
+        time.sleep(interval_ms / 1000)
+    pipeline.close()
+    return pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Qwen3-VL 预处理 / 生成两级流水线基准")
+    parser.add_argument("--simulate", action="store_true", help="用 sleep 模拟两个阶段")
+    parser.add_argument("--image", default="http://localhost/123.jpeg")
+    parser.add_argument("--question", default="这张图片中你看到了什么")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--interval-ms", type=float, default=500.0, help="请求到达间隔")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=2)
+    parser.add_argument("--prep-ms", type=float, default=250.0, help="模拟模式的预处理耗时")
+    parser.add_argument("--gen-ms", type=float, default=350.0, help="模拟模式的生成耗时")
+    parser.add_argument("--max-visual-tokens", type=int, default=None)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    args = parser.parse_args()
+    # 设置环境变量 METRICS_PORT 后启动 /metrics 端点，记录队列深度和失败数
+    metrics = start_metrics_server_from_env()
+
+    if args.simulate:
+        preprocess, generate = make_simulated_stages(args.prep_ms, args.gen_ms)
+        payloads = list(range(args.requests))
+    else:
+        import torch
+        from modelscope import AutoProcessor, Qwen3VLForConditionalGeneration
+
+        model = Qwen3VLForConditionalGeneration.from_pretrained(
+            "Qwen/Qwen3-VL-2B-Instruct",
+            torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
+            device_map="auto")
+        processor = AutoProcessor.from_pretrained("Qwen/Qwen3-VL-2B-Instruct")
+        preprocess, generate = make_qwen_stages(
+            model, processor, args.question, args.max_visual_tokens, args.max_new_tokens)
+        generate(preprocess(args.image))  # 预热
+        payloads = [args.image] * args.requests
+
+    print("=" * 60)
+    print(f"请求数: {args.requests} | 到达间隔: {args.interval_ms:.0f} ms")
+    print("=" * 60)
+    serial = run(preprocess, generate, payloads, args.interval_ms, 0, args.queue_size, metrics)
+    serial.report("串行：预处理 → 生成")
+    print()
+    pipelined = run(preprocess, generate, payloads, args.interval_ms, args.workers, args.queue_size, metrics)
+    pipelined.report(f"流水线：{args.workers} 个预处理线程，队列容量 {args.queue_size}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+LLM → TTS 语音回复链路（test.py 中 synthesizer_with_llm 的可插拔版本）
+LLM 与 TTS 都可以替换为本地替身，整条链路可以在无网络环境下做基准测试。
+
+离线基准（本地 LLM 替身 + fake TTS），对比每轮新建连接与长连接复用:
+    python voice_loop.py --turns 10 --connect-delay-ms 120
+
+使用真实服务:
+    python voice_loop.py --llm dashscope --tts dashscope --turns 3
+"""
+
+import argparse
+import time
+
+from llm_backends import create_llm_client
+from perf_stats import print_latency_summary
+from tracing import STAGE_ASR, STAGE_LLM, STAGE_PLAYBACK, STAGE_TTS, Tracer, stage_report
+from tts_backends import TTSCallback, create_tts_backend
+
+
+class TurnCallback(TTSCallback):
+    """
+    记录一轮对话中第一段音频到达的时间；可选地把音频转交给播放器
+    没有播放器时，第一段音频交到回调即视为开始播放
+    """
+
+    def __init__(self, sink=None, turn=None):
+        self.sink = sink
+        self.turn = turn
+        self.first_audio_time = None
+        self.audio_bytes = 0
+
+    def on_data(self, data: bytes) -> None:
+        if self.first_audio_time is None:
+            self.first_audio_time = time.perf_counter()
+            if self.turn is not None:
+                self.turn.mark(STAGE_TTS)
+        self.audio_bytes += len(data)
+        if self.sink is not None:
+            self.sink(data)
+        if self.turn is not None:
+            self.turn.mark(STAGE_PLAYBACK)
+
+
+def run_turn(llm, messages, tts_name="fake", tts_kwargs=None, sink=None, echo=False, turn=None):
+    """
+    执行一轮：LLM 流式生成 → 每个片段立即送入 TTS
+
+    turn 为 tracing.Turn 时，记录 LLM 首 token / TTS 首包 / 开始播放 打点；
+    传入识别脚本里同一句话的 Turn（realtime_asr_endpoint.py），整条链路就在一个 trace 里
+
+    返回: 字典，包含 text / llm_ttft_ms / first_audio_ms / total_ms / audio_bytes
+    """
+    callback = TurnCallback(sink, turn)
+    tts = create_tts_backend(tts_name, callback=callback, **(tts_kwargs or {}))
+    start = time.perf_counter()
+    first_token_time = None
+    pieces = []
+    for text in llm.stream_chat(messages):
+        if first_token_time is None:
+            first_token_time = time.perf_counter()
+            if turn is not None:
+                turn.mark(STAGE_LLM)
+        pieces.append(text)
+        if echo:
+            print(text, end="", flush=True)
+        tts.streaming_call(text)
+    tts.streaming_complete()
+    end = time.perf_counter()
+    if echo:
+        print()
+
+    def ms(t):
+        return (t - start) * 1000 if t is not None else None
+
+    return {
+        "text": "".join(pieces),
+        "llm_ttft_ms": ms(first_token_time),
+        "first_audio_ms": ms(callback.first_audio_time),
+        "total_ms": ms(end),
+        "audio_bytes": callback.audio_bytes,
+        "sample_rate": tts.sample_rate,
+    }
+
+
+def run_turns(make_llm, reuse, turns, messages, tts_name, tts_kwargs, tracer=None):
+    """reuse=True 时所有轮次共用一个客户端（长连接），否则每轮新建"""
+    results = []
+    llm = make_llm() if reuse else None
+    if llm is not None:
+        llm.warmup()
+    for _ in range(turns):
+        turn = tracer.start_turn(connection_reuse=reuse) if tracer is not None else None
+        if turn is not None:
+            turn.mark(STAGE_ASR)  # 本脚本从识别文本开始，ASR 最终结果即为起点
+        client = llm if reuse else make_llm()
+        results.append(run_turn(client, messages, tts_name, tts_kwargs, turn=turn))
+        if turn is not None:
+            turn.end()
+        if not reuse:
+            client.close()
+    if llm is not None:
+        llm.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM → TTS 语音链路基准")
+    parser.add_argument("--llm", default="mock", choices=["mock", "openai", "dashscope"])
+    parser.add_argument("--tts", default="fake", choices=["fake", "local", "dashscope"])
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--base-url", default=None, help="openai 客户端的地址")
+    parser.add_argument("--connect-delay-ms", type=float, default=120.0,
+                        help="mock 模式下每条新连接的模拟握手耗时")
+    parser.add_argument("--prompt", default="请介绍一下你自己")
+    parser.add_argument("--trace", default=None, help="导出 OTLP/JSON 追踪文件")
+    args = parser.parse_args()
+
+    messages = [{"role": "user", "content": args.prompt}]
+    server = None
+    base_url = args.base_url
+    if args.llm == "mock":
+        from mock_llm_server import start_mock_server
+        server, base_url = start_mock_server(connect_delay_ms=args.connect_delay_ms)
+        print(f"已启动本地 LLM 替身: {base_url}")
+
+    if args.llm == "dashscope":
+        def make_llm():
+            return create_llm_client("dashscope")
+    else:
+        def make_llm():
+            return create_llm_client("openai", base_url=base_url)
+
+    tracer = Tracer("voice-loop", args.trace) if args.trace else None
+
+    print("=" * 60)
+    modes = [("每轮新建连接", False), ("长连接复用", True)]
+    if args.llm == "dashscope":
+        modes = [("DashScope SDK", False)]
+    for title, reuse in modes:
+        results = run_turns(make_llm, reuse, args.turns, messages, args.tts, None, tracer)
+        print(f"\n[{title}]")
+        # LLM 没有输出 / TTS 没有音频的轮次为 None，不计入分布
+        print_latency_summary("LLM 首 token 延迟",
+                              [r["llm_ttft_ms"] for r in results if r["llm_ttft_ms"] is not None])
+        print_latency_summary("首段音频延迟",
+                              [r["first_audio_ms"] for r in results if r["first_audio_ms"] is not None])
+        print_latency_summary("整轮耗时", [r["total_ms"] for r in results])
+    print("\n回复示例:", results[-1]["text"])
+    print("=" * 60)
+
+    if tracer is not None:
+        stage_report(tracer.finished)
+
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
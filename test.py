@@ -18,6 +18,9 @@
 # Microsoft Windows
 #   python -m pip install pyaudio
 
+import os
+import sys
+
 # 导入音频处理库，用于播放生成的语音
 import pyaudio
 # 导入阿里云DashScope SDK
@@ -47,6 +50,7 @@ class Callback(ResultCallback):
     """
     _player = None  # PyAudio播放器实例，用于初始化音频输出设备
     _stream = None  # 音频流对象，用于实际播放音频数据
+    _lipsync = None  # 口型分析（设置环境变量 LIPSYNC_UDP=host:port 时启用）
 
     def on_open(self):
         """
@@ -64,6 +68,11 @@ class Callback(ResultCallback):
         self._stream = self._player.open(
             format=pyaudio.paInt16, channels=1, rate=22050, output=True
         )
+        if os.environ.get("LIPSYNC_UDP"):
+            # 口型分析模块位于 playground/python，按播放设备的输出延迟对齐口型与声音
+            sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "playground", "python"))
+            from lipsync import create_lipsync_from_env
+            self._lipsync = create_lipsync_from_env(22050, self._stream.get_output_latency())
 
     def on_complete(self):
         """
@@ -87,6 +96,9 @@ class Callback(ResultCallback):
         清理音频播放资源，释放系统资源
         """
         print("websocket is closed.")
+        if self._lipsync:
+            self._lipsync.close()
+            self._lipsync.report()
         # 停止音频流播放
         self._stream.stop_stream()
         # 关闭音频流
@@ -113,6 +125,9 @@ class Callback(ResultCallback):
             data: 音频数据的字节流
         """
         print("audio result length:", len(data))
+        # 口型帧按这段音频的预计播放时刻发出，必须在写入（阻塞）之前计算
+        if self._lipsync:
+            self._lipsync.feed(data)
         # 将接收到的音频数据写入音频流，实现实时播放
         self._stream.write(data)
 